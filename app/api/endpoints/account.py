@@ -1,20 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
 
 from app.core.exceptions import AccountNotFoundError
 from app.core.logger import logger
 from app.dependencies import get_account_service
+from app.models.transaction import KindEnum
+from app.schemas.transaction import TransactionHistoryItem, TransactionPage
 from app.services.account_services import AccountService
 
 router = APIRouter(prefix="/accounts", tags=["Accounts"])
 
 
 @router.get("/{account_id}/balance")
-def get_balance(
+async def get_balance(
     account_id: str,
     service: AccountService = Depends(get_account_service),
 ):
     try:
-        balance = service.get_balance(account_id)
+        balance = await service.get_balance(account_id)
 
         return {
             "account_id": account_id,
@@ -25,3 +30,43 @@ def get_balance(
     except Exception as e:
         logger.error(f"Erro: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("/{account_id}/transactions", response_model=TransactionPage)
+async def list_transactions(
+    account_id: str,
+    cursor: Optional[int] = Query(
+        default=None, description="next_cursor retornado pela página anterior"
+    ),
+    limit: int = Query(default=50, ge=1, le=200),
+    status: Optional[str] = None,
+    kind: Optional[KindEnum] = None,
+    created_from: Optional[datetime] = Query(
+        default=None, description="Início do período (inclusivo)"
+    ),
+    created_to: Optional[datetime] = Query(
+        default=None, description="Fim do período (exclusivo)"
+    ),
+    service: AccountService = Depends(get_account_service),
+):
+    try:
+        transactions, next_cursor = await service.list_transactions(
+            account_id,
+            limit=limit,
+            cursor=cursor,
+            status=status,
+            kind=kind,
+            created_from=created_from,
+            created_to=created_to,
+        )
+
+        return TransactionPage(
+            items=[
+                TransactionHistoryItem.model_validate(transaction)
+                for transaction in transactions
+            ],
+            next_cursor=next_cursor,
+        )
+    except Exception as e:
+        logger.error(f"Erro: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
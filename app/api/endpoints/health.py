@@ -1,8 +1,16 @@
 from fastapi import APIRouter
 
+from app.repositories.balance_cache import balance_cache
+
 router = APIRouter(prefix="/health", tags=["Health Check"])
 
 
 @router.get("/")
 async def health_check():
     return {"status": "ok"}
+
+
+@router.get("/balance-cache")
+async def balance_cache_stats():
+    # Contadores deste processo desde o startup
+    return balance_cache.stats()
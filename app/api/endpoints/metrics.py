@@ -0,0 +1,10 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+router = APIRouter(tags=["Metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    # Métricas deste processo (cada réplica da API é coletada separadamente)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
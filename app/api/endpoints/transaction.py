@@ -1,12 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, Response, status
+from typing import Any, AsyncIterator, Optional
 
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from starlette.types import Receive, Scope, Send
+
+from app.core.config import settings
 from app.core.exceptions import InvalidTransactionAmountError
 from app.core.logger import logger
 from app.dependencies import get_transaction_service
 from app.models.transaction import Transaction
-from app.schemas.transaction import TransactionRequest, TransactionResponse
+from app.schemas.transaction import (
+    TransactionBatchItemResult,
+    TransactionBatchRequest,
+    TransactionBatchResponse,
+    TransactionRequest,
+    TransactionResponse,
+)
 from app.services.transaction_service import TransactionService
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
 router = APIRouter()
 
 
@@ -59,3 +73,230 @@ async def create_transaction(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Erro ao processar transação",
         )
+
+
+def _validation_error_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc'])}: {detail['msg']}"
+        for detail in error.errors()
+    )
+
+
+def _parse_item(item: Any) -> TransactionRequest:
+    # Linhas do NDJSON chegam como bytes e são validadas direto do JSON
+    if item is None:
+        raise ValueError(
+            f"Linha excede o tamanho máximo de {settings.stream_max_line_bytes} bytes"
+        )
+    if isinstance(item, bytes):
+        return TransactionRequest.model_validate_json(item)
+    return TransactionRequest.model_validate(item)
+
+
+async def _create_items(
+    service: TransactionService, items: list[tuple[int, Any]]
+) -> list[TransactionBatchItemResult]:
+    """
+    Valida cada item individualmente e cria os válidos em um único lote.
+
+    Retorna um resultado por item, na ordem recebida.
+    """
+    results: dict[int, TransactionBatchItemResult] = {}
+    indexes: list[int] = []
+    transactions: list[Transaction] = []
+    for index, item in items:
+        try:
+            parsed = _parse_item(item)
+        except ValueError as e:
+            external_id = item.get("external_id") if isinstance(item, dict) else None
+            results[index] = TransactionBatchItemResult(
+                index=index,
+                result="invalid",
+                external_id=str(external_id) if external_id is not None else None,
+                error=(
+                    _validation_error_message(e)
+                    if isinstance(e, ValidationError)
+                    else str(e)
+                ),
+            )
+            continue
+
+        indexes.append(index)
+        transactions.append(
+            Transaction(
+                external_id=parsed.external_id,
+                amount=parsed.amount,
+                kind=parsed.kind,
+                account_id=parsed.account_id,
+            )
+        )
+
+    outcomes = await service.create_transactions(transactions)
+
+    for index, transaction, outcome in zip(indexes, transactions, outcomes):
+        if outcome is None:
+            results[index] = TransactionBatchItemResult(
+                index=index,
+                result="invalid",
+                external_id=str(transaction.external_id),
+                error="Valor de transação deve ser maior que zero",
+            )
+            continue
+
+        stored, created = outcome
+        results[index] = TransactionBatchItemResult(
+            index=index,
+            result="created" if created else "existing",
+            external_id=str(stored.external_id),
+            id=stored.id,
+            status=stored.status,
+        )
+
+    return [results[index] for index, _ in items]
+
+
+@router.post(
+    "/transactions/batch",
+    response_model=TransactionBatchResponse,
+    tags=["Transactions"],
+    responses={
+        200: {"description": "Resultado por item (created, existing ou invalid)"},
+        413: {"description": "Lote excede o número máximo de itens"},
+        500: {"description": "Erro interno do servidor"},
+    },
+)
+async def create_transactions_batch(
+    request: TransactionBatchRequest,
+    service: TransactionService = Depends(get_transaction_service),
+):
+    total = len(request.transactions)
+    logger.info(f"Requisição de lote de transações recebida, itens={total}")
+
+    if total > settings.batch_max_items:
+        raise HTTPException(
+            status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+            detail=f"Lote deve ter no máximo {settings.batch_max_items} itens",
+        )
+
+    try:
+        results = await _create_items(service, list(enumerate(request.transactions)))
+    except Exception as e:
+        logger.error(f"Erro ao processar lote de transações, error={str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Erro ao processar lote de transações",
+        )
+
+    counts = {"created": 0, "existing": 0, "invalid": 0}
+    for result in results:
+        counts[result.result] += 1
+
+    return TransactionBatchResponse(**counts, results=results)
+
+
+class _RequestStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse que lê o corpo da requisição enquanto responde.
+
+    A StreamingResponse padrão escuta o receive() em paralelo para detectar
+    desconexão, o que consumiria os pedaços do corpo; aqui a desconexão é
+    detectada pela própria leitura do corpo (ClientDisconnect).
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+
+
+async def _ndjson_lines(
+    request: Request,
+) -> AsyncIterator[tuple[int, Optional[bytes]]]:
+    """
+    Separa o corpo em linhas sem carregá-lo inteiro em memória.
+
+    Linhas vazias são ignoradas; linhas acima de stream_max_line_bytes são
+    descartadas e entregues como None, para que sejam reportadas como inválidas.
+    """
+    buffer = b""
+    line_number = 0
+    discarding = False
+
+    async for chunk in request.stream():
+        *lines, buffer = (buffer + chunk).split(b"\n")
+        for line in lines:
+            if discarding:
+                # O número desta linha já foi entregue ao descartá-la
+                discarding = False
+                continue
+            line_number += 1
+            if len(line) > settings.stream_max_line_bytes:
+                yield line_number, None
+            elif line.strip():
+                yield line_number, line
+
+        if discarding:
+            buffer = b""
+        elif len(buffer) > settings.stream_max_line_bytes:
+            line_number += 1
+            logger.error(f"Linha {line_number} do NDJSON excede o tamanho máximo")
+            yield line_number, None
+            buffer = b""
+            discarding = True
+
+    if buffer.strip() and not discarding:
+        yield line_number + 1, (
+            buffer if len(buffer) <= settings.stream_max_line_bytes else None
+        )
+
+
+@router.post(
+    "/transactions/stream",
+    tags=["Transactions"],
+    response_class=_RequestStreamingResponse,
+    responses={
+        200: {
+            "description": "Um resultado por linha (created, existing ou invalid)",
+            "content": {NDJSON_MEDIA_TYPE: {}},
+        },
+        415: {"description": "Content-Type diferente de application/x-ndjson"},
+    },
+)
+async def create_transactions_stream(
+    request: Request,
+    service: TransactionService = Depends(get_transaction_service),
+):
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type != NDJSON_MEDIA_TYPE:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Content-Type deve ser {NDJSON_MEDIA_TYPE}",
+        )
+
+    logger.info("Ingestão de transações via NDJSON iniciada")
+
+    async def process() -> AsyncIterator[bytes]:
+        # Só um chunk fica em memória por vez: é commitado, respondido e descartado
+        chunk: list[tuple[int, Any]] = []
+        total = 0
+        try:
+            async for line_number, line in _ndjson_lines(request):
+                chunk.append((line_number, line))
+                if len(chunk) >= settings.stream_chunk_size:
+                    for result in await _create_items(service, chunk):
+                        yield result.model_dump_json().encode() + b"\n"
+                    total += len(chunk)
+                    chunk = []
+
+            if chunk:
+                for result in await _create_items(service, chunk):
+                    yield result.model_dump_json().encode() + b"\n"
+                total += len(chunk)
+        except Exception as e:
+            # Chunks já commitados permanecem; reenviar o arquivo é idempotente
+            logger.error(
+                f"Erro na ingestão via NDJSON após {total} linhas, error={str(e)}"
+            )
+            raise
+
+        logger.info(f"Ingestão de transações via NDJSON concluída, linhas={total}")
+
+    return _RequestStreamingResponse(process(), media_type=NDJSON_MEDIA_TYPE)
@@ -1,23 +1,110 @@
 from pathlib import Path
 
-from sqlmodel import Session, SQLModel, create_engine
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core.config import settings
 from app.core.logger import logger
+from app.core.metrics import instrument_pool
+from app.models.account_balance import AccountBalance  # noqa: F401
+from app.models.outbox import OutboxMessage  # noqa: F401
 from app.models.transaction import Transaction  # noqa: F401
 
 Path("data").mkdir(exist_ok=True)
 
-engine = create_engine(settings.database_url, echo=False)
+# Revisão que corresponde ao schema criado pelo antigo create_all
+INITIAL_REVISION = "0001"
 
+ALEMBIC_CONFIG = Path(__file__).resolve().parents[2] / "alembic.ini"
 
-def init_db():
+
+def engine_options(database_url: str) -> dict:
+    """Opções do pool de conexões; o SQLite usa o pool padrão do driver."""
+    if database_url.startswith("sqlite"):
+        return {}
+
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout_s,
+        "pool_recycle": settings.db_pool_recycle_s,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
+
+def sqlite_pragmas() -> list[str]:
+    """PRAGMAs de desempenho configurados em Settings."""
+    if not settings.sqlite_tuning_enabled:
+        return []
+
+    return [
+        f"PRAGMA journal_mode={settings.sqlite_journal_mode}",
+        f"PRAGMA synchronous={settings.sqlite_synchronous}",
+        f"PRAGMA busy_timeout={settings.sqlite_busy_timeout_ms}",
+        f"PRAGMA mmap_size={settings.sqlite_mmap_size}",
+        f"PRAGMA cache_size={settings.sqlite_cache_size}",
+    ]
+
+
+def configure_sqlite(engine: AsyncEngine, pragmas: list[str]) -> None:
+    """Aplica os PRAGMAs em cada nova conexão do engine."""
+    if engine.dialect.name != "sqlite" or not pragmas:
+        return
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _apply_pragmas(dbapi_connection, _connection_record):
+        # synchronous, mmap_size e cache_size valem por conexão; journal_mode
+        # fica gravado no arquivo, mas repeti-lo é inofensivo
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+engine = create_async_engine(
+    settings.database_url, echo=False, **engine_options(settings.database_url)
+)
+configure_sqlite(engine, sqlite_pragmas())
+instrument_pool(engine)
+
+
+def create_session_factory(engine: AsyncEngine) -> async_sessionmaker[AsyncSession]:
+    # expire_on_commit=False: atributos continuam acessíveis após o commit
+    # sem disparar lazy load (que não é permitido fora de await)
+    return async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async_session = create_session_factory(engine)
+
+
+def _run_migrations(connection: Connection) -> None:
+    config = Config(str(ALEMBIC_CONFIG))
+    config.attributes["connection"] = connection
+    # Mantém a configuração de logging da aplicação (Loguru)
+    config.attributes["configure_logger"] = False
+
+    context = MigrationContext.configure(connection)
+    tables = inspect(connection).get_table_names()
+    if context.get_current_revision() is None and "transactions" in tables:
+        # Banco criado pelo antigo create_all: adota o schema inicial
+        logger.warning("Banco sem versão de migração, marcando revisão inicial")
+        command.stamp(config, INITIAL_REVISION)
+
+    command.upgrade(config, "head")
+
+
+async def init_db():
     logger.info("Inicializando o banco de dados...")
-    SQLModel.metadata.create_all(engine)
-    logger.info(f"Tabelas criadas: {list(SQLModel.metadata.tables.keys())}")
+    async with engine.begin() as connection:
+        await connection.run_sync(_run_migrations)
     logger.info("Banco de dados inicializado com sucesso!")
 
 
-def get_session():
-    with Session(engine) as session:
+async def get_session():
+    async with async_session() as session:
         yield session
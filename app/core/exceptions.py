@@ -16,3 +16,21 @@ class InvalidTransactionAmountError(Exception):
     """Exceção para quando um valor de transação é inválido."""
 
     pass
+
+
+class CircuitOpenError(BankPartnerError):
+    """Exceção para quando o circuit breaker do banco parceiro está aberto."""
+
+    def __init__(self, message: str = "Circuit breaker do banco parceiro aberto"):
+        super().__init__(message)
+
+
+class TransactionClaimedError(Exception):
+    """Exceção para transação em processamento por outro worker (claim ativo)."""
+
+    def __init__(self, transaction_id: int, claimed_by: str | None = None):
+        self.transaction_id = transaction_id
+        self.claimed_by = claimed_by
+        super().__init__(
+            f"Transação id={transaction_id} em processamento por {claimed_by}"
+        )
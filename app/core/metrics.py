@@ -0,0 +1,109 @@
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# Buckets de latência (segundos): de operações de banco (ms) a chamadas lentas ao parceiro
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# Atraso entre a publicação e o consumo; retries incluem o atraso do tier
+LAG_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+# API
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Latência das requisições HTTP por rota",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+# Criação de transações
+db_operation_duration = Histogram(
+    "db_operation_duration_seconds",
+    "Duração das operações de banco no caminho de criação e processamento",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+outbox_publish_duration = Histogram(
+    "outbox_publish_duration_seconds",
+    "Duração da publicação de um lote do outbox no RabbitMQ",
+    buckets=LATENCY_BUCKETS,
+)
+outbox_messages = Counter(
+    "outbox_messages_total",
+    "Mensagens do outbox por resultado da publicação",
+    ["result"],
+)
+
+# Banco parceiro
+partner_request_duration = Histogram(
+    "partner_request_duration_seconds",
+    "Latência das chamadas ao banco parceiro",
+    ["mode"],
+    buckets=LATENCY_BUCKETS,
+)
+partner_requests = Counter(
+    "partner_requests_total",
+    "Transações enviadas ao banco parceiro por resultado",
+    ["mode", "result"],
+)
+
+# Worker
+consume_lag = Histogram(
+    "worker_consume_lag_seconds",
+    "Tempo entre a publicação da mensagem e o início do processamento",
+    ["source"],
+    buckets=LAG_BUCKETS,
+)
+in_flight = Gauge(
+    "worker_in_flight_messages",
+    "Handlers em processamento (mensagens, lotes ou transações do dispatcher)",
+)
+retries = Counter(
+    "worker_retries_total",
+    "Transações reagendadas para retry, por motivo",
+    ["reason"],
+)
+dead_letters = Counter(
+    "worker_dead_letters_total",
+    "Transações que esgotaram as tentativas (DLQ ou failed), por motivo",
+    ["reason"],
+)
+
+
+def reason(error: BaseException) -> str:
+    """Motivo de uma falha como label (nome da exceção, cardinalidade baixa)."""
+    return type(error).__name__
+
+
+def instrument_pool(engine: AsyncEngine) -> None:
+    """Expõe o uso do pool de conexões do engine, lido a cada scrape."""
+    pool = engine.sync_engine.pool
+    # NullPool/StaticPool (testes, SQLite em memória) não têm essas medidas
+    if not hasattr(pool, "checkedout"):
+        return
+
+    Gauge(
+        "db_pool_checked_out",
+        "Conexões do pool em uso",
+    ).set_function(pool.checkedout)
+    Gauge(
+        "db_pool_size",
+        "Conexões mantidas no pool",
+    ).set_function(pool.size)
+    Gauge(
+        "db_pool_overflow",
+        "Conexões abertas além do pool (negativo: vagas ainda não abertas)",
+    ).set_function(pool.overflow)
@@ -0,0 +1,89 @@
+from pathlib import Path
+from typing import Any, Optional
+
+from opentelemetry import context, propagate, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+from app.core.config import settings
+from app.core.logger import logger
+
+# Sem setup_tracing (ou com TRACING_EXPORTER=none) o tracer é no-op: spans não
+# são gravados e nenhum header é propagado
+tracer = trace.get_tracer("transaction-service")
+
+_provider: Optional[TracerProvider] = None
+
+
+def _create_exporter(exporter: str):
+    if exporter == "otlp":
+        # Instalado pelo fastapi[standard]; importado só quando usado
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+
+        return OTLPSpanExporter(endpoint=settings.tracing_otlp_endpoint)
+
+    if exporter == "file":
+        path = Path(settings.tracing_file_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Um span JSON por linha
+        return ConsoleSpanExporter(
+            out=path.open("a", encoding="utf-8"),
+            formatter=lambda span: span.to_json(indent=None) + "\n",
+        )
+
+    if exporter == "console":
+        return ConsoleSpanExporter()
+
+    raise ValueError(f"TRACING_EXPORTER inválido: {exporter}")
+
+
+def setup_tracing(service_name: str) -> None:
+    """Configura o exporter de spans do processo (TRACING_EXPORTER)."""
+    global _provider
+
+    if settings.tracing_exporter == "none" or _provider is not None:
+        return
+
+    _provider = TracerProvider(
+        resource=Resource.create({"service.name": service_name}),
+        # Segue a decisão do processo anterior quando há contexto propagado
+        sampler=ParentBased(TraceIdRatioBased(settings.tracing_sample_ratio)),
+    )
+    _provider.add_span_processor(
+        BatchSpanProcessor(_create_exporter(settings.tracing_exporter))
+    )
+    trace.set_tracer_provider(_provider)
+    logger.info(
+        f"Tracing habilitado, exporter={settings.tracing_exporter}, service={service_name}"
+    )
+
+
+def shutdown_tracing() -> None:
+    """Envia os spans pendentes antes do processo terminar."""
+    if _provider is not None:
+        _provider.shutdown()
+
+
+def inject_context(carrier: Optional[dict[str, Any]] = None) -> dict[str, Any]:
+    """Grava o contexto do span atual (traceparent) em `carrier`."""
+    carrier = {} if carrier is None else carrier
+    propagate.inject(carrier)
+    return carrier
+
+
+def extract_context(carrier: Optional[dict[str, Any]]) -> context.Context:
+    """Contexto propagado em headers (HTTP, AMQP ou outbox)."""
+    return propagate.extract(
+        {key: str(value) for key, value in (carrier or {}).items()}
+    )
+
+
+def link_from(carrier: Optional[dict[str, Any]]) -> trace.Link:
+    """Link para o span propagado em `carrier` (ex.: mensagens de um lote)."""
+    return trace.Link(
+        trace.get_current_span(extract_context(carrier)).get_span_context()
+    )
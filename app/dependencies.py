@@ -1,5 +1,5 @@
 from fastapi import Depends
-from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core.database import get_session
 from app.repositories.transaction_repository import TransactionRepository
@@ -7,7 +7,7 @@ from app.services.transaction_service import TransactionService
 
 
 def get_transaction_repository(
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_session),
 ) -> TransactionRepository:
     return TransactionRepository(session)
 
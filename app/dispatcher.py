@@ -0,0 +1,177 @@
+import argparse
+import asyncio
+import signal
+from contextlib import suppress
+from datetime import datetime, timezone
+from typing import AsyncIterator
+
+from opentelemetry.trace import StatusCode
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.database import async_session, engine
+from app.core.logger import logger
+from app.core.tracing import setup_tracing, shutdown_tracing, tracer
+from app.integrations.bank_partner import concurrency_limiter
+from app.messaging.publisher import retry_tier_ms, with_jitter
+from app.models.transaction import Transaction
+from app.repositories.balance_cache import warn_if_process_local
+from app.repositories.transaction_repository import TransactionRepository
+from app.services.transaction_service import (
+    TransactionService,
+    is_last_attempt,
+    retries_done,
+    worker_id,
+)
+from app.supervisor import run_supervisor
+from app.worker import consume, start_metrics_server
+
+
+async def claimed_transactions(
+    stop: asyncio.Event, batch_size: int, poll_interval: float
+) -> AsyncIterator[Transaction]:
+    """
+    Reivindica lotes de transações elegíveis direto da tabela até `stop`.
+
+    Um lote cheio indica que há mais trabalho e a próxima consulta é feita
+    logo em seguida; caso contrário espera `poll_interval` segundos. No
+    shutdown, as transações do lote que ainda não foram entregues voltam
+    para pending.
+    """
+    claimant = worker_id()
+
+    while not stop.is_set():
+        try:
+            async with async_session() as session:
+                claimed = await TransactionRepository(session).claim_batch(
+                    claimant, batch_size, settings.claim_lease_s
+                )
+        except Exception as e:
+            logger.error(f"Erro ao reivindicar transações: {e}")
+            claimed = []
+
+        if claimed:
+            logger.info(f"{len(claimed)} transações reivindicadas")
+
+        for index, transaction in enumerate(claimed):
+            if stop.is_set():
+                async with async_session() as session:
+                    await TransactionRepository(session).release(
+                        [t.id for t in claimed[index:] if t.id is not None], claimant
+                    )
+                return
+            yield transaction
+
+        if len(claimed) < batch_size:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(stop.wait(), poll_interval)
+
+
+async def handle_transaction(transaction: Transaction) -> None:
+    """Processa uma transação reivindicada, com sessão de banco própria."""
+    # Sem mensagem não há contexto propagado: cada processamento é um trace novo
+    with tracer.start_as_current_span(
+        "process transactions", attributes={"transaction.id": transaction.id}
+    ) as span:
+        async with async_session() as session:
+            service = TransactionService(TransactionRepository(session))
+            # O claim foi feito com o lote inteiro: a transação pode ter esperado
+            # uma vaga além do lease e sido reivindicada por outro dispatcher. A
+            # renovação conta a tentativa, então esperar não gasta tentativas
+            renewed = await service.renew_claim(transaction)
+            if renewed is None:
+                return
+            transaction = renewed
+
+            # attempts já conta esta tentativa: mesma regra de retries do worker
+            retries = retries_done(transaction)
+            span.set_attribute("transaction.retry", retries)
+
+            # Lag desde a criação ou, em retries, desde quando a transação voltou
+            # a ser elegível
+            eligible_at = transaction.retry_at or transaction.created_at
+            # O SQLite devolve datetimes sem fuso; eles são gravados em UTC
+            eligible_at = eligible_at.replace(tzinfo=eligible_at.tzinfo or timezone.utc)
+            metrics.consume_lag.labels("retry" if retries else "new").observe(
+                max((datetime.now(timezone.utc) - eligible_at).total_seconds(), 0)
+            )
+
+            try:
+                await service.process_claimed(
+                    transaction,
+                    retry_delay_s=with_jitter(retry_tier_ms(retries + 1)) / 1000,
+                )
+            except Exception as e:
+                span.record_exception(e)
+                span.set_status(StatusCode.ERROR, str(e))
+                # A falha já foi registrada na transação (pending com retry_at ou failed)
+                if is_last_attempt(transaction):
+                    metrics.dead_letters.labels(metrics.reason(e)).inc()
+                else:
+                    metrics.retries.labels(metrics.reason(e)).inc()
+                    logger.info(
+                        f"Retry ({retries + 1}/{settings.max_retries}) agendado, "
+                        f"transaction_id={transaction.id}, error={e}"
+                    )
+
+
+async def main():
+    logger.info("Iniciando dispatcher (modo database, sem RabbitMQ)...")
+    setup_tracing("transaction-dispatcher")
+    warn_if_process_local("dispatcher")
+    if settings.dispatch_mode != "database":
+        logger.warning(
+            "DISPATCH_MODE diferente de database: a API continua gravando no outbox"
+        )
+    start_metrics_server()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    logger.info(
+        f"Dispatcher aguardando transações "
+        f"(batch={settings.dispatcher_batch_size}, concurrency={settings.worker_concurrency})..."
+    )
+    await consume(
+        claimed_transactions(
+            stop,
+            batch_size=settings.dispatcher_batch_size,
+            poll_interval=settings.dispatcher_poll_interval_ms / 1000,
+        ),
+        handle_transaction,
+        concurrency=settings.worker_concurrency,
+        shutdown_timeout=settings.worker_shutdown_timeout_s,
+        limiter=concurrency_limiter,
+    )
+
+    logger.info("Encerrando dispatcher...")
+    await engine.dispose()
+    shutdown_tracing()
+
+
+def run() -> None:
+    asyncio.run(main())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Dispatcher de transações por polling no banco (sem RabbitMQ)"
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=settings.worker_processes,
+        help="Quantidade de processos dispatcher (default: WORKER_PROCESSES)",
+    )
+    args = parser.parse_args()
+
+    if args.processes > 1:
+        run_supervisor(
+            run,
+            processes=args.processes,
+            shutdown_timeout=settings.worker_shutdown_timeout_s + 5,
+        )
+    else:
+        run()
@@ -1,15 +1,310 @@
 import asyncio
 import random
+import time
 import uuid
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum
+from typing import Optional
 
-from app.core.exceptions import BankPartnerError
+from opentelemetry.trace import SpanKind
+
+from app.core.config import settings
+from app.core.exceptions import BankPartnerError, CircuitOpenError
 from app.core.logger import logger
+from app.core.metrics import partner_request_duration, partner_requests
+from app.core.tracing import tracer
+from app.models.transaction import KindEnum
+
+# Máximo de transações aceitas pelo parceiro em uma única chamada de lote
+MAX_BATCH_SIZE = 100
+
+
+@dataclass
+class PartnerRequest:
+    external_id: uuid.UUID
+    amount: float
+    kind: KindEnum
+
+
+@dataclass
+class PartnerResult:
+    partner_id: Optional[str] = None
+    error: Optional[Exception] = None
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker baseado em taxa de erro e de chamadas lentas.
+
+    Fechado: chamadas passam e os resultados entram em uma janela deslizante.
+    Quando a janela tem ao menos `min_calls` chamadas e a taxa de erro ou de
+    chamadas lentas atinge o limite, o circuito abre. Aberto: chamadas falham
+    imediatamente com CircuitOpenError por `open_s` segundos. Meio-aberto:
+    até `half_open_calls` chamadas de teste passam; se todas tiverem sucesso o
+    circuito fecha, qualquer falha o abre novamente.
+    """
+
+    def __init__(
+        self,
+        window_s: float,
+        min_calls: int,
+        error_threshold: float,
+        slow_call_s: float,
+        slow_call_threshold: float,
+        open_s: float,
+        half_open_calls: int,
+    ):
+        self.window_s = window_s
+        self.min_calls = min_calls
+        self.error_threshold = error_threshold
+        self.slow_call_s = slow_call_s
+        self.slow_call_threshold = slow_call_threshold
+        self.open_s = open_s
+        self.half_open_calls = half_open_calls
+
+        self.state = CircuitState.CLOSED
+        self._calls: deque[tuple[float, bool, bool]] = deque()
+        self._opened_at = 0.0
+        self._half_open_started = 0
+        self._half_open_succeeded = 0
+
+    def retry_after(self) -> float:
+        """Segundos até o circuito aceitar novas chamadas (0 se já aceita)."""
+        if self.state == CircuitState.OPEN:
+            return max(self._opened_at + self.open_s - time.monotonic(), 0.0)
+        if (
+            self.state == CircuitState.HALF_OPEN
+            and self._half_open_started >= self.half_open_calls
+        ):
+            # Aguardando resultado das chamadas de teste
+            return min(self.slow_call_s, self.open_s)
+        return 0.0
+
+    def before_call(self) -> None:
+        """Reserva uma chamada ou levanta CircuitOpenError se o circuito não permitir."""
+        if self.state == CircuitState.OPEN:
+            if time.monotonic() - self._opened_at < self.open_s:
+                raise CircuitOpenError()
+            self._transition(CircuitState.HALF_OPEN)
+
+        if self.state == CircuitState.HALF_OPEN:
+            if self._half_open_started >= self.half_open_calls:
+                raise CircuitOpenError()
+            self._half_open_started += 1
+
+    def record(self, success: bool, latency: float) -> None:
+        """Registra o resultado de uma chamada feita após before_call."""
+        slow = latency > self.slow_call_s
+
+        if self.state == CircuitState.HALF_OPEN:
+            if not success or slow:
+                self._transition(CircuitState.OPEN)
+                return
+            self._half_open_succeeded += 1
+            if self._half_open_succeeded >= self.half_open_calls:
+                self._transition(CircuitState.CLOSED)
+            return
+
+        if self.state == CircuitState.OPEN:
+            return
+
+        now = time.monotonic()
+        self._calls.append((now, success, slow))
+        self._prune(now)
+
+        if len(self._calls) < self.min_calls:
+            return
+
+        if (
+            self.error_rate() >= self.error_threshold
+            or self.slow_call_rate() >= self.slow_call_threshold
+        ):
+            self._transition(CircuitState.OPEN)
+
+    def error_rate(self) -> float:
+        self._prune(time.monotonic())
+        if not self._calls:
+            return 0.0
+        return sum(not success for _, success, _ in self._calls) / len(self._calls)
+
+    def slow_call_rate(self) -> float:
+        self._prune(time.monotonic())
+        if not self._calls:
+            return 0.0
+        return sum(slow for _, _, slow in self._calls) / len(self._calls)
+
+    def _prune(self, now: float) -> None:
+        while self._calls and self._calls[0][0] < now - self.window_s:
+            self._calls.popleft()
+
+    def _transition(self, state: CircuitState) -> None:
+        logger.warning(
+            f"Circuit breaker do banco parceiro: {self.state.value} -> {state.value}"
+        )
+        self.state = state
+        self._half_open_started = 0
+        self._half_open_succeeded = 0
+        if state == CircuitState.OPEN:
+            self._opened_at = time.monotonic()
+        elif state == CircuitState.CLOSED:
+            self._calls.clear()
+
+
+class ConcurrencyLimiter:
+    """
+    Limitador adaptativo (AIMD) de chamadas simultâneas ao banco parceiro.
+
+    Cada chamada bem-sucedida e rápida aumenta o limite em 1/limite (cerca de
+    +1 a cada `limite` chamadas). Chamadas lentas, ou falhas enquanto a taxa de
+    erro do circuit breaker está acima de `error_threshold`, multiplicam o
+    limite por `backoff`, no máximo uma vez a cada `slow_call_s` do breaker.
+    Enquanto o circuito está aberto, acquire() aguarda sem liberar trabalho.
+    """
+
+    def __init__(
+        self,
+        breaker: CircuitBreaker,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        backoff: float,
+        error_threshold: float,
+    ):
+        self.breaker = breaker
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.error_threshold = error_threshold
+
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+
+    async def acquire(self) -> None:
+        while True:
+            delay = self.breaker.retry_after()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return
+
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    def record(self, success: bool, latency: float) -> None:
+        congested = latency > self.breaker.slow_call_s or (
+            not success and self.breaker.error_rate() >= self.error_threshold
+        )
+
+        if not congested:
+            if success:
+                self.limit = min(self.limit + 1 / self.limit, self.maximum)
+                self._wake()
+            return
+
+        now = time.monotonic()
+        if now - self._last_decrease < self.breaker.slow_call_s:
+            return
+
+        self._last_decrease = now
+        self.limit = max(self.limit * self.backoff, self.minimum)
+        logger.warning(
+            f"Limite de concorrência do banco parceiro reduzido para {int(self.limit)}"
+        )
+
+    def _wake(self) -> None:
+        available = int(self.limit) - self.in_flight
+        while available > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                available -= 1
+
+
+circuit_breaker = CircuitBreaker(
+    window_s=settings.partner_circuit_window_s,
+    min_calls=settings.partner_circuit_min_calls,
+    error_threshold=settings.partner_circuit_error_threshold,
+    slow_call_s=settings.partner_circuit_slow_call_s,
+    slow_call_threshold=settings.partner_circuit_slow_call_threshold,
+    open_s=settings.partner_circuit_open_s,
+    half_open_calls=settings.partner_circuit_half_open_calls,
+)
+
+concurrency_limiter = ConcurrencyLimiter(
+    circuit_breaker,
+    initial=settings.partner_limit_initial,
+    minimum=settings.partner_limit_min,
+    maximum=settings.partner_limit_max,
+    backoff=settings.partner_limit_backoff,
+    error_threshold=settings.partner_limit_error_threshold,
+)
+
+
+def _record(success: bool, started: float, mode: str = "single") -> None:
+    latency = time.monotonic() - started
+    circuit_breaker.record(success, latency)
+    concurrency_limiter.record(success, latency)
+    partner_requests.labels(mode, "success" if success else "error").inc()
+
+
+def _before_call(mode: str) -> None:
+    try:
+        circuit_breaker.before_call()
+    except CircuitOpenError:
+        partner_requests.labels(mode, "circuit_open").inc()
+        raise
 
 
 async def bank_partner_request(
     external_id: uuid.UUID,
     amount: float,
     kind: str,
+) -> str:
+    """Envia transação ao banco parceiro, protegida pelo circuit breaker."""
+    with tracer.start_as_current_span(
+        "bank_partner request",
+        kind=SpanKind.CLIENT,
+        attributes={"transaction.external_id": str(external_id)},
+    ):
+        _before_call("single")
+        started = time.monotonic()
+
+        try:
+            with partner_request_duration.labels("single").time():
+                partner_id = await _send(external_id, amount, kind)
+        except Exception:
+            _record(False, started)
+            raise
+
+        _record(True, started)
+        return partner_id
+
+
+async def _send(
+    external_id: uuid.UUID,
+    amount: float,
+    kind: str,
 ) -> str:
     """Simula integração com banco parceiro."""
     logger.info(
@@ -22,3 +317,61 @@ async def bank_partner_request(
         raise BankPartnerError()
 
     return str(uuid.uuid4())
+
+
+async def bank_partner_batch_request(
+    requests: list[PartnerRequest],
+) -> list[PartnerResult]:
+    """
+    Envia um lote de transações ao banco parceiro em uma única chamada.
+
+    Returns:
+        list[PartnerResult]: resultado de cada item, na mesma ordem de `requests`
+    """
+    if len(requests) > MAX_BATCH_SIZE:
+        raise ValueError(
+            f"Lote com {len(requests)} transações excede o máximo de {MAX_BATCH_SIZE}"
+        )
+
+    with tracer.start_as_current_span(
+        "bank_partner batch request",
+        kind=SpanKind.CLIENT,
+        attributes={"batch.size": len(requests)},
+    ) as span:
+        _before_call("batch")
+        started = time.monotonic()
+
+        try:
+            with partner_request_duration.labels("batch").time():
+                results = await _send_batch(requests)
+        except Exception:
+            _record(False, started, "batch")
+            raise
+
+        # Cada item conta como uma chamada para a taxa de erro do circuito
+        for result in results:
+            _record(result.error is None, started, "batch")
+
+        span.set_attribute(
+            "batch.errors", sum(result.error is not None for result in results)
+        )
+        return results
+
+
+async def _send_batch(requests: list[PartnerRequest]) -> list[PartnerResult]:
+    """Simula envio de um lote de transações ao banco parceiro."""
+    logger.info(
+        f"Enviando lote para banco parceiro, quantidade={len(requests)}, "
+        f"external_ids={[str(request.external_id) for request in requests]}"
+    )
+    await asyncio.sleep(0.2)
+
+    # Simula erro aleatório por item do lote
+    return [
+        (
+            PartnerResult(error=BankPartnerError())
+            if random.random() < 0.3
+            else PartnerResult(partner_id=str(uuid.uuid4()))
+        )
+        for _ in requests
+    ]
@@ -1,22 +1,42 @@
+import time
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 
 from app.api.routes import router
 from app.core.config import settings
-from app.core.database import init_db
+from app.core.database import async_session, engine, init_db
 from app.core.logger import logger
+from app.core.metrics import http_request_duration
+from app.core.tracing import setup_tracing, shutdown_tracing
+from app.messaging.outbox_relay import outbox_relay
 from app.messaging.publisher import RabbitMQPublisher
+from app.repositories.idempotency_cache import idempotency_cache
+from app.repositories.transaction_repository import TransactionRepository
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Iniciando o serviço de transações...")
+    # O FastAPI cria os spans das requisições (continuando um traceparent
+    # recebido) com o provider configurado aqui
+    setup_tracing("transaction-api")
     # Inicializa o banco de dados
-    init_db()
+    await init_db()
+    if settings.idempotency_cache_enabled and settings.idempotency_warm_up:
+        async with async_session() as session:
+            await idempotency_cache.warm_up(
+                TransactionRepository(session).iter_external_ids()
+            )
+    # No modo database o dispatcher lê direto de transactions: não há outbox
+    if settings.outbox_relay_enabled and settings.dispatch_mode == "rabbitmq":
+        outbox_relay.start()
     yield
     logger.info("Encerrando o serviço de transações...")
+    await outbox_relay.stop()
     await RabbitMQPublisher.close()
+    await engine.dispose()
+    shutdown_tracing()
 
 
 app = FastAPI(
@@ -26,4 +46,20 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+
+@app.middleware("http")
+async def record_request_duration(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Template da rota (ex.: /accounts/{account_id}/balance), não o path, para
+    # não criar uma série por conta
+    route = request.scope.get("route")
+    http_request_duration.labels(
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status=response.status_code,
+    ).observe(time.perf_counter() - started)
+    return response
+
+
 app.include_router(router)
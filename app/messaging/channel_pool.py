@@ -0,0 +1,53 @@
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable
+
+from aio_pika.abc import AbstractChannel
+
+from app.core.logger import logger
+
+
+class ChannelPool:
+    """
+    Pool limitado de canais RabbitMQ.
+
+    No máximo `max_size` canais ficam em uso ao mesmo tempo; quem excede aguarda
+    um canal ser devolvido. Canais fechados são descartados tanto na retirada
+    quanto na devolução (health check), e um novo é aberto sob demanda.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Awaitable[AbstractChannel]],
+        max_size: int,
+    ):
+        self._factory = factory
+        self._semaphore = asyncio.Semaphore(max_size)
+        self._idle: deque[AbstractChannel] = deque()
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[AbstractChannel]:
+        async with self._semaphore:
+            channel = await self._checkout()
+            try:
+                yield channel
+            finally:
+                if channel.is_closed:
+                    logger.warning("Canal RabbitMQ fechado durante o uso, descartando")
+                else:
+                    self._idle.append(channel)
+
+    async def _checkout(self) -> AbstractChannel:
+        while self._idle:
+            channel = self._idle.popleft()
+            if not channel.is_closed:
+                return channel
+
+        return await self._factory()
+
+    async def close(self) -> None:
+        while self._idle:
+            channel = self._idle.popleft()
+            if not channel.is_closed:
+                await channel.close()
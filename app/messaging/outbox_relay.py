@@ -0,0 +1,143 @@
+import asyncio
+import os
+import socket
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.core.database import async_session
+from app.core.logger import logger
+from app.core.metrics import outbox_messages, outbox_publish_duration
+from app.messaging.publisher import publish_many
+from app.repositories.outbox_repository import OutboxRepository
+
+
+class OutboxRelay:
+    """
+    Drena a tabela outbox para o RabbitMQ em lotes.
+
+    Cada lote é reivindicado pelo relay (um por processo da API), publicado com
+    publish_many e só as mensagens confirmadas pelo broker são removidas; as
+    demais são liberadas para a próxima rodada (entrega at-least-once, o
+    worker ignora transações já processadas).
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        batch_size: int,
+        poll_interval: float,
+        lease_s: float = 30.0,
+    ):
+        self._session_factory = session_factory
+        self._batch_size = batch_size
+        self._poll_interval = poll_interval
+        self._lease_s = lease_s
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def notify(self) -> None:
+        """Acorda o relay após um commit com novas mensagens no outbox."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def relay_once(self) -> int:
+        """Publica um lote do outbox e retorna quantas mensagens foram lidas."""
+        # pid lido a cada rodada: cada processo da API tem o seu relay
+        claimant = f"{socket.gethostname()}:{os.getpid()}"
+
+        async with self._session_factory() as session:
+            repository = OutboxRepository(session)
+            messages = await repository.claim_batch(
+                claimant, self._batch_size, self._lease_s
+            )
+
+            if not messages:
+                return 0
+
+            try:
+                with outbox_publish_duration.time():
+                    failed = set(
+                        await publish_many(
+                            [message.transaction_id for message in messages],
+                            trace_contexts={
+                                message.transaction_id: message.trace_context
+                                for message in messages
+                                if message.trace_context
+                            },
+                        )
+                    )
+            except Exception:
+                # Broker indisponível: o lote inteiro volta para a próxima rodada
+                await repository.release(
+                    [message.id for message in messages if message.id is not None],
+                    claimant,
+                )
+                raise
+            outbox_messages.labels("published").inc(len(messages) - len(failed))
+            outbox_messages.labels("failed").inc(len(failed))
+            await repository.delete(
+                [
+                    message.id
+                    for message in messages
+                    if message.id is not None and message.transaction_id not in failed
+                ]
+            )
+            await repository.release(
+                [
+                    message.id
+                    for message in messages
+                    if message.id is not None and message.transaction_id in failed
+                ],
+                claimant,
+            )
+
+        logger.info(
+            f"Outbox: {len(messages) - len(failed)} mensagens publicadas, {len(failed)} pendentes"
+        )
+        return len(messages)
+
+    async def run(self) -> None:
+        self._wakeup = asyncio.Event()
+
+        while True:
+            try:
+                relayed = await self.relay_once()
+            except Exception as e:
+                logger.error(f"Erro ao drenar outbox: {e}")
+                relayed = 0
+
+            # Lote cheio: provavelmente há mais mensagens, continua sem esperar
+            if relayed >= self._batch_size:
+                continue
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._wakeup = None
+
+
+outbox_relay = OutboxRelay(
+    async_session,
+    batch_size=settings.outbox_batch_size,
+    poll_interval=settings.outbox_poll_interval_ms / 1000,
+    lease_s=settings.outbox_claim_lease_s,
+)
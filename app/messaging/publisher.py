@@ -1,93 +1,211 @@
+import asyncio
 import json
-from typing import Optional
+import random
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
 
 import aio_pika
 from aio_pika.abc import AbstractChannel, AbstractRobustConnection
+from opentelemetry.trace import SpanKind
 
 from app.core.config import settings
+from app.core.logger import logger
+from app.core.tracing import extract_context, inject_context, tracer
+from app.messaging.channel_pool import ChannelPool
 
 
 class RabbitMQPublisher:
     _connection: Optional[AbstractRobustConnection] = None
-    _channel: Optional[AbstractChannel] = None
+    _pool: Optional[ChannelPool] = None
+    _lock: Optional[asyncio.Lock] = None
 
     @classmethod
-    async def get_channel(cls) -> AbstractChannel:
-        if cls._connection is None or cls._connection.is_closed:
-            cls._connection = await aio_pika.connect_robust(settings.rabbitmq_url)
+    @asynccontextmanager
+    async def channel(cls) -> AsyncIterator[AbstractChannel]:
+        """Empresta um canal do pool pelo tempo do bloco `async with`."""
+        if cls._pool is None:
+            cls._pool = ChannelPool(
+                cls._open_channel, max_size=settings.publisher_channel_pool_size
+            )
 
-        if cls._channel is None or cls._channel.is_closed:
-            cls._channel = await cls._connection.channel()
-            await cls._setup_queues(cls._channel)
+        async with cls._pool.acquire() as channel:
+            yield channel
 
-        return cls._channel
+    @classmethod
+    async def _open_channel(cls) -> AbstractChannel:
+        connection = await cls._get_connection()
+
+        # Com confirms, cada publish só retorna após o ack do broker; vários
+        # publishes concorrentes no mesmo canal são confirmados em pipeline
+        return await connection.channel(publisher_confirms=settings.publisher_confirms)
+
+    @classmethod
+    async def _get_connection(cls) -> AbstractRobustConnection:
+        if cls._lock is None:
+            cls._lock = asyncio.Lock()
+
+        # Lock evita que requisições concorrentes abram várias conexões
+        async with cls._lock:
+            if cls._connection is None or cls._connection.is_closed:
+                cls._connection = await aio_pika.connect_robust(settings.rabbitmq_url)
+
+                # Filas são declaradas uma vez por conexão, não a cada canal
+                channel = await cls._connection.channel()
+                await cls._setup_queues(channel)
+                await channel.close()
+
+        return cls._connection
 
     @classmethod
     async def _setup_queues(cls, channel: AbstractChannel) -> None:
-        """Configura filas principal, retry e DLQ."""
-        # Fila de retry: mensagens expiram e voltam para transactions
+        await declare_queues(channel)
+
+    @classmethod
+    async def close(cls) -> None:
+        if cls._pool:
+            await cls._pool.close()
+        if cls._connection and not cls._connection.is_closed:
+            await cls._connection.close()
+        cls._pool = None
+        cls._connection = None
+        cls._lock = None
+
+
+def retry_queue_name(delay_ms: int) -> str:
+    """Nome da fila de retry de um tier, ex.: 1000 -> transactions.retry.1s."""
+    if delay_ms % 60000 == 0:
+        return f"transactions.retry.{delay_ms // 60000}m"
+    if delay_ms % 1000 == 0:
+        return f"transactions.retry.{delay_ms // 1000}s"
+    return f"transactions.retry.{delay_ms}ms"
+
+
+async def declare_queues(channel: AbstractChannel) -> None:
+    """Configura filas principal, retry (uma por tier de backoff) e DLQ."""
+    # Filas de retry: mensagens expiram e voltam para transactions. O TTL da
+    # fila é o teto do tier; o atraso efetivo (com jitter) vai em cada mensagem
+    for delay_ms in settings.retry_tiers_ms:
         await channel.declare_queue(
-            "transactions.retry",
+            retry_queue_name(delay_ms),
             durable=True,
             arguments={
-                "x-message-ttl": settings.retry_ttl_ms,
+                "x-message-ttl": round(delay_ms * (1 + settings.retry_jitter)),
                 "x-dead-letter-exchange": "",  # Default exchange
                 "x-dead-letter-routing-key": "transactions",
             },
         )
 
-        # Fila principal
-        await channel.declare_queue("transactions", durable=True)
-
-        # Dead Letter Queue: mensagens que falharam todas as tentativas
-        await channel.declare_queue("transactions.dlq", durable=True)
+    # Fila principal
+    await channel.declare_queue("transactions", durable=True)
 
-    @classmethod
-    async def close(cls) -> None:
-        if cls._channel and not cls._channel.is_closed:
-            await cls._channel.close()
-        if cls._connection and not cls._connection.is_closed:
-            await cls._connection.close()
-        cls._channel = None
-        cls._connection = None
+    # Dead Letter Queue: mensagens que falharam todas as tentativas
+    await channel.declare_queue("transactions.dlq", durable=True)
 
 
-async def publish_transaction(transaction_id: int, retry_count: int = 0):
-    """Publica transação na fila principal."""
-    channel = await RabbitMQPublisher.get_channel()
-
-    message = aio_pika.Message(
+def _transaction_message(transaction_id: int, retry_count: int) -> aio_pika.Message:
+    return aio_pika.Message(
         body=json.dumps({"transaction_id": transaction_id}).encode(),
         delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
-        headers={"x-retry-count": retry_count},
+        # traceparent do span de publicação vai junto, para o worker continuar o trace
+        headers=inject_context({"x-retry-count": retry_count}),
+        # Base do lag de consumo medido pelo worker
+        timestamp=datetime.now(timezone.utc),
     )
 
-    await channel.default_exchange.publish(
-        message,
-        routing_key="transactions",
-    )
+
+async def _publish_transaction(
+    channel: AbstractChannel, transaction_id: int, trace_context: Optional[dict]
+) -> None:
+    # O span de publicação é filho da requisição que gravou o outbox, não do relay
+    with tracer.start_as_current_span(
+        "publish transactions",
+        context=extract_context(trace_context),
+        kind=SpanKind.PRODUCER,
+        attributes={"transaction.id": transaction_id},
+    ):
+        await channel.default_exchange.publish(
+            _transaction_message(transaction_id, 0),
+            routing_key="transactions",
+        )
+
+
+async def publish_many(
+    transaction_ids: list[int], trace_contexts: Optional[dict[int, dict]] = None
+) -> list[int]:
+    """
+    Publica várias transações na fila principal em pipeline.
+
+    Até `publisher_max_outstanding` mensagens ficam aguardando confirmação do
+    broker ao mesmo tempo, em vez de uma ida e volta por mensagem.
+
+    Args:
+        trace_contexts: contexto de tracing gravado no outbox de cada transação
+
+    Returns:
+        list[int]: transaction_ids cuja publicação não foi confirmada
+    """
+    trace_contexts = trace_contexts or {}
+    failed: list[int] = []
+    chunk_size = settings.publisher_max_outstanding
+
+    async with RabbitMQPublisher.channel() as channel:
+        for start in range(0, len(transaction_ids), chunk_size):
+            chunk = transaction_ids[start : start + chunk_size]
+            results = await asyncio.gather(
+                *(
+                    _publish_transaction(
+                        channel, transaction_id, trace_contexts.get(transaction_id)
+                    )
+                    for transaction_id in chunk
+                ),
+                return_exceptions=True,
+            )
+
+            for transaction_id, result in zip(chunk, results):
+                if isinstance(result, BaseException):
+                    logger.error(
+                        f"Publicação não confirmada, transaction_id={transaction_id}: {result}"
+                    )
+                    failed.append(transaction_id)
+
+    return failed
+
+
+def retry_tier_ms(retry_count: int) -> int:
+    """Atraso do tier da tentativa (a N-ésima usa o N-ésimo, a partir daí o último)."""
+    tiers = settings.retry_tiers_ms
+    return tiers[min(max(retry_count, 1), len(tiers)) - 1]
+
+
+def with_jitter(delay_ms: int) -> int:
+    # Jitter espalha os retries no tempo em vez de dispará-los em ondas
+    jitter = random.uniform(-settings.retry_jitter, settings.retry_jitter)
+    return max(round(delay_ms * (1 + jitter)), 1)
 
 
 async def publish_to_retry(transaction_id: int, retry_count: int):
-    """Publica transação na fila de retry."""
-    channel = await RabbitMQPublisher.get_channel()
+    """Publica transação na fila de retry do tier correspondente à tentativa."""
+    delay_ms = retry_tier_ms(retry_count)
+    expiration_ms = with_jitter(delay_ms)
 
     message = aio_pika.Message(
         body=json.dumps({"transaction_id": transaction_id}).encode(),
         delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
-        headers={"x-retry-count": retry_count},
+        headers=inject_context({"x-retry-count": retry_count}),
+        expiration=expiration_ms / 1000,
+        timestamp=datetime.now(timezone.utc),
     )
 
-    await channel.default_exchange.publish(
-        message,
-        routing_key="transactions.retry",
-    )
+    async with RabbitMQPublisher.channel() as channel:
+        await channel.default_exchange.publish(
+            message,
+            routing_key=retry_queue_name(delay_ms),
+        )
 
 
 async def publish_to_dlq(transaction_id: int, retry_count: int, error: str):
     """Publica transação na DLQ após esgotar tentativas."""
-    channel = await RabbitMQPublisher.get_channel()
-
     message = aio_pika.Message(
         body=json.dumps(
             {
@@ -96,10 +214,11 @@ async def publish_to_dlq(transaction_id: int, retry_count: int, error: str):
             }
         ).encode(),
         delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
-        headers={"x-retry-count": retry_count},
+        headers=inject_context({"x-retry-count": retry_count}),
     )
 
-    await channel.default_exchange.publish(
-        message,
-        routing_key="transactions.dlq",
-    )
+    async with RabbitMQPublisher.channel() as channel:
+        await channel.default_exchange.publish(
+            message,
+            routing_key="transactions.dlq",
+        )
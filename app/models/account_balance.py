@@ -0,0 +1,10 @@
+from sqlmodel import Field, SQLModel
+
+
+class AccountBalance(SQLModel, table=True):
+    """Saldo materializado por conta, atualizado a cada transação completada."""
+
+    __tablename__: str = "account_balances"
+
+    account_id: str = Field(primary_key=True)
+    balance: float = Field(default=0)
@@ -0,0 +1,31 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import JSON, DateTime
+from sqlmodel import Field, SQLModel
+
+
+class OutboxMessage(SQLModel, table=True):
+    """Mensagem a publicar no RabbitMQ, gravada no mesmo commit da transação."""
+
+    __tablename__: str = "outbox"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    transaction_id: int
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),  # type: ignore[call-overload]
+    )
+    # Claim do relay que está publicando a mensagem (lease): cada processo da
+    # API roda um relay e eles não podem publicar as mesmas linhas
+    claimed_by: str | None = Field(default=None)
+    claimed_at: Optional[datetime] = Field(
+        default=None,
+        sa_type=DateTime(timezone=True),  # type: ignore[call-overload]
+    )
+    # Contexto de tracing da requisição que criou a transação (traceparent),
+    # repassado pelo relay nos headers da mensagem
+    trace_context: Optional[dict] = Field(
+        default=None,
+        sa_type=JSON,  # type: ignore[call-overload]
+    )
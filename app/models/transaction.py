@@ -1,7 +1,9 @@
 import uuid
+from datetime import datetime, timezone
 from enum import Enum
 from typing import Optional
 
+from sqlalchemy import DateTime, Index
 from sqlmodel import Field, SQLModel
 
 
@@ -12,6 +14,16 @@ class KindEnum(str, Enum):
 
 class Transaction(SQLModel, table=True):
     __tablename__: str = "transactions"
+    __table_args__ = (
+        # Índice de cobertura para consultas de saldo: filtra por conta/status/tipo
+        # e soma amount sem precisar ler a linha completa
+        Index("ix_transactions_balance", "account_id", "status", "kind", "amount"),
+        # Histórico por conta com paginação keyset: WHERE account_id = ? AND
+        # id < cursor ORDER BY id DESC percorre só a página pedida
+        Index("ix_transactions_account_history", "account_id", "id"),
+        # Polling do dispatcher: próximas pendentes por ordem de chegada
+        Index("ix_transactions_dispatch", "status", "id"),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
     external_id: uuid.UUID = Field(index=True, unique=True)
@@ -20,4 +32,21 @@ class Transaction(SQLModel, table=True):
     status: str = Field(default="pending")
     partner_id: str | None = Field(default=None, index=True)
 
-    account_id: str = Field(index=True)
+    account_id: str
+    # Claim do worker: quem está processando e desde quando (lease)
+    claimed_by: str | None = Field(default=None)
+    claimed_at: Optional[datetime] = Field(
+        default=None,
+        sa_type=DateTime(timezone=True),  # type: ignore[call-overload]
+    )
+    # Tentativas de processamento (incrementado a cada claim) e, no modo
+    # dispatcher, quando a transação volta a ser elegível após uma falha
+    attempts: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    retry_at: Optional[datetime] = Field(
+        default=None,
+        sa_type=DateTime(timezone=True),  # type: ignore[call-overload]
+    )
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),  # type: ignore[call-overload]
+    )
@@ -0,0 +1,43 @@
+import argparse
+import asyncio
+
+from app.core.database import async_session, engine, init_db
+from app.core.logger import logger
+from app.repositories.transaction_repository import TransactionRepository
+from app.services.account_services import AccountService
+
+
+async def main(dry_run: bool = False) -> int:
+    """Reconstrói a tabela account_balances a partir de transactions e reporta divergências."""
+    await init_db()
+
+    async with async_session() as session:
+        service = AccountService(TransactionRepository(session))
+        drifts = await service.reconcile_balances(dry_run=dry_run)
+
+    await engine.dispose()
+
+    for drift in drifts:
+        logger.warning(
+            f"Divergência de saldo, account_id={drift.account_id}, "
+            f"armazenado={drift.stored_balance}, esperado={drift.expected_balance}"
+        )
+
+    action = "encontradas" if dry_run else "corrigidas"
+    logger.info(f"Reconciliação concluída, {len(drifts)} divergências {action}")
+
+    return 1 if drifts and dry_run else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Reconcilia os saldos materializados com as transações"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Apenas reporta divergências, sem reescrever a tabela de saldos",
+    )
+    args = parser.parse_args()
+
+    raise SystemExit(asyncio.run(main(dry_run=args.dry_run)))
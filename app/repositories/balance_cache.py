@@ -0,0 +1,205 @@
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Optional
+
+from app.core.config import settings
+from app.core.logger import logger
+
+
+class BalanceCache(ABC):
+    """
+    Cache read-through dos saldos materializados.
+
+    O saldo só muda quando o worker completa uma transação, que invalida a
+    entrada da conta logo após o commit. O TTL limita por quanto tempo uma
+    leitura concorrente com a invalidação pode deixar um valor antigo.
+    """
+
+    backend = "base"
+    # Entradas visíveis só ao próprio processo (a invalidação não chega aos outros)
+    process_local = False
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, account_id: str) -> Optional[float]:
+        balance = await self._get(account_id)
+        if balance is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return balance
+
+    @abstractmethod
+    async def _get(self, account_id: str) -> Optional[float]: ...
+
+    @abstractmethod
+    async def set(self, account_id: str, balance: float) -> None: ...
+
+    @abstractmethod
+    async def invalidate(self, account_id: str) -> None: ...
+
+    @abstractmethod
+    async def clear(self) -> None: ...
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class NullBalanceCache(BalanceCache):
+    """Cache desabilitado: toda leitura vai ao banco."""
+
+    backend = "none"
+
+    async def _get(self, account_id: str) -> Optional[float]:
+        return None
+
+    async def set(self, account_id: str, balance: float) -> None:
+        pass
+
+    async def invalidate(self, account_id: str) -> None:
+        pass
+
+    async def clear(self) -> None:
+        pass
+
+
+class InMemoryBalanceCache(BalanceCache):
+    """
+    Cache em processo com TTL e limite de entradas (LRU).
+
+    Cada processo tem o seu: a invalidação feita pelo worker não alcança a
+    API, então aqui o TTL é o que limita a defasagem do saldo.
+    """
+
+    backend = "memory"
+    process_local = True
+
+    def __init__(self, max_size: int, ttl_s: float):
+        super().__init__()
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self._entries: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def _get(self, account_id: str) -> Optional[float]:
+        entry = self._entries.get(account_id)
+        if entry is None:
+            return None
+
+        expires_at, balance = entry
+        if expires_at < time.monotonic():
+            del self._entries[account_id]
+            return None
+
+        self._entries.move_to_end(account_id)
+        return balance
+
+    async def set(self, account_id: str, balance: float) -> None:
+        self._entries[account_id] = (time.monotonic() + self.ttl_s, balance)
+        self._entries.move_to_end(account_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def invalidate(self, account_id: str) -> None:
+        self._entries.pop(account_id, None)
+
+    async def clear(self) -> None:
+        self._entries.clear()
+
+
+class RedisBalanceCache(BalanceCache):
+    """
+    Cache compartilhado no Redis (extra opcional `redis`).
+
+    API e worker enxergam as mesmas entradas, então a invalidação feita pelo
+    worker ao completar uma transação vale para todos os processos. Falhas do
+    Redis são tratadas como miss: o saldo é lido do banco.
+    """
+
+    backend = "redis"
+
+    def __init__(self, url: str, ttl_s: float, prefix: str = "balance:", client=None):
+        super().__init__()
+        if client is None:
+            try:
+                from redis.asyncio import Redis
+            except ImportError as e:
+                raise RuntimeError(
+                    "BALANCE_CACHE_BACKEND=redis requer o extra opcional: uv sync --extra redis"
+                ) from e
+            client = Redis.from_url(url)
+
+        self.client = client
+        self.ttl_s = ttl_s
+        self.prefix = prefix
+
+    def _key(self, account_id: str) -> str:
+        return f"{self.prefix}{account_id}"
+
+    async def _get(self, account_id: str) -> Optional[float]:
+        try:
+            value = await self.client.get(self._key(account_id))
+        except Exception as e:
+            logger.warning(f"Falha ao ler saldo do Redis, error={str(e)}")
+            return None
+        return float(value) if value is not None else None
+
+    async def set(self, account_id: str, balance: float) -> None:
+        try:
+            await self.client.set(
+                self._key(account_id), repr(balance), px=int(self.ttl_s * 1000)
+            )
+        except Exception as e:
+            logger.warning(f"Falha ao gravar saldo no Redis, error={str(e)}")
+
+    async def invalidate(self, account_id: str) -> None:
+        try:
+            await self.client.delete(self._key(account_id))
+        except Exception as e:
+            logger.warning(f"Falha ao invalidar saldo no Redis, error={str(e)}")
+
+    async def clear(self) -> None:
+        try:
+            keys = [key async for key in self.client.scan_iter(f"{self.prefix}*")]
+            if keys:
+                await self.client.delete(*keys)
+        except Exception as e:
+            logger.warning(f"Falha ao limpar saldos do Redis, error={str(e)}")
+
+
+def create_balance_cache() -> BalanceCache:
+    """Cria o cache de saldos configurado em BALANCE_CACHE_BACKEND."""
+    backend = settings.balance_cache_backend
+    if backend == "memory":
+        return InMemoryBalanceCache(
+            max_size=settings.balance_cache_max_size,
+            ttl_s=settings.balance_cache_ttl_s,
+        )
+    if backend == "redis":
+        return RedisBalanceCache(
+            url=settings.balance_cache_redis_url,
+            ttl_s=settings.balance_cache_ttl_s,
+        )
+    if backend == "none":
+        return NullBalanceCache()
+    raise ValueError(f"BALANCE_CACHE_BACKEND inválido: {backend}")
+
+
+balance_cache = create_balance_cache()
+
+
+def warn_if_process_local(process: str) -> None:
+    """Avisa no startup de `process` que a invalidação não alcança o cache da API."""
+    if balance_cache.process_local:
+        logger.warning(
+            f"BALANCE_CACHE_BACKEND={balance_cache.backend}: a invalidação de saldos "
+            f"deste processo não alcança a API; use redis com API e {process} separados"
+        )
@@ -0,0 +1,140 @@
+import hashlib
+import math
+import time
+from collections import OrderedDict
+from typing import AsyncIterable, Optional
+from uuid import UUID
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.models.transaction import Transaction
+
+
+class BloomFilter:
+    """
+    Bloom filter de external_id.
+
+    `might_contain` nunca retorna False para um id adicionado; retorna True
+    para ids nunca vistos com probabilidade próxima de `error_rate` enquanto o
+    filtro tiver até `capacity` itens.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, external_id: UUID) -> list[int]:
+        # Double hashing: k posições derivadas de dois hashes de 64 bits
+        digest = hashlib.blake2b(external_id.bytes, digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, external_id: UUID) -> None:
+        for position in self._positions(external_id):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def might_contain(self, external_id: UUID) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(external_id)
+        )
+
+
+class IdempotencyCache:
+    """
+    Cache em processo na frente da busca por external_id.
+
+    O bloom filter permite pular a consulta ao banco para ids certamente
+    novos e o LRU responde retentativas recentes sem ir ao banco. O filtro só
+    conhece ids vistos por este processo (e os carregados em `warm_up`), então
+    um falso "novo" é possível; a constraint única de external_id continua
+    sendo a palavra final e o repositório trata a violação.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        bloom_capacity: int,
+        bloom_error_rate: float,
+        lru_size: int,
+        lru_ttl_s: float,
+    ):
+        self.enabled = enabled
+        self.bloom_capacity = bloom_capacity
+        self.bloom_error_rate = bloom_error_rate
+        self.lru_size = lru_size
+        self.lru_ttl_s = lru_ttl_s
+        self.clear()
+
+    def clear(self) -> None:
+        self._bloom = BloomFilter(self.bloom_capacity, self.bloom_error_rate)
+        self._recent: OrderedDict[UUID, tuple[float, Transaction]] = OrderedDict()
+
+    def might_exist(self, external_id: UUID) -> bool:
+        """False apenas quando o external_id certamente não foi visto."""
+        if not self.enabled:
+            return True
+        return self._bloom.might_contain(external_id)
+
+    def get(self, external_id: UUID) -> Optional[Transaction]:
+        """Transação recente com o external_id, se ainda estiver no LRU."""
+        if not self.enabled:
+            return None
+
+        entry = self._recent.get(external_id)
+        if entry is None:
+            return None
+
+        expires_at, transaction = entry
+        if expires_at < time.monotonic():
+            # O status muda no worker; entradas antigas não são confiáveis
+            del self._recent[external_id]
+            return None
+
+        self._recent.move_to_end(external_id)
+        return transaction
+
+    def remember(self, transaction: Transaction) -> None:
+        """Registra uma transação persistida no filtro e no LRU."""
+        if not self.enabled:
+            return
+
+        self._bloom.add(transaction.external_id)
+        # Cópia desanexada da sessão que a carregou
+        self._recent[transaction.external_id] = (
+            time.monotonic() + self.lru_ttl_s,
+            Transaction(**transaction.model_dump()),
+        )
+        self._recent.move_to_end(transaction.external_id)
+        while len(self._recent) > self.lru_size:
+            self._recent.popitem(last=False)
+
+    async def warm_up(self, external_ids: AsyncIterable[UUID]) -> None:
+        """Carrega no bloom filter os external_id já persistidos."""
+        if not self.enabled:
+            return
+
+        started = time.monotonic()
+        async for external_id in external_ids:
+            self._bloom.add(external_id)
+
+        if self._bloom.count > self.bloom_capacity:
+            logger.warning(
+                f"Bloom filter de idempotência acima da capacidade, itens={self._bloom.count}, capacidade={self.bloom_capacity}"
+            )
+        logger.info(
+            f"Cache de idempotência aquecido, itens={self._bloom.count}, duração={time.monotonic() - started:.2f}s"
+        )
+
+
+idempotency_cache = IdempotencyCache(
+    enabled=settings.idempotency_cache_enabled,
+    bloom_capacity=settings.idempotency_bloom_capacity,
+    bloom_error_rate=settings.idempotency_bloom_error_rate,
+    lru_size=settings.idempotency_lru_size,
+    lru_ttl_s=settings.idempotency_lru_ttl_s,
+)
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, or_, update
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models.outbox import OutboxMessage
+
+
+class OutboxRepository:
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def claim_batch(
+        self, claimed_by: str, limit: int, lease_s: float
+    ) -> list[OutboxMessage]:
+        """
+        Reivindica as mensagens mais antigas sem claim ativo, na ordem de criação.
+
+        Cada processo da API roda um relay: o claim (claimed_by/claimed_at) em
+        um único UPDATE impede que dois relays publiquem a mesma mensagem. No
+        PostgreSQL linhas travadas por outro relay são puladas (FOR UPDATE SKIP
+        LOCKED); no SQLite o UPDATE inteiro é atômico. Um claim mais antigo que
+        `lease_s` (relay que morreu no meio) pode ser reivindicado de novo.
+        """
+        now = datetime.now(timezone.utc)
+        candidates = (
+            select(OutboxMessage.id)
+            .where(
+                or_(
+                    col(OutboxMessage.claimed_at).is_(None),
+                    col(OutboxMessage.claimed_at) < now - timedelta(seconds=lease_s),
+                )
+            )
+            .order_by(col(OutboxMessage.id))
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        result = await self.session.exec(
+            update(OutboxMessage)
+            .where(col(OutboxMessage.id).in_(candidates.scalar_subquery()))
+            .values(claimed_by=claimed_by, claimed_at=now)
+            .returning(OutboxMessage)  # type: ignore[call-overload]
+        )
+        messages = list(result.scalars().all())
+        for message in messages:
+            self.session.expunge(message)
+        await self.session.commit()
+
+        return sorted(messages, key=lambda message: message.id or 0)
+
+    async def release(self, message_ids: list[int], claimed_by: str) -> None:
+        """Libera o claim de mensagens não publicadas, para a próxima rodada."""
+        if not message_ids:
+            return
+
+        await self.session.exec(  # type: ignore[call-overload]
+            update(OutboxMessage)
+            .where(
+                col(OutboxMessage.id).in_(message_ids),
+                OutboxMessage.claimed_by == claimed_by,
+            )
+            .values(claimed_by=None, claimed_at=None)
+        )
+        await self.session.commit()
+
+    async def delete(self, message_ids: list[int]) -> None:
+        if not message_ids:
+            return
+
+        await self.session.exec(  # type: ignore[call-overload]
+            delete(OutboxMessage).where(col(OutboxMessage.id).in_(message_ids))
+        )
+        await self.session.commit()
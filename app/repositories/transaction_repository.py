@@ -1,60 +1,525 @@
-from typing import Optional
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Optional, Sequence
 from uuid import UUID
 
-from sqlalchemy import func
-from sqlmodel import Session, select
+from sqlalchemy import and_, case, delete, exists, func, insert, or_, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app.core.config import settings
+from app.core.tracing import inject_context
+from app.models.account_balance import AccountBalance
+from app.models.outbox import OutboxMessage
 from app.models.transaction import KindEnum, Transaction
+from app.repositories.idempotency_cache import idempotency_cache
+
+
+def _computed_balances():
+    """SELECT do saldo de cada conta somando as transações completadas."""
+    signed_amount = case(
+        (Transaction.kind == KindEnum.CREDIT, Transaction.amount),
+        else_=-Transaction.amount,
+    )
+    return (
+        select(Transaction.account_id, func.sum(signed_amount))
+        .where(Transaction.status == "completed")
+        .group_by(Transaction.account_id)
+    )
 
 
 class TransactionRepository:
 
-    def __init__(self, session: Session):
+    def __init__(self, session: AsyncSession):
         self.session = session
 
-    def create(self, transaction: Transaction) -> Transaction:
-        self.session.add(transaction)
-        self.session.commit()
-        self.session.refresh(transaction)
-        return transaction
+    async def create_or_get(self, transaction: Transaction) -> tuple[Transaction, bool]:
+        """
+        Insere a transação ou retorna a existente com o mesmo external_id.
+
+        O caminho comum é um único INSERT ... ON CONFLICT DO NOTHING RETURNING
+        (mais o outbox no modo rabbitmq, no mesmo commit); só em conflito a transação existente é
+        buscada. Requisições concorrentes com o mesmo id não geram erro: a
+        constraint única escolhe uma e as demais recebem a existente.
+
+        Returns:
+            tuple[Transaction, bool]: (transação, foi_criada)
+        """
+        cached = idempotency_cache.get(transaction.external_id)
+        if cached is not None:
+            return cached, False
+
+        statement = (
+            self._insert(Transaction)
+            .values(**transaction.model_dump(exclude={"id"}))
+            .on_conflict_do_nothing(index_elements=[Transaction.external_id])
+            .returning(Transaction)
+        )
+        result = await self.session.exec(statement)  # type: ignore[call-overload]
+        created = result.scalars().first()
+
+        if created is None:
+            await self.session.rollback()
+            existing = await self.get_by_external_id(
+                transaction.external_id, use_cache=False
+            )
+            assert existing is not None
+            return existing, False
+
+        if settings.dispatch_mode == "rabbitmq":
+            self.session.add(
+                OutboxMessage(
+                    transaction_id=created.id, trace_context=inject_context() or None
+                )
+            )
+        await self.session.commit()
+        idempotency_cache.remember(created)
+
+        return created, True
 
-    def get_by_id(self, transaction_id: int) -> Optional[Transaction]:
-        return self.session.get(Transaction, transaction_id)
+    async def create_many(self, transactions: list[Transaction]) -> list[Transaction]:
+        """
+        Cria várias transações com um INSERT multi-linha e registra suas
+        mensagens no outbox (modo rabbitmq), tudo em um único commit.
 
-    def get_by_external_id(self, external_id: UUID) -> Optional[Transaction]:
+        Transações cujo external_id já existe são ignoradas pela constraint
+        única (ON CONFLICT DO NOTHING) e não aparecem no retorno.
+        """
+        if not transactions:
+            return []
+
+        result = await self.session.exec(  # type: ignore[call-overload]
+            self._insert(Transaction)
+            .on_conflict_do_nothing(index_elements=[Transaction.external_id])
+            .returning(Transaction),
+            params=[
+                transaction.model_dump(exclude={"id"}) for transaction in transactions
+            ],
+        )
+        created = list(result.scalars().all())
+
+        if created and settings.dispatch_mode == "rabbitmq":
+            # Todas as mensagens do lote continuam o trace da mesma requisição
+            trace_context = inject_context() or None
+            await self.session.exec(  # type: ignore[call-overload]
+                insert(OutboxMessage),
+                params=[
+                    {"transaction_id": transaction.id, "trace_context": trace_context}
+                    for transaction in created
+                ],
+            )
+        await self.session.commit()
+
+        for transaction in created:
+            idempotency_cache.remember(transaction)
+
+        return created
+
+    async def get_by_id(self, transaction_id: int) -> Optional[Transaction]:
+        return await self.session.get(Transaction, transaction_id)
+
+    async def get_by_external_id(
+        self, external_id: UUID, use_cache: bool = True, use_bloom: bool = True
+    ) -> Optional[Transaction]:
+        """
+        Busca a transação pelo external_id.
+
+        Com `use_cache`, ids certamente novos (bloom filter) não vão ao banco e
+        retentativas recentes são respondidas pelo LRU. O bloom filter só conhece
+        os ids vistos por este processo: fora do caminho de insert (em que a
+        constraint única decide) use `use_bloom=False`.
+        """
+        if use_cache:
+            cached = idempotency_cache.get(external_id)
+            if cached is not None:
+                return cached
+            if use_bloom and not idempotency_cache.might_exist(external_id):
+                return None
 
         statement = select(Transaction).where(Transaction.external_id == external_id)
 
-        return self.session.exec(statement).first()
+        result = await self.session.exec(statement)
+        transaction = result.first()
+
+        if transaction is not None:
+            idempotency_cache.remember(transaction)
+
+        return transaction
+
+    async def get_by_external_ids(
+        self, external_ids: list[UUID], use_cache: bool = True
+    ) -> dict[UUID, Transaction]:
+        """
+        Busca as transações existentes para vários external_id em uma consulta.
+
+        Com `use_cache`, só os ids que podem existir (bloom filter) e que não
+        estão no LRU entram na consulta.
+        """
+        found: dict[UUID, Transaction] = {}
+        candidates = external_ids
+        if use_cache:
+            candidates = []
+            for external_id in external_ids:
+                cached = idempotency_cache.get(external_id)
+                if cached is not None:
+                    found[external_id] = cached
+                elif idempotency_cache.might_exist(external_id):
+                    candidates.append(external_id)
+
+        if not candidates:
+            return found
+
+        statement = select(Transaction).where(
+            col(Transaction.external_id).in_(candidates)
+        )
+        result = await self.session.exec(statement)
+
+        for transaction in result.all():
+            idempotency_cache.remember(transaction)
+            found[transaction.external_id] = transaction
+
+        return found
+
+    async def iter_external_ids(self) -> AsyncIterator[UUID]:
+        """Percorre todos os external_id em blocos, sem carregá-los de uma vez."""
+        result = await self.session.stream_scalars(
+            select(Transaction.external_id).execution_options(yield_per=10000)
+        )
+        async for external_id in result:
+            yield external_id
+
+    async def claim(
+        self, transaction_id: int, claimed_by: str, lease_s: float
+    ) -> Optional[Transaction]:
+        """
+        Reivindica a transação para processamento em um único UPDATE atômico.
+
+        Só uma transação `pending`, ou `processing` com o claim vencido (o
+        worker que a reivindicou morreu), pode ser reivindicada: entre vários
+        workers que recebem a mesma mensagem, apenas um recebe a transação e
+        chama o parceiro.
+
+        Returns:
+            Optional[Transaction]: a transação reivindicada, ou None se ela não
+            existe, já foi processada ou tem um claim ativo
+        """
+        now = datetime.now(timezone.utc)
+        statement = self._claim_statement(claimed_by, now).where(
+            col(Transaction.id) == transaction_id,
+            self._claimable(now, lease_s),
+        )
+        transaction = await self._update_returning(statement)
+        await self.session.commit()
+
+        return transaction
+
+    async def claim_batch(
+        self, claimed_by: str, limit: int, lease_s: float
+    ) -> list[Transaction]:
+        """
+        Reivindica as próximas transações elegíveis, na ordem de chegada.
+
+        Elegíveis são as `pending` cujo retry_at já passou e as `processing`
+        com claim vencido. No PostgreSQL, linhas travadas por outro dispatcher
+        são puladas (FOR UPDATE SKIP LOCKED); no SQLite o UPDATE inteiro é
+        atômico e os claims (claimed_by/claimed_at) separam os processos.
+
+        O claim do lote não conta tentativa: as transações podem esperar por uma
+        vaga (ou perder o lease) sem chamar o parceiro, e a tentativa só é contada
+        em renew_claim, logo antes da chamada.
+        """
+        now = datetime.now(timezone.utc)
+        due = or_(col(Transaction.retry_at).is_(None), col(Transaction.retry_at) <= now)
+        candidates = (
+            select(Transaction.id)
+            .where(self._claimable(now, lease_s), due)
+            .order_by(col(Transaction.id))
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        result = await self.session.exec(
+            self._claim_statement(claimed_by, now, count_attempt=False).where(
+                col(Transaction.id).in_(candidates.scalar_subquery())
+            )  # type: ignore[call-overload]
+        )
+        transactions = list(result.scalars().all())
+        for transaction in transactions:
+            self.session.expunge(transaction)
+        await self.session.commit()
 
-    def update(self, transaction: Transaction) -> Transaction:
+        return sorted(transactions, key=lambda transaction: transaction.id or 0)
 
-        self.session.add(transaction)
-        self.session.commit()
-        self.session.refresh(transaction)
+    async def release(self, transaction_ids: list[int], claimed_by: str) -> None:
+        """Devolve para pending transações reivindicadas e não processadas."""
+        if not transaction_ids:
+            return
+
+        await self.session.exec(  # type: ignore[call-overload]
+            update(Transaction)
+            .where(
+                col(Transaction.id).in_(transaction_ids),
+                Transaction.status == "processing",
+                Transaction.claimed_by == claimed_by,
+            )
+            .values(status="pending")
+        )
+        await self.session.commit()
+
+    @staticmethod
+    def _claim_statement(claimed_by: str, now: datetime, count_attempt: bool = True):
+        values = {"status": "processing", "claimed_by": claimed_by, "claimed_at": now}
+        if count_attempt:
+            values["attempts"] = Transaction.attempts + 1
+        return update(Transaction).values(**values).returning(Transaction)
+
+    @staticmethod
+    def _claimable(now: datetime, lease_s: float):
+        stale = or_(
+            col(Transaction.claimed_at).is_(None),
+            col(Transaction.claimed_at) < now - timedelta(seconds=lease_s),
+        )
+        return or_(
+            Transaction.status == "pending",
+            and_(Transaction.status == "processing", stale),
+        )
+
+    async def update_status(
+        self,
+        transaction_id: int,
+        from_status: str | Sequence[str],
+        to_status: str,
+        owner: Optional[str] = None,
+        **fields,
+    ) -> Optional[Transaction]:
+        """
+        Troca o status da transação se ele ainda for `from_status` (compare-and-set).
+
+        Um único UPDATE ... RETURNING, sem buscar a linha antes nem depois do
+        commit. `fields` são gravados junto com o status; com `owner`, a troca
+        só vale se a transação ainda estiver reivindicada por esse worker.
+
+        Returns:
+            Optional[Transaction]: a transação atualizada, ou None se ela não
+            existe ou o status (ou o claim) já era outro
+        """
+        transaction = await self._set_status(
+            transaction_id, from_status, to_status, owner, **fields
+        )
+        await self.session.commit()
 
         return transaction
 
-    def get_balance(self, account_id: str) -> float:
+    async def renew_claim(self, transaction: Transaction) -> Optional[Transaction]:
+        """
+        Renova o lease do claim se ele ainda for o mesmo (compare-and-set) e
+        conta a tentativa que vai ser feita.
+
+        claimed_by e claimed_at identificam o claim: se o lease venceu e outro
+        processo (ou este mesmo, em outro lote) reivindicou a transação, o
+        claimed_at mudou e nada é gravado.
+
+        Returns:
+            Optional[Transaction]: a transação com o lease renovado, ou None se
+            o claim foi perdido
+        """
+        statement = (
+            update(Transaction)
+            .where(
+                col(Transaction.id) == transaction.id,
+                Transaction.status == "processing",
+                Transaction.claimed_by == transaction.claimed_by,
+                Transaction.claimed_at == transaction.claimed_at,
+            )
+            .values(
+                claimed_at=datetime.now(timezone.utc),
+                attempts=Transaction.attempts + 1,
+            )
+            .returning(Transaction)
+        )
+        renewed = await self._update_returning(statement)
+        await self.session.commit()
+
+        return renewed
+
+    async def complete(self, transaction: Transaction) -> Optional[Transaction]:
+        """
+        Marca a transação em processamento como completada e aplica o valor no
+        saldo da conta no mesmo commit.
+
+        O status e o partner_id vêm do objeto em memória. Se a transação não
+        está mais em processamento pelo mesmo claim, nada é gravado e o saldo
+        não muda.
+        """
+        assert transaction.id is not None
+        completed = await self._set_status(
+            transaction.id,
+            "processing",
+            transaction.status,
+            transaction.claimed_by,
+            partner_id=transaction.partner_id,
+        )
+        if completed is None:
+            await self.session.rollback()
+            return None
+
+        delta = (
+            completed.amount if completed.kind == KindEnum.CREDIT else -completed.amount
+        )
+        await self._add_to_balance(completed.account_id, delta)
+        await self.session.commit()
+
+        return completed
+
+    async def _set_status(
+        self,
+        transaction_id: int,
+        from_status: str | Sequence[str],
+        to_status: str,
+        owner: Optional[str] = None,
+        **fields,
+    ) -> Optional[Transaction]:
+        expected = [from_status] if isinstance(from_status, str) else from_status
+        statement = update(Transaction).where(
+            col(Transaction.id) == transaction_id,
+            col(Transaction.status).in_(expected),
+        )
+        if owner is not None:
+            statement = statement.where(Transaction.claimed_by == owner)
+
+        return await self._update_returning(
+            statement.values(status=to_status, **fields).returning(Transaction)
+        )
+
+    async def _update_returning(self, statement) -> Optional[Transaction]:
+        result = await self.session.exec(statement)  # type: ignore[call-overload]
+        transaction = result.scalars().first()
+
+        if transaction is not None:
+            # Desanexada: o service muda o status em memória e o autoflush não
+            # pode gravá-lo por fora do compare-and-set
+            self.session.expunge(transaction)
 
-        credit_sum = self.session.exec(
-            select(func.coalesce(func.sum(Transaction.amount), 0))
-            .where(Transaction.account_id == account_id)
-            .where(Transaction.kind == KindEnum.CREDIT)
-            .where(Transaction.status == "completed")
-        ).one()
+        return transaction
+
+    def _insert(self, table):
+        # INSERT com ON CONFLICT do dialeto em uso (SQLite ou PostgreSQL)
+        dialect = self.session.get_bind().dialect.name
+        return (pg_insert if dialect == "postgresql" else sqlite_insert)(table)
 
-        debit_sum = self.session.exec(
-            select(func.coalesce(func.sum(Transaction.amount), 0))
-            .where(Transaction.account_id == account_id)
-            .where(Transaction.kind == KindEnum.DEBIT)
-            .where(Transaction.status == "completed")
-        ).one()
+    async def _add_to_balance(self, account_id: str, delta: float) -> None:
+        # Upsert atômico: evita lost update quando dois workers completam
+        # transações da mesma conta ao mesmo tempo
+        statement = self._insert(AccountBalance).values(
+            account_id=account_id, balance=delta
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[AccountBalance.account_id],
+            set_={"balance": AccountBalance.balance + statement.excluded.balance},
+        )
+        await self.session.exec(statement)  # type: ignore[call-overload]
 
-        return credit_sum - debit_sum
+    async def list_by_account(
+        self,
+        account_id: str,
+        limit: int,
+        before_id: Optional[int] = None,
+        status: Optional[str] = None,
+        kind: Optional[KindEnum] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+    ) -> list[Transaction]:
+        """
+        Lista as transações da conta da mais nova para a mais antiga.
 
-    def account_exists(self, account_id: str) -> bool:
+        Paginação keyset: `before_id` é o id do último item da página anterior,
+        então qualquer página custa o mesmo que a primeira (sem OFFSET).
+        """
         statement = select(Transaction).where(Transaction.account_id == account_id)
+        if before_id is not None:
+            statement = statement.where(col(Transaction.id) < before_id)
+        if status is not None:
+            statement = statement.where(Transaction.status == status)
+        if kind is not None:
+            statement = statement.where(Transaction.kind == kind)
+        if created_from is not None:
+            statement = statement.where(Transaction.created_at >= created_from)
+        if created_to is not None:
+            statement = statement.where(Transaction.created_at < created_to)
+
+        result = await self.session.exec(
+            statement.order_by(col(Transaction.id).desc()).limit(limit)
+        )
+
+        return list(result.all())
+
+    async def get_balance(self, account_id: str) -> Optional[float]:
+        """
+        Retorna o saldo materializado da conta em uma única consulta.
+
+        Returns:
+            Optional[float]: saldo da conta, ou None se a conta não tem transações
+        """
+        has_transactions = exists().where(Transaction.account_id == account_id)
+        stored_balance = (
+            select(AccountBalance.balance)
+            .where(AccountBalance.account_id == account_id)
+            .scalar_subquery()
+        )
+
+        result = await self.session.exec(
+            select(has_transactions, stored_balance)  # type: ignore[call-overload]
+        )
+        account_exists, balance = result.one()
+
+        if not account_exists:
+            return None
+
+        return balance if balance is not None else 0.0
+
+    async def get_balances(self) -> dict[str, float]:
+        """Retorna o saldo materializado de todas as contas."""
+        result = await self.session.exec(
+            select(AccountBalance.account_id, AccountBalance.balance)
+        )
+
+        return {account_id: balance for account_id, balance in result.all()}
+
+    async def compute_balances(self) -> dict[str, float]:
+        """Recalcula o saldo de todas as contas a partir das transações completadas."""
+        result = await self.session.exec(_computed_balances())
+
+        return {account_id: total for account_id, total in result.all()}
+
+    async def rebuild_balances(self) -> tuple[dict[str, float], dict[str, float]]:
+        """
+        Reconstrói a tabela de saldos a partir das transações completadas.
+
+        Tudo acontece em uma transação de escrita com account_balances travada:
+        um complete() concorrente espera o commit e aplica o seu valor sobre o
+        saldo reconstruído, em vez de ser apagado por ele.
+
+        Returns:
+            tuple[dict[str, float], dict[str, float]]: (saldos anteriores,
+            saldos reconstruídos)
+        """
+        dialect = self.session.get_bind().dialect.name
+        if dialect == "postgresql":
+            await self.session.exec(  # type: ignore[call-overload]
+                text("LOCK TABLE account_balances IN EXCLUSIVE MODE")
+            )
+        elif dialect == "sqlite":
+            # Lock de escrita do arquivo desde o início, não só no DELETE
+            await self.session.exec(text("BEGIN IMMEDIATE"))  # type: ignore[call-overload]
+
+        stored = await self.get_balances()
+        await self.session.exec(delete(AccountBalance))  # type: ignore[call-overload]
+        await self.session.exec(  # type: ignore[call-overload]
+            insert(AccountBalance).from_select(
+                ["account_id", "balance"], _computed_balances()
+            )
+        )
+        rebuilt = await self.get_balances()
+        await self.session.commit()
 
-        result = self.session.exec(statement).first()
-        return result is not None
+        return stored, rebuilt
@@ -0,0 +1,52 @@
+import time
+from collections import OrderedDict
+
+from app.core.config import settings
+
+
+class UnknownAccountCache:
+    """
+    Cache negativo de contas sem transações.
+
+    Evita repetir a consulta de existência para contas inexistentes (sondagens,
+    ids digitados errado). A entrada é descartada quando uma transação é
+    criada para a conta neste processo; o TTL curto cobre as criadas por
+    outras réplicas da API.
+    """
+
+    def __init__(self, max_size: int, ttl_s: float):
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self._entries: OrderedDict[str, float] = OrderedDict()
+
+    def contains(self, account_id: str) -> bool:
+        expires_at = self._entries.get(account_id)
+        if expires_at is None:
+            return False
+
+        if expires_at < time.monotonic():
+            del self._entries[account_id]
+            return False
+
+        return True
+
+    def add(self, account_id: str) -> None:
+        if self.max_size <= 0:
+            return
+
+        self._entries[account_id] = time.monotonic() + self.ttl_s
+        self._entries.move_to_end(account_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def discard(self, account_id: str) -> None:
+        self._entries.pop(account_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+unknown_account_cache = UnknownAccountCache(
+    max_size=settings.unknown_account_cache_size,
+    ttl_s=settings.unknown_account_cache_ttl_s,
+)
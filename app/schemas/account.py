@@ -0,0 +1,8 @@
+from pydantic import BaseModel
+
+
+class BalanceDrift(BaseModel):
+
+    account_id: str
+    stored_balance: float
+    expected_balance: float
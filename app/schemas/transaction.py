@@ -1,4 +1,6 @@
 import uuid
+from datetime import datetime
+from typing import Any, Literal, Optional
 
 from pydantic import BaseModel
 
@@ -21,3 +23,49 @@ class TransactionResponse(BaseModel):
     model_config = {
         "from_attributes": True,
     }
+
+
+class TransactionBatchRequest(BaseModel):
+
+    # Itens validados um a um para que um item inválido não rejeite o lote
+    transactions: list[dict[str, Any]]
+
+
+class TransactionBatchItemResult(BaseModel):
+
+    index: int
+    result: Literal["created", "existing", "invalid"]
+    external_id: Optional[str] = None
+    id: Optional[int] = None
+    status: Optional[str] = None
+    error: Optional[str] = None
+
+
+class TransactionBatchResponse(BaseModel):
+
+    created: int
+    existing: int
+    invalid: int
+    results: list[TransactionBatchItemResult]
+
+
+class TransactionHistoryItem(BaseModel):
+
+    id: int
+    external_id: uuid.UUID
+    amount: float
+    kind: KindEnum
+    status: str
+    partner_id: Optional[str] = None
+    created_at: datetime
+
+    model_config = {
+        "from_attributes": True,
+    }
+
+
+class TransactionPage(BaseModel):
+
+    items: list[TransactionHistoryItem]
+    # Id a enviar como `cursor` para a próxima página; None na última
+    next_cursor: Optional[int] = None
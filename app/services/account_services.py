@@ -1,5 +1,22 @@
+import math
+from datetime import datetime, timezone
+from typing import Optional
+
 from app.core.exceptions import AccountNotFoundError
+from app.models.transaction import KindEnum, Transaction
+from app.repositories.balance_cache import balance_cache
 from app.repositories.transaction_repository import TransactionRepository
+from app.repositories.unknown_account_cache import unknown_account_cache
+from app.schemas.account import BalanceDrift
+
+
+def _to_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # created_at é gravado em UTC; datas sem fuso são consideradas UTC
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
 
 
 class AccountService:
@@ -7,11 +24,89 @@ class AccountService:
     def __init__(self, repository: TransactionRepository):
         self.repository = repository
 
-    def get_balance(self, account_id: str) -> float:
+    async def get_balance(self, account_id: str) -> float:
+
+        cached = await balance_cache.get(account_id)
+        if cached is not None:
+            return cached
 
-        exists = self.repository.account_exists(account_id)
+        if unknown_account_cache.contains(account_id):
+            raise AccountNotFoundError()
+
+        balance = await self.repository.get_balance(account_id)
 
-        if not exists:
+        if balance is None:
+            unknown_account_cache.add(account_id)
             raise AccountNotFoundError()
 
-        return self.repository.get_balance(account_id)
+        await balance_cache.set(account_id, balance)
+
+        return balance
+
+    async def list_transactions(
+        self,
+        account_id: str,
+        limit: int,
+        cursor: Optional[int] = None,
+        status: Optional[str] = None,
+        kind: Optional[KindEnum] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+    ) -> tuple[list[Transaction], Optional[int]]:
+        """
+        Retorna uma página do histórico da conta, da transação mais nova para a
+        mais antiga.
+
+        Returns:
+            tuple[list[Transaction], Optional[int]]: (transações, cursor da
+            próxima página ou None se esta for a última)
+        """
+        # Busca um item a mais só para saber se existe próxima página
+        transactions = await self.repository.list_by_account(
+            account_id,
+            limit=limit + 1,
+            before_id=cursor,
+            status=status,
+            kind=kind,
+            created_from=_to_utc(created_from),
+            created_to=_to_utc(created_to),
+        )
+
+        if len(transactions) <= limit:
+            return transactions, None
+
+        page = transactions[:limit]
+        return page, page[-1].id
+
+    async def reconcile_balances(self, dry_run: bool = False) -> list[BalanceDrift]:
+        """
+        Compara os saldos materializados com o recalculado a partir das transações.
+
+        Se dry_run for False, reconstrói a tabela de saldos a partir das transações
+        (com a tabela travada, para não perder conclusões concorrentes).
+
+        Returns:
+            list[BalanceDrift]: contas cujo saldo materializado divergia
+        """
+        if dry_run:
+            stored = await self.repository.get_balances()
+            expected = await self.repository.compute_balances()
+        else:
+            stored, expected = await self.repository.rebuild_balances()
+            await balance_cache.clear()
+
+        drifts = [
+            BalanceDrift(
+                account_id=account_id,
+                stored_balance=stored.get(account_id, 0.0),
+                expected_balance=expected.get(account_id, 0.0),
+            )
+            for account_id in sorted(stored.keys() | expected.keys())
+            if not math.isclose(
+                stored.get(account_id, 0.0),
+                expected.get(account_id, 0.0),
+                abs_tol=1e-9,
+            )
+        ]
+
+        return drifts
@@ -1,9 +1,52 @@
-from app.core.exceptions import InvalidTransactionAmountError
+import os
+import socket
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, Optional
+from uuid import UUID
+
+from app.core.config import settings
+from app.core.exceptions import InvalidTransactionAmountError, TransactionClaimedError
 from app.core.logger import logger
-from app.integrations.bank_partner import bank_partner_request
-from app.messaging.publisher import publish_transaction
+from app.core.metrics import db_operation_duration
+from app.core.tracing import tracer
+from app.integrations.bank_partner import (
+    PartnerRequest,
+    PartnerResult,
+    bank_partner_batch_request,
+    bank_partner_request,
+)
+from app.messaging.outbox_relay import outbox_relay
 from app.models.transaction import Transaction
+from app.repositories.balance_cache import balance_cache
 from app.repositories.transaction_repository import TransactionRepository
+from app.repositories.unknown_account_cache import unknown_account_cache
+
+_HOSTNAME = socket.gethostname()
+
+
+def worker_id() -> str:
+    """Identificação do processo nos claims de transações (host:pid)."""
+    # pid lido a cada chamada: os workers são processos filhos do supervisor
+    return f"{_HOSTNAME}:{os.getpid()}"
+
+
+def retries_done(transaction: Transaction) -> int:
+    """Retries já feitos de uma transação reivindicada (o claim conta a tentativa atual)."""
+    return transaction.attempts - 1
+
+
+def is_last_attempt(transaction: Transaction) -> bool:
+    """Se a tentativa atual é a última antes de a transação falhar de vez."""
+    return retries_done(transaction) >= settings.max_retries
+
+
+@contextmanager
+def _db_operation(operation: str) -> Iterator[None]:
+    """Mede a operação de banco no histograma e como span do trace atual."""
+    with tracer.start_as_current_span(f"db {operation}"):
+        with db_operation_duration.labels(operation).time():
+            yield
 
 
 class TransactionService:
@@ -20,80 +63,301 @@ class TransactionService:
         Returns:
             tuple[Transaction, bool]: (transação, foi_criada)
         """
-        # Verifica se já existe uma transação com o mesmo external_id
-        existing_transaction = self.repository.get_by_external_id(
-            transaction.external_id
-        )
-        if existing_transaction:
-            logger.info(
-                f"Transação com external_id={transaction.external_id} já existe, retornando transação existente"
+        # Valida valor da transação; a transação existente tem precedência. Sem
+        # insert não há constraint para corrigir um falso "novo" do bloom filter
+        # (ids criados por outro processo): só o LRU evita a consulta
+        if transaction.amount <= 0:
+            existing_transaction = await self.repository.get_by_external_id(
+                transaction.external_id, use_bloom=False
             )
-            return existing_transaction, False
+            if existing_transaction:
+                logger.info(
+                    f"Transação com external_id={transaction.external_id} já existe, retornando transação existente"
+                )
+                return existing_transaction, False
 
-        # Valida valor da transação
-        if transaction.amount <= 0:
             logger.error(
                 f"Valor de transação inválido, external_id={transaction.external_id}, amount={transaction.amount}"
             )
             raise InvalidTransactionAmountError()
 
-        # Cria nova transação
-        logger.info(f"Criando nova transação, external_id={transaction.external_id}")
+        # Insert-first: a constraint única de external_id decide entre criar e
+        # retornar a existente; a mensagem para processamento assíncrono vai
+        # para o outbox no mesmo commit e o relay a publica no RabbitMQ
         transaction.status = "pending"
-        transaction = self.repository.create(transaction)
+        with _db_operation("create_or_get"):
+            transaction, created = await self.repository.create_or_get(transaction)
+        if not created:
+            logger.info(
+                f"Transação com external_id={transaction.external_id} já existe, retornando transação existente"
+            )
+            return transaction, False
 
-        # Publica transação para processamento assíncrono
-        if transaction.id is not None:
-            await publish_transaction(transaction.id)
-            logger.info(f"Transação publicada para processamento, id={transaction.id}")
+        unknown_account_cache.discard(transaction.account_id)
+        outbox_relay.notify()
+        logger.info(f"Transação registrada no outbox, id={transaction.id}")
 
         return transaction, True
 
-    async def process_transaction(
-        self, transaction_id: int, is_last_attempt: bool = False
-    ) -> None:
-        transaction = self.repository.get_by_id(transaction_id)
+    async def create_transactions(
+        self, transactions: list[Transaction]
+    ) -> list[Optional[tuple[Transaction, bool]]]:
+        """
+        Cria transações em lote: uma consulta de idempotência para todos os
+        external_id, um INSERT multi-linha e um único commit com o outbox.
 
-        if not transaction:
-            logger.error(f"Transação não encontrada, id={transaction_id}")
-            return
+        Itens repetidos dentro do lote apontam para a transação criada pela
+        primeira ocorrência.
 
-        if transaction.status not in ("pending", "processing"):
-            logger.info(
-                f"Transação id={transaction_id} já processada, status={transaction.status}"
+        Returns:
+            list[Optional[tuple[Transaction, bool]]]: para cada item, na mesma
+            ordem, (transação, foi_criada) ou None se o valor for inválido
+        """
+        existing, created = await self._create_missing(transactions)
+
+        results: list[Optional[tuple[Transaction, bool]]] = []
+        seen: set[UUID] = set()
+        for transaction in transactions:
+            external_id = transaction.external_id
+            if external_id in existing:
+                results.append((existing[external_id], False))
+            elif transaction.amount <= 0:
+                logger.error(
+                    f"Valor de transação inválido, external_id={external_id}, amount={transaction.amount}"
+                )
+                results.append(None)
+            else:
+                results.append((created[external_id], external_id not in seen))
+                seen.add(external_id)
+
+        return results
+
+    async def _create_missing(
+        self, transactions: list[Transaction]
+    ) -> tuple[dict[UUID, Transaction], dict[UUID, Transaction]]:
+        """Cria as transações válidas que ainda não existem; retorna (existentes, criadas)."""
+        with _db_operation("get_by_external_ids"):
+            existing = await self.repository.get_by_external_ids(
+                list({transaction.external_id for transaction in transactions})
+            )
+
+        to_create: dict[UUID, Transaction] = {}
+        for transaction in transactions:
+            if (
+                transaction.external_id in existing
+                or transaction.external_id in to_create
+                or transaction.amount <= 0
+            ):
+                continue
+            transaction.status = "pending"
+            to_create[transaction.external_id] = transaction
+
+        created: dict[UUID, Transaction] = {}
+        if to_create:
+            logger.info(f"Criando {len(to_create)} transações em lote")
+            with _db_operation("create_many"):
+                inserted = await self.repository.create_many(list(to_create.values()))
+            for transaction in inserted:
+                created[transaction.external_id] = transaction
+                unknown_account_cache.discard(transaction.account_id)
+            if created:
+                outbox_relay.notify()
+
+        # Ids que o cache não conhecia, ou inseridos por outra requisição ao
+        # mesmo tempo, são ignorados pela constraint única: busca as existentes.
+        # Ids com valor inválido não passam pela constraint e o bloom filter só
+        # conhece este processo: também são confirmados no banco
+        unconfirmed = list(
+            dict.fromkeys(
+                [external_id for external_id in to_create if external_id not in created]
+                + [
+                    transaction.external_id
+                    for transaction in transactions
+                    if transaction.amount <= 0
+                    and transaction.external_id not in existing
+                ]
+            )
+        )
+        if unconfirmed:
+            existing.update(
+                await self.repository.get_by_external_ids(unconfirmed, use_cache=False)
             )
+
+        return existing, created
+
+    async def process_transaction(self, transaction_id: int) -> None:
+        transaction = await self.claim(transaction_id)
+
+        if not transaction:
             return
 
-        try:
-            logger.info(f"Processando transação id={transaction_id}")
+        await self.process_claimed(transaction)
 
-            # Mudar status para processing para evitar processamento concorrente
-            transaction.status = "processing"
-            self.repository.update(transaction)
+    async def process_claimed(
+        self,
+        transaction: Transaction,
+        retry_delay_s: Optional[float] = None,
+    ) -> None:
+        """
+        Processa uma transação já reivindicada por este worker.
+
+        Em caso de falha a transação volta para pending (ou failed, na última
+        tentativa segundo `attempts`) e o erro é relançado. Com `retry_delay_s`,
+        ela só volta a ser elegível para o dispatcher depois desse atraso.
+        """
+        try:
+            logger.info(f"Processando transação id={transaction.id}")
 
             partner_id = await bank_partner_request(
                 external_id=transaction.external_id,
                 amount=transaction.amount,
                 kind=transaction.kind,
             )
-            transaction.status = "completed"
-            transaction.partner_id = partner_id
-            self.repository.update(transaction)
-            logger.info(
-                f"Transação id={transaction_id} processada com sucesso, status={transaction.status}"
+            await self._complete(transaction, partner_id)
+        except Exception as e:
+            await self._fail(transaction, e, retry_delay_s)
+            raise
+
+    async def renew_claim(self, transaction: Transaction) -> Optional[Transaction]:
+        """
+        Renova o lease de uma transação reivindicada há algum tempo.
+
+        Returns:
+            Optional[Transaction]: a transação com lease novo, ou None se o
+            claim venceu e ela foi reivindicada de novo (não deve ser processada)
+        """
+        with _db_operation("renew_claim"):
+            renewed = await self.repository.renew_claim(transaction)
+        if renewed is None:
+            logger.warning(
+                f"Claim da transação id={transaction.id} perdido antes do "
+                f"processamento, transação ignorada"
+            )
+        return renewed
+
+    async def process_batch(
+        self, transactions: list[Transaction]
+    ) -> dict[int, Exception]:
+        """
+        Processa um lote de transações já reivindicadas com uma única chamada
+        ao banco parceiro.
+
+        Returns:
+            dict[int, Exception]: erro de cada transação que falhou
+        """
+        failures: dict[int, Exception] = {}
+
+        if not transactions:
+            return failures
+
+        logger.info(f"Processando lote de {len(transactions)} transações")
+
+        try:
+            results = await bank_partner_batch_request(
+                [
+                    PartnerRequest(
+                        external_id=transaction.external_id,
+                        amount=transaction.amount,
+                        kind=transaction.kind,
+                    )
+                    for transaction in transactions
+                ]
             )
         except Exception as e:
-            logger.error(f"Erro ao processar transação id={transaction_id}: {e}")
+            # Falha da chamada inteira: todos os itens do lote falharam
+            results = [PartnerResult(error=e) for _ in transactions]
 
-            if is_last_attempt:
-                transaction.status = "failed"
-                self.repository.update(transaction)
-                logger.info(
-                    f"Transação id={transaction_id} falhou definitivamente, status={transaction.status}"
-                )
-            else:
-                # Volta para pending para permitir retry
-                transaction.status = "pending"
-                self.repository.update(transaction)
+        for transaction, result in zip(transactions, results):
+            assert transaction.id is not None
 
-            raise
+            try:
+                if result.error is not None:
+                    raise result.error
+                await self._complete(transaction, result.partner_id)
+            except Exception as e:
+                await self._fail(transaction, e)
+                failures[transaction.id] = e
+
+        return failures
+
+    async def claim(self, transaction_id: int) -> Optional[Transaction]:
+        """
+        Reivindica a transação para este worker em um único UPDATE atômico.
+
+        O claim incrementa `attempts`, que decide a última tentativa
+        (ver is_last_attempt).
+
+        Raises:
+            TransactionClaimedError: outro worker está processando a transação
+        """
+        with _db_operation("claim"):
+            transaction = await self.repository.claim(
+                transaction_id, worker_id(), settings.claim_lease_s
+            )
+        if transaction:
+            return transaction
+
+        # Caminho raro: busca a transação só para saber por que não foi reivindicada
+        existing = await self.repository.get_by_id(transaction_id)
+        if not existing:
+            logger.error(f"Transação não encontrada, id={transaction_id}")
+            return None
+
+        if existing.status == "processing":
+            # Mensagem duplicada ou reentregue enquanto o dono ainda processa
+            raise TransactionClaimedError(transaction_id, existing.claimed_by)
+
+        logger.info(
+            f"Transação id={transaction_id} já processada, status={existing.status}"
+        )
+        return None
+
+    async def _complete(self, transaction: Transaction, partner_id: str | None) -> None:
+        transaction.status = "completed"
+        transaction.partner_id = partner_id
+        # Atualiza status e saldo materializado da conta no mesmo commit
+        with _db_operation("complete"):
+            completed = await self.repository.complete(transaction)
+        if not completed:
+            logger.warning(
+                f"Claim da transação id={transaction.id} perdido, conclusão ignorada"
+            )
+            return
+        # O saldo mudou: invalida o cache logo após o commit
+        await balance_cache.invalidate(transaction.account_id)
+        logger.info(
+            f"Transação id={transaction.id} processada com sucesso, status={transaction.status}"
+        )
+
+    async def _fail(
+        self,
+        transaction: Transaction,
+        error: Exception,
+        retry_delay_s: Optional[float] = None,
+    ) -> None:
+        logger.error(f"Erro ao processar transação id={transaction.id}: {error}")
+        assert transaction.id is not None
+
+        if is_last_attempt(transaction):
+            transaction.status = "failed"
+            await self.repository.update_status(
+                transaction.id, "processing", transaction.status, transaction.claimed_by
+            )
+            logger.info(
+                f"Transação id={transaction.id} falhou definitivamente, status={transaction.status}"
+            )
+        else:
+            # Volta para pending para permitir retry
+            transaction.status = "pending"
+            transaction.retry_at = (
+                datetime.now(timezone.utc) + timedelta(seconds=retry_delay_s)
+                if retry_delay_s is not None
+                else None
+            )
+            await self.repository.update_status(
+                transaction.id,
+                "processing",
+                transaction.status,
+                transaction.claimed_by,
+                retry_at=transaction.retry_at,
+            )
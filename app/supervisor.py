@@ -0,0 +1,88 @@
+import multiprocessing
+import os
+import signal
+import time
+from multiprocessing.process import BaseProcess
+from typing import Callable
+
+from app.core.logger import logger
+
+# Intervalo entre verificações dos processos filhos
+POLL_INTERVAL_S = 0.5
+
+# Espera mínima antes de reiniciar um filho que acabou de cair,
+# evitando loop de restart quando o erro é persistente (ex.: broker fora)
+RESTART_BACKOFF_S = 1.0
+
+
+def run_supervisor(
+    target: Callable[[], None],
+    processes: int,
+    shutdown_timeout: float,
+) -> None:
+    """
+    Executa `processes` cópias de `target` em processos separados.
+
+    Filhos que terminam são reiniciados. SIGTERM/SIGINT são repassados aos
+    filhos como SIGTERM, para que drenem as mensagens em andamento; quem não
+    terminar em `shutdown_timeout` segundos é finalizado com SIGKILL.
+    """
+    context = multiprocessing.get_context("spawn")
+    children: dict[int, BaseProcess] = {}
+    last_start: dict[int, float] = {}
+    stopping = False
+
+    def start(slot: int) -> None:
+        process = context.Process(target=target, name=f"worker-{slot}")
+        # O filho (spawn) herda o ambiente: usa o slot para escolher a porta de métricas
+        os.environ["WORKER_SLOT"] = str(slot)
+        process.start()
+        children[slot] = process
+        last_start[slot] = time.monotonic()
+        logger.info(f"Processo worker-{slot} iniciado, pid={process.pid}")
+
+    def request_stop(signum: int, _frame) -> None:
+        nonlocal stopping
+        if stopping:
+            return
+        stopping = True
+        logger.info(
+            f"Sinal {signal.Signals(signum).name} recebido, encerrando {len(children)} workers..."
+        )
+        for process in children.values():
+            if process.is_alive() and process.pid is not None:
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    for slot in range(processes):
+        start(slot)
+
+    while not stopping:
+        time.sleep(POLL_INTERVAL_S)
+
+        for slot, process in list(children.items()):
+            if process.is_alive() or stopping:
+                continue
+
+            logger.error(
+                f"Processo worker-{slot} terminou inesperadamente, exitcode={process.exitcode}"
+            )
+            elapsed = time.monotonic() - last_start[slot]
+            if elapsed < RESTART_BACKOFF_S:
+                time.sleep(RESTART_BACKOFF_S - elapsed)
+            if not stopping:
+                start(slot)
+
+    deadline = time.monotonic() + shutdown_timeout
+    for slot, process in children.items():
+        process.join(max(deadline - time.monotonic(), 0))
+        if process.is_alive():
+            logger.warning(
+                f"Processo worker-{slot} não encerrou em {shutdown_timeout}s, finalizando"
+            )
+            process.kill()
+            process.join()
+
+    logger.info("Todos os workers encerrados")
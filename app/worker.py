@@ -1,80 +1,403 @@
+import argparse
 import asyncio
 import json
+import os
+import signal
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Optional, TypeVar
 
 import aio_pika
-from sqlmodel import Session
+from aio_pika.abc import AbstractIncomingMessage
+from opentelemetry import trace
+from opentelemetry.trace import SpanKind, StatusCode
+from prometheus_client import start_http_server
 
+from app.core import metrics
 from app.core.config import settings
-from app.core.database import engine
+from app.core.database import async_session, engine
+from app.core.exceptions import TransactionClaimedError
 from app.core.logger import logger
-from app.messaging.publisher import publish_to_dlq, publish_to_retry
+from app.core.tracing import (
+    extract_context,
+    link_from,
+    setup_tracing,
+    shutdown_tracing,
+    tracer,
+)
+from app.integrations.bank_partner import (
+    MAX_BATCH_SIZE,
+    ConcurrencyLimiter,
+    concurrency_limiter,
+)
+from app.messaging.publisher import (
+    RabbitMQPublisher,
+    declare_queues,
+    publish_to_dlq,
+    publish_to_retry,
+)
+from app.repositories.balance_cache import warn_if_process_local
 from app.repositories.transaction_repository import TransactionRepository
-from app.services.transaction_service import TransactionService
+from app.services.transaction_service import (
+    TransactionService,
+    retries_done,
+    worker_id,
+)
+from app.supervisor import run_supervisor
 
+T = TypeVar("T")
 
-async def main():
-    logger.info("Iniciando worker...")
-    connection = await aio_pika.connect_robust(settings.rabbitmq_url)
-    channel = await connection.channel()
 
-    # Configura fila de retry com DLX
-    await channel.declare_queue(
-        "transactions.retry",
-        durable=True,
-        arguments={
-            "x-message-ttl": settings.retry_ttl_ms,
-            "x-dead-letter-exchange": "",
-            "x-dead-letter-routing-key": "transactions",
-        },
+def parse_message(message: AbstractIncomingMessage) -> tuple[int, int]:
+    """Extrai transaction_id do corpo e o contador de retries do header."""
+    data = json.loads(message.body)
+    transaction_id = data["transaction_id"]
+
+    # Lê contador de retries do header
+    retry_count: int = 0
+    if message.headers and "x-retry-count" in message.headers:
+        retry_count = int(message.headers["x-retry-count"])  # type: ignore[arg-type]
+
+    logger.info(
+        f"Mensagem recebida, transaction_id={transaction_id}, retry={retry_count}"
     )
+    if message.timestamp:
+        metrics.consume_lag.labels("retry" if retry_count else "new").observe(
+            max(time.time() - message.timestamp.timestamp(), 0)
+        )
 
-    # Dead Letter Queue
-    await channel.declare_queue("transactions.dlq", durable=True)
+    return transaction_id, retry_count
 
-    queue = await channel.declare_queue("transactions", durable=True)
 
-    logger.info("Worker conectado ao RabbitMQ, aguardando mensagens...")
+async def handle_failure(transaction_id: int, retry_count: int, error: Exception):
+    """Envia a transação que falhou para retry ou, na última tentativa, para a DLQ."""
+    # A mensagem de retry/DLQ leva o contexto do span atual e continua o mesmo trace
+    span = trace.get_current_span()
+    span.record_exception(error)
+    span.set_status(StatusCode.ERROR, str(error))
 
-    async with queue.iterator() as queue_iter:
-        async for message in queue_iter:
-            async with message.process():
-                data = json.loads(message.body)
-                transaction_id = data["transaction_id"]
+    if isinstance(error, TransactionClaimedError):
+        # Outro worker detém o claim: reagenda sem consumir uma tentativa, até
+        # o dono concluir ou o lease vencer
+        logger.info(f"{error}, reagendando transaction_id={transaction_id}")
+        metrics.retries.labels(metrics.reason(error)).inc()
+        await publish_to_retry(transaction_id, retry_count)
+        return
+
+    logger.error(f"Erro ao processar transaction_id={transaction_id}: {error}")
+
+    if retry_count < settings.max_retries:
+        logger.info(
+            f"Enviando para retry ({retry_count + 1}/{settings.max_retries}), transaction_id={transaction_id}"
+        )
+        metrics.retries.labels(metrics.reason(error)).inc()
+        await publish_to_retry(transaction_id, retry_count + 1)
+    else:
+        logger.error(
+            f"Máximo de retries atingido, enviando para DLQ, transaction_id={transaction_id}"
+        )
+        metrics.dead_letters.labels(metrics.reason(error)).inc()
+        await publish_to_dlq(transaction_id, retry_count, str(error))
 
-                # Lê contador de retries do header
-                retry_count: int = 0
-                if message.headers and "x-retry-count" in message.headers:
-                    retry_count = int(message.headers["x-retry-count"])  # type: ignore[arg-type]
 
-                logger.info(
-                    f"Mensagem recebida, transaction_id={transaction_id}, retry={retry_count}"
-                )
+@asynccontextmanager
+async def processing(message: AbstractIncomingMessage) -> AsyncIterator[None]:
+    """
+    Confirma a mensagem ao fim do bloco ou a rejeita se ele falhar.
 
-                with Session(engine) as session:
+    Erros rejeitam sem requeue (a falha da transação já foi tratada por
+    retry/DLQ), mas um handler cancelado no shutdown devolve a mensagem para a
+    fila (o claim da transação é liberado em releasing_claims).
+    """
+    async with message.process(ignore_processed=True):
+        try:
+            yield
+        except asyncio.CancelledError:
+            if not message.channel.is_closed:
+                await message.nack(requeue=True)
+            raise
+
+
+@asynccontextmanager
+async def releasing_claims(transaction_ids: list[int]) -> AsyncIterator[None]:
+    """
+    Devolve para pending as transações reivindicadas por este processo se o
+    bloco for cancelado no shutdown.
+
+    Sem isso a mensagem reentregue esbarraria no claim do processo que saiu
+    (TransactionClaimedError) e iria para os retries até o lease vencer.
+    """
+    try:
+        yield
+    except asyncio.CancelledError:
+        async with async_session() as session:
+            await TransactionRepository(session).release(transaction_ids, worker_id())
+        raise
+
+
+async def handle_message(message: AbstractIncomingMessage) -> None:
+    """Processa uma mensagem da fila, com sessão de banco própria."""
+    async with processing(message):
+        # Continua o trace de quem publicou a mensagem (API, relay ou retry)
+        with tracer.start_as_current_span(
+            "process transactions",
+            context=extract_context(message.headers),
+            kind=SpanKind.CONSUMER,
+        ) as span:
+            transaction_id, retry_count = parse_message(message)
+            span.set_attributes(
+                {"transaction.id": transaction_id, "transaction.retry": retry_count}
+            )
+
+            async with releasing_claims([transaction_id]):
+                async with async_session() as session:
                     repository = TransactionRepository(session)
                     service = TransactionService(repository)
-                    is_last_attempt = retry_count >= settings.max_retries
 
                     try:
-                        await service.process_transaction(
-                            transaction_id, is_last_attempt=is_last_attempt
-                        )
+                        transaction = await service.claim(transaction_id)
+                        if not transaction:
+                            return
+
+                        # O limite de retries vem de attempts, como no dispatcher;
+                        # o header só vale enquanto a transação não é reivindicada
+                        retry_count = retries_done(transaction)
+                        span.set_attribute("transaction.retry", retry_count)
+                        await service.process_claimed(transaction)
                     except Exception as e:
-                        logger.error(
-                            f"Erro ao processar transaction_id={transaction_id}: {e}"
+                        await handle_failure(transaction_id, retry_count, e)
+
+
+async def handle_batch(messages: list[AbstractIncomingMessage]) -> None:
+    """Processa um lote de mensagens com uma única chamada ao banco parceiro."""
+    async with AsyncExitStack() as stack:
+        for message in messages:
+            await stack.enter_async_context(processing(message))
+
+        # Um lote junta mensagens de traces diferentes: o span do lote é uma
+        # raiz nova com um link para o produtor de cada mensagem
+        stack.enter_context(
+            tracer.start_as_current_span(
+                "process transactions batch",
+                kind=SpanKind.CONSUMER,
+                links=[link_from(message.headers) for message in messages],
+                attributes={"batch.size": len(messages)},
+            )
+        )
+
+        retry_counts = dict(parse_message(message) for message in messages)
+        failures: dict[int, Exception] = {}
+        transactions = []
+
+        async with releasing_claims(list(retry_counts)):
+            async with async_session() as session:
+                repository = TransactionRepository(session)
+                service = TransactionService(repository)
+
+                for transaction_id in retry_counts:
+                    try:
+                        transaction = await service.claim(transaction_id)
+                    except Exception as e:
+                        # O status não mudou: a transação volta pelo retry da mensagem
+                        logger.warning(
+                            f"Transação id={transaction_id} não reivindicada: {e}"
                         )
+                        failures[transaction_id] = e
+                        continue
 
-                        if not is_last_attempt:
-                            logger.info(
-                                f"Enviando para retry ({retry_count + 1}/{settings.max_retries}), transaction_id={transaction_id}"
-                            )
-                            await publish_to_retry(transaction_id, retry_count + 1)
-                        else:
-                            logger.error(
-                                f"Máximo de retries atingido, enviando para DLQ, transaction_id={transaction_id}"
-                            )
-                            await publish_to_dlq(transaction_id, retry_count, str(e))
+                    if transaction:
+                        retry_counts[transaction_id] = retries_done(transaction)
+                        transactions.append(transaction)
 
+                failures.update(await service.process_batch(transactions))
 
-if __name__ == "__main__":
+        for transaction_id, error in failures.items():
+            await handle_failure(transaction_id, retry_counts[transaction_id], error)
+
+
+async def batched(
+    items: AsyncIterator[T], size: int, linger: float
+) -> AsyncIterator[list[T]]:
+    """
+    Agrupa itens em lotes de até `size`.
+
+    Um lote é liberado quando atinge `size` ou quando `linger` segundos se
+    passaram desde a chegada do seu primeiro item.
+    """
+    loop = asyncio.get_running_loop()
+    next_item: Optional[asyncio.Future] = None
+    exhausted = False
+
+    while not exhausted:
+        batch: list[T] = []
+        deadline: Optional[float] = None
+
+        while len(batch) < size:
+            if next_item is None:
+                next_item = asyncio.ensure_future(anext(items))
+
+            timeout = None if deadline is None else max(deadline - loop.time(), 0)
+            done, _ = await asyncio.wait({next_item}, timeout=timeout)
+            if not done:
+                break
+
+            future, next_item = next_item, None
+            try:
+                batch.append(future.result())
+            except StopAsyncIteration:
+                exhausted = True
+                break
+
+            if deadline is None:
+                deadline = loop.time() + linger
+
+        if batch:
+            yield batch
+
+
+async def consume(
+    messages: AsyncIterator[T],
+    handler: Callable[[T], Awaitable[None]],
+    concurrency: int,
+    shutdown_timeout: float | None = None,
+    limiter: Optional[ConcurrencyLimiter] = None,
+) -> None:
+    """
+    Consome mensagens executando até `concurrency` handlers em paralelo.
+
+    Se `limiter` for informado, cada handler também precisa de uma vaga no
+    limitador adaptativo do banco parceiro, que segura novas mensagens quando o
+    parceiro degrada ou o circuit breaker está aberto.
+
+    Quando o iterador termina (ex.: consumer cancelado no shutdown), aguarda os
+    handlers em andamento por até `shutdown_timeout` segundos antes de cancelá-los.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    in_flight: set[asyncio.Task] = set()
+
+    def on_done(task: asyncio.Task) -> None:
+        in_flight.discard(task)
+        metrics.in_flight.dec()
+        semaphore.release()
+        if limiter:
+            limiter.release()
+
+    async for message in messages:
+        await semaphore.acquire()
+        if limiter:
+            await limiter.acquire()
+        task = asyncio.create_task(handler(message))
+        in_flight.add(task)
+        metrics.in_flight.inc()
+        task.add_done_callback(on_done)
+
+    if not in_flight:
+        return
+
+    logger.info(f"Aguardando {len(in_flight)} mensagens em processamento...")
+    _, pending = await asyncio.wait(in_flight, timeout=shutdown_timeout)
+
+    # Handlers cancelados devolvem suas mensagens para a fila (ver processing)
+    for task in pending:
+        task.cancel()
+    if pending:
+        logger.warning(
+            f"Shutdown timeout, {len(pending)} mensagens devolvidas para a fila"
+        )
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+def start_metrics_server() -> None:
+    """Expõe as métricas do processo em WORKER_METRICS_PORT + slot do supervisor."""
+    if not settings.worker_metrics_port:
+        return
+
+    port = settings.worker_metrics_port + int(os.environ.get("WORKER_SLOT", "0"))
+    start_http_server(port)
+    logger.info(f"Métricas expostas em :{port}/metrics")
+
+
+async def main():
+    logger.info("Iniciando worker...")
+    setup_tracing("transaction-worker")
+    warn_if_process_local("worker")
+    start_metrics_server()
+    connection = await aio_pika.connect_robust(settings.rabbitmq_url)
+    channel = await connection.channel()
+
+    # Limita mensagens entregues e ainda não confirmadas para este worker
+    await channel.set_qos(prefetch_count=settings.worker_prefetch_count)
+
+    await declare_queues(channel)
+    queue = await channel.get_queue("transactions")
+
+    logger.info(
+        f"Worker conectado ao RabbitMQ, aguardando mensagens "
+        f"(prefetch={settings.worker_prefetch_count}, concurrency={settings.worker_concurrency})..."
+    )
+
+    async with queue.iterator() as queue_iter:
+        # SIGTERM/SIGINT cancelam o consumer: mensagens ainda no buffer são
+        # devolvidas para a fila e as em processamento são drenadas
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(
+                sig, lambda: asyncio.ensure_future(queue_iter.close())
+            )
+
+        if settings.partner_batch_size > 1:
+            # Acumula mensagens por até partner_batch_linger_ms e envia em lote
+            await consume(
+                batched(
+                    queue_iter,
+                    size=min(settings.partner_batch_size, MAX_BATCH_SIZE),
+                    linger=settings.partner_batch_linger_ms / 1000,
+                ),
+                handle_batch,
+                concurrency=max(
+                    settings.worker_concurrency // settings.partner_batch_size, 1
+                ),
+                shutdown_timeout=settings.worker_shutdown_timeout_s,
+                limiter=concurrency_limiter,
+            )
+        else:
+            await consume(
+                queue_iter,
+                handle_message,
+                concurrency=settings.worker_concurrency,
+                shutdown_timeout=settings.worker_shutdown_timeout_s,
+                limiter=concurrency_limiter,
+            )
+
+    logger.info("Encerrando worker...")
+    await RabbitMQPublisher.close()
+    await connection.close()
+    await engine.dispose()
+    shutdown_tracing()
+
+
+def run() -> None:
     asyncio.run(main())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Worker de processamento de transações"
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=settings.worker_processes,
+        help="Quantidade de processos consumidores (default: WORKER_PROCESSES)",
+    )
+    args = parser.parse_args()
+
+    if args.processes > 1:
+        # Margem para o filho drenar as mensagens e fechar as conexões
+        run_supervisor(
+            run,
+            processes=args.processes,
+            shutdown_timeout=settings.worker_shutdown_timeout_s + 5,
+        )
+    else:
+        run()
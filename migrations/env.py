@@ -0,0 +1,74 @@
+import asyncio
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlmodel import SQLModel
+
+from app.core.config import settings
+from app.models.account_balance import AccountBalance  # noqa: F401
+from app.models.outbox import OutboxMessage  # noqa: F401
+from app.models.transaction import Transaction  # noqa: F401
+
+config = context.config
+
+if config.config_file_name is not None and config.attributes.get(
+    "configure_logger", True
+):
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = SQLModel.metadata
+
+# Chave arbitrária do advisory lock que serializa migrações concorrentes
+# (API e worker sobem juntos) no PostgreSQL
+MIGRATION_LOCK_ID = 7_402_519
+
+
+def do_run_migrations(connection: Connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        # ALTER TABLE no SQLite precisa recriar a tabela
+        render_as_batch=connection.dialect.name == "sqlite",
+    )
+
+    with context.begin_transaction():
+        if connection.dialect.name == "postgresql":
+            connection.execute(
+                text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATION_LOCK_ID}
+            )
+        context.run_migrations()
+
+
+async def run_async_migrations() -> None:
+    url = config.get_main_option("sqlalchemy.url") or settings.database_url
+    engine = create_async_engine(url, poolclass=NullPool)
+
+    async with engine.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+
+    await engine.dispose()
+
+
+def run_migrations_offline() -> None:
+    context.configure(
+        url=config.get_main_option("sqlalchemy.url") or settings.database_url,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+elif (connection := config.attributes.get("connection")) is not None:
+    # Chamado por init_db com uma conexão já aberta pela aplicação
+    do_run_migrations(connection)
+else:
+    asyncio.run(run_async_migrations())
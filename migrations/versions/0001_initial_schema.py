@@ -0,0 +1,52 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 02:47:40.346565
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+import sqlmodel
+from alembic import op
+
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Schema criado pelo antigo create_all (só a tabela transactions); bancos
+    # sem versão de migração são marcados nesta revisão e seguem daqui
+    op.create_table(
+        "transactions",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("external_id", sa.Uuid(), nullable=False),
+        sa.Column("amount", sa.Float(), nullable=False),
+        sa.Column("kind", sa.Enum("CREDIT", "DEBIT", name="kindenum"), nullable=False),
+        sa.Column("status", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("partner_id", sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+        sa.Column("account_id", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_transactions_account_id", "transactions", ["account_id"], unique=False
+    )
+    op.create_index(
+        "ix_transactions_external_id", "transactions", ["external_id"], unique=True
+    )
+    op.create_index(
+        "ix_transactions_partner_id", "transactions", ["partner_id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_transactions_partner_id", table_name="transactions")
+    op.drop_index("ix_transactions_external_id", table_name="transactions")
+    op.drop_index("ix_transactions_account_id", table_name="transactions")
+    op.drop_table("transactions")
+    # No PostgreSQL o tipo enum sobrevive ao drop da tabela
+    sa.Enum(name="kindenum").drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,80 @@
+"""ledger and outbox
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 02:51:18.603217
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+import sqlmodel
+from alembic import op
+
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "account_balances",
+        sa.Column("account_id", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("balance", sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint("account_id"),
+    )
+    op.create_table(
+        "outbox",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("transaction_id", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+    # Transações existentes recebem o instante da migração como created_at
+    op.add_column(
+        "transactions",
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.execute("UPDATE transactions SET created_at = CURRENT_TIMESTAMP")
+    with op.batch_alter_table("transactions") as batch_op:
+        batch_op.alter_column(
+            "created_at", existing_type=sa.DateTime(timezone=True), nullable=False
+        )
+
+    # Os índices compostos substituem o índice simples de account_id
+    op.drop_index("ix_transactions_account_id", table_name="transactions")
+    op.create_index(
+        "ix_transactions_account_history",
+        "transactions",
+        ["account_id", "id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_transactions_balance",
+        "transactions",
+        ["account_id", "status", "kind", "amount"],
+        unique=False,
+    )
+
+    # Saldo materializado das transações já completadas (o enum é gravado pelo nome)
+    op.execute(
+        "INSERT INTO account_balances (account_id, balance) "
+        "SELECT account_id, "
+        "SUM(CASE WHEN kind = 'CREDIT' THEN amount ELSE -amount END) "
+        "FROM transactions WHERE status = 'completed' GROUP BY account_id"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_transactions_balance", table_name="transactions")
+    op.drop_index("ix_transactions_account_history", table_name="transactions")
+    op.create_index(
+        "ix_transactions_account_id", "transactions", ["account_id"], unique=False
+    )
+    with op.batch_alter_table("transactions") as batch_op:
+        batch_op.drop_column("created_at")
+    op.drop_table("outbox")
+    op.drop_table("account_balances")
@@ -0,0 +1,38 @@
+"""dispatcher polling
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 03:21:47.190532
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "transactions",
+        sa.Column("attempts", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.add_column(
+        "transactions",
+        sa.Column("retry_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index(
+        "ix_transactions_dispatch", "transactions", ["status", "id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_transactions_dispatch", table_name="transactions")
+    with op.batch_alter_table("transactions") as batch_op:
+        batch_op.drop_column("retry_at")
+        batch_op.drop_column("attempts")
@@ -0,0 +1,122 @@
+"""
+Benchmark de escrita no SQLite: PRAGMAs padrão x modo de desempenho.
+
+Vários processos gravam transações ao mesmo tempo no mesmo arquivo, como a
+API e o worker fazem em produção. Cada escrita passa pelo caminho real de
+criação (insert da transação + outbox + commit).
+
+Uso:
+    uv run python -m scripts.benchmark_sqlite --processes 4 --writes 1000
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import tempfile
+import time
+from pathlib import Path
+from uuid import uuid4
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel, create_engine
+
+from app.core.database import configure_sqlite, create_session_factory, sqlite_pragmas
+from app.models.transaction import KindEnum, Transaction
+from app.repositories.transaction_repository import TransactionRepository
+
+
+async def _write(database_path: Path, pragmas: list[str], writes: int) -> tuple:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{database_path}")
+    configure_sqlite(engine, pragmas)
+    session_factory = create_session_factory(engine)
+
+    written = 0
+    locked = 0
+    for i in range(writes):
+        transaction = Transaction(
+            external_id=uuid4(),
+            amount=1.0,
+            kind=KindEnum.CREDIT,
+            account_id=f"account-{i % 100}",
+        )
+        try:
+            async with session_factory() as session:
+                await TransactionRepository(session).create_or_get(transaction)
+            written += 1
+        except OperationalError:
+            # "database is locked": a escrita esperou o lock além do timeout
+            locked += 1
+
+    await engine.dispose()
+    return written, locked
+
+
+def _worker(args: tuple) -> tuple:
+    return asyncio.run(_write(*args))
+
+
+def run(
+    mode: str, pragmas: list[str], processes: int, writes: int, directory: str
+) -> dict:
+    # O diretório importa: em tmpfs o fsync é gratuito e a diferença some
+    with tempfile.TemporaryDirectory(dir=directory) as directory:
+        database_path = Path(directory) / "benchmark.db"
+        engine = create_engine(f"sqlite:///{database_path}")
+        SQLModel.metadata.create_all(engine)
+        engine.dispose()
+
+        started = time.perf_counter()
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(_worker, [(database_path, pragmas, writes)] * processes)
+        elapsed = time.perf_counter() - started
+
+    written = sum(result[0] for result in results)
+    locked = sum(result[1] for result in results)
+    return {
+        "modo": mode,
+        "escritas": written,
+        "locked": locked,
+        "duração": elapsed,
+        "escritas/s": written / elapsed,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compara a vazão de escrita do SQLite com e sem os PRAGMAs de desempenho"
+    )
+    parser.add_argument(
+        "--processes", type=int, default=4, help="Processos gravando em paralelo"
+    )
+    parser.add_argument(
+        "--writes", type=int, default=1000, help="Transações gravadas por processo"
+    )
+    parser.add_argument(
+        "--directory",
+        default="data",
+        help="Diretório dos bancos temporários (use o mesmo disco de produção)",
+    )
+    args = parser.parse_args()
+
+    results = [
+        run("padrão", [], args.processes, args.writes, args.directory),
+        run(
+            "desempenho", sqlite_pragmas(), args.processes, args.writes, args.directory
+        ),
+    ]
+
+    print(f"{'modo':<12}{'escritas':>10}{'locked':>8}{'duração':>10}{'escritas/s':>12}")
+    for result in results:
+        print(
+            f"{result['modo']:<12}{result['escritas']:>10}{result['locked']:>8}"
+            f"{result['duração']:>9.2f}s{result['escritas/s']:>12.0f}"
+        )
+
+    baseline, tuned = results
+    if baseline["escritas/s"]:
+        print(f"\nGanho: {tuned['escritas/s'] / baseline['escritas/s']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,106 @@
-from unittest.mock import AsyncMock, patch
-
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy.pool import StaticPool
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+    InMemorySpanExporter,
+)
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
 from sqlmodel import Session, SQLModel, create_engine
 
-from app.core.database import get_session
+from app.core.database import create_session_factory, get_session
 from app.main import app
+from app.models.account_balance import AccountBalance  # noqa: F401
+from app.models.outbox import OutboxMessage  # noqa: F401
 from app.models.transaction import Transaction  # noqa: F401
+from app.repositories.balance_cache import balance_cache
+from app.repositories.idempotency_cache import idempotency_cache
+from app.repositories.unknown_account_cache import unknown_account_cache
+
+
+@pytest.fixture(scope="session", autouse=True)
+def span_exporter():
+    # O provider global só pode ser definido uma vez por processo: instalado
+    # para a sessão inteira, todos os testes gravam spans da mesma forma
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    yield exporter
+    provider.shutdown()
 
 
 @pytest.fixture
-def session():
-    engine = create_engine(
-        "sqlite:///:memory:",
-        connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
-    )
+def spans(span_exporter):
+    """Spans finalizados durante o teste"""
+    span_exporter.clear()
+    yield span_exporter.get_finished_spans
+    span_exporter.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_idempotency_cache():
+    # Os caches são globais ao processo; cada teste usa um banco novo
+    idempotency_cache.clear()
+    unknown_account_cache.clear()
+    yield
+    idempotency_cache.clear()
+    unknown_account_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+async def clear_balance_cache():
+    await balance_cache.clear()
+    yield
+    await balance_cache.clear()
+
+
+@pytest.fixture
+def database_path(tmp_path):
+    # Arquivo temporário: compartilhado entre a sessão síncrona usada para
+    # preparar dados e as sessões async usadas pela aplicação
+    return tmp_path / "test.db"
+
+
+@pytest.fixture
+def session(database_path):
+    engine = create_engine(f"sqlite:///{database_path}")
     SQLModel.metadata.create_all(engine)
 
     with Session(engine) as session:
         yield session
 
+    engine.dispose()
+
 
 @pytest.fixture
-def client(session):
+def session_factory(database_path, session):
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{database_path}",
+        poolclass=NullPool,
+    )
 
-    def override_get_session():
-        yield session
+    return create_session_factory(engine)
+
+
+@pytest.fixture
+async def async_session(session_factory):
+    async with session_factory() as async_session:
+        yield async_session
+
+
+@pytest.fixture
+def client(session_factory):
+
+    async def override_get_session():
+        async with session_factory() as session:
+            yield session
 
     app.dependency_overrides[get_session] = override_get_session
 
-    # Mock do publisher para não depender do RabbitMQ
-    with patch(
-        "app.services.transaction_service.publish_transaction",
-        new_callable=AsyncMock,
-    ):
-        yield TestClient(app)
+    # Sem lifespan o relay do outbox não é iniciado: nada depende do RabbitMQ
+    yield TestClient(app)
 
     app.dependency_overrides.clear()
@@ -1,6 +1,32 @@
+import asyncio
 import uuid
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
 
+import pytest
+from sqlalchemy import event
+
+from app.models.account_balance import AccountBalance
 from app.models.transaction import KindEnum, Transaction
+from app.repositories.transaction_repository import TransactionRepository
+from app.services.account_services import AccountService
+from app.services.transaction_service import TransactionService
+
+
+@pytest.fixture
+def commit_and_reconcile(session_factory):
+    """Commita transações inseridas direto no banco e materializa os saldos"""
+
+    async def reconcile():
+        async with session_factory() as async_session:
+            service = AccountService(TransactionRepository(async_session))
+            await service.reconcile_balances()
+
+    def commit_and_reconcile(session):
+        session.commit()
+        asyncio.run(reconcile())
+
+    return commit_and_reconcile
 
 
 class TestGetBalance:
@@ -19,7 +45,9 @@ class TestGetBalance:
 
         assert response.status_code == 404
 
-    def test_get_balance_with_credit_transactions(self, client, session):
+    def test_get_balance_with_credit_transactions(
+        self, client, session, commit_and_reconcile
+    ):
         """Deve retornar saldo correto com transações de crédito"""
         account_id = "test-account-1"
 
@@ -42,7 +70,7 @@ class TestGetBalance:
                 status="completed",
             )
         )
-        session.commit()
+        commit_and_reconcile(session)
 
         response = client.get(f"/accounts/{account_id}/balance")
 
@@ -51,7 +79,9 @@ class TestGetBalance:
         assert data["account_id"] == account_id
         assert data["balance"] == 150
 
-    def test_get_balance_with_debit_transactions(self, client, session):
+    def test_get_balance_with_debit_transactions(
+        self, client, session, commit_and_reconcile
+    ):
         """Deve retornar saldo correto com transações de débito"""
         account_id = "test-account-2"
 
@@ -73,14 +103,14 @@ class TestGetBalance:
                 status="completed",
             )
         )
-        session.commit()
+        commit_and_reconcile(session)
 
         response = client.get(f"/accounts/{account_id}/balance")
 
         assert response.status_code == 200
         assert response.json()["balance"] == 125  # 200 - 75
 
-    def test_get_balance_negative(self, client, session):
+    def test_get_balance_negative(self, client, session, commit_and_reconcile):
         """Deve retornar saldo negativo quando débitos excedem créditos"""
         account_id = "test-account-3"
 
@@ -102,14 +132,16 @@ class TestGetBalance:
                 status="completed",
             )
         )
-        session.commit()
+        commit_and_reconcile(session)
 
         response = client.get(f"/accounts/{account_id}/balance")
 
         assert response.status_code == 200
         assert response.json()["balance"] == -50
 
-    def test_get_balance_ignores_pending_transactions(self, client, session):
+    def test_get_balance_ignores_pending_transactions(
+        self, client, session, commit_and_reconcile
+    ):
         """Deve ignorar transações pendentes no cálculo do saldo"""
         account_id = "test-account-4"
 
@@ -133,7 +165,7 @@ class TestGetBalance:
                 status="pending",
             )
         )
-        session.commit()
+        commit_and_reconcile(session)
 
         response = client.get(f"/accounts/{account_id}/balance")
 
@@ -141,7 +173,9 @@ class TestGetBalance:
         # Saldo deve ser apenas da transação completada
         assert response.json()["balance"] == 100
 
-    def test_get_balance_different_accounts_isolated(self, client, session):
+    def test_get_balance_different_accounts_isolated(
+        self, client, session, commit_and_reconcile
+    ):
         """Saldos de diferentes contas devem ser isolados"""
         account_1 = "account-a"
         account_2 = "account-b"
@@ -164,10 +198,332 @@ class TestGetBalance:
                 status="completed",
             )
         )
-        session.commit()
+        commit_and_reconcile(session)
 
         response_1 = client.get(f"/accounts/{account_1}/balance")
         response_2 = client.get(f"/accounts/{account_2}/balance")
 
         assert response_1.json()["balance"] == 100
         assert response_2.json()["balance"] == 300
+
+
+class TestBalanceLedger:
+    """Testes da tabela de saldos materializados"""
+
+    @pytest.mark.asyncio
+    async def test_complete_updates_balance_in_same_commit(self, async_session):
+        """Completar transação deve aplicar o valor no saldo da conta"""
+        repository = TransactionRepository(async_session)
+        account_id = "ledger-1"
+
+        for amount, kind in [(100, KindEnum.CREDIT), (30, KindEnum.DEBIT)]:
+            transaction, _ = await repository.create_or_get(
+                Transaction(
+                    external_id=uuid.uuid4(),
+                    amount=amount,
+                    kind=kind,
+                    account_id=account_id,
+                )
+            )
+            await repository.update_status(transaction.id, "pending", "processing")
+            transaction.status = "completed"
+            await repository.complete(transaction)
+
+        stored = await async_session.get(AccountBalance, account_id)
+        assert stored.balance == 70
+        assert await repository.get_balance(account_id) == 70
+
+    @pytest.mark.asyncio
+    async def test_get_balance_single_query(self, session, async_session):
+        """Saldo e existência da conta devem ser resolvidos em uma única consulta"""
+        session.add(
+            Transaction(
+                external_id=uuid.uuid4(),
+                amount=10,
+                kind=KindEnum.CREDIT,
+                account_id="ledger-4",
+                status="pending",
+            )
+        )
+        session.commit()
+
+        statements = []
+        engine = async_session.get_bind()
+        listener = lambda *args: statements.append(args[2])  # noqa: E731
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            balance = await TransactionRepository(async_session).get_balance("ledger-4")
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+
+        assert balance == 0
+        assert len(statements) == 1
+
+    @pytest.mark.asyncio
+    async def test_reconcile_reports_and_fixes_drift(self, session, async_session):
+        """Reconciliação deve reportar divergências e reconstruir os saldos"""
+        session.add(
+            Transaction(
+                external_id=uuid.uuid4(),
+                amount=100,
+                kind=KindEnum.CREDIT,
+                account_id="ledger-2",
+                status="completed",
+            )
+        )
+        session.add(AccountBalance(account_id="ledger-2", balance=40))
+        session.add(AccountBalance(account_id="ghost", balance=10))
+        session.commit()
+
+        service = AccountService(TransactionRepository(async_session))
+        drifts = await service.reconcile_balances()
+
+        assert {d.account_id: d.expected_balance for d in drifts} == {
+            "ghost": 0,
+            "ledger-2": 100,
+        }
+        assert await service.reconcile_balances() == []
+        assert await async_session.get(AccountBalance, "ghost") is None
+
+    @pytest.mark.asyncio
+    async def test_reconcile_keeps_concurrent_completion(
+        self, session, session_factory
+    ):
+        """Conclusão concorrente com a reconciliação não deve sumir do saldo"""
+        session.add(
+            Transaction(
+                external_id=uuid.uuid4(),
+                amount=10,
+                kind=KindEnum.CREDIT,
+                account_id="ledger-5",
+                status="completed",
+            )
+        )
+        processing = Transaction(
+            external_id=uuid.uuid4(),
+            amount=5,
+            kind=KindEnum.CREDIT,
+            account_id="ledger-5",
+            status="processing",
+            claimed_by="worker-1",
+        )
+        session.add(processing)
+        session.add(AccountBalance(account_id="ledger-5", balance=10))
+        session.commit()
+        session.refresh(processing)
+        processing.status = "completed"
+
+        async def complete():
+            async with session_factory() as worker_session:
+                await TransactionRepository(worker_session).complete(processing)
+
+        get_balances = TransactionRepository.get_balances
+        completion = None
+
+        async def interleaved(repository):
+            # O worker completa entre a leitura dos saldos e a reescrita
+            nonlocal completion
+            if completion is None:
+                completion = asyncio.create_task(complete())
+                await asyncio.sleep(0.2)
+                # Saldos travados: o complete() espera o commit da reconciliação
+                assert not completion.done()
+            return await get_balances(repository)
+
+        async with session_factory() as async_session:
+            service = AccountService(TransactionRepository(async_session))
+            with patch.object(TransactionRepository, "get_balances", interleaved):
+                await service.reconcile_balances()
+        await completion
+
+        session.expire_all()
+        assert session.get(AccountBalance, "ledger-5").balance == 15
+
+    @pytest.mark.asyncio
+    async def test_reconcile_dry_run_does_not_write(self, session, async_session):
+        """Reconciliação em dry-run não deve alterar os saldos"""
+        session.add(AccountBalance(account_id="ledger-3", balance=10))
+        session.commit()
+
+        service = AccountService(TransactionRepository(async_session))
+        drifts = await service.reconcile_balances(dry_run=True)
+
+        assert len(drifts) == 1
+        stored = await async_session.get(AccountBalance, "ledger-3")
+        assert stored.balance == 10
+
+
+class TestBalanceCacheIntegration:
+    """Testes de integração do cache de saldos"""
+
+    def test_completion_invalidates_cached_balance(
+        self, client, session, session_factory, commit_and_reconcile
+    ):
+        """Saldo em cache deve ser invalidado quando o worker completa uma transação"""
+        session.add(
+            Transaction(
+                external_id=uuid.uuid4(),
+                amount=100,
+                kind=KindEnum.CREDIT,
+                account_id="cached-1",
+                status="completed",
+            )
+        )
+        pending = Transaction(
+            external_id=uuid.uuid4(),
+            amount=50,
+            kind=KindEnum.CREDIT,
+            account_id="cached-1",
+        )
+        session.add(pending)
+        commit_and_reconcile(session)
+
+        before = client.get("/health/balance-cache").json()
+        assert client.get("/accounts/cached-1/balance").json()["balance"] == 100
+        assert client.get("/accounts/cached-1/balance").json()["balance"] == 100
+        after = client.get("/health/balance-cache").json()
+        assert after["hits"] - before["hits"] == 1
+        assert after["misses"] - before["misses"] == 1
+
+        async def process():
+            async with session_factory() as async_session:
+                service = TransactionService(TransactionRepository(async_session))
+                with patch(
+                    "app.services.transaction_service.bank_partner_request",
+                    new_callable=AsyncMock,
+                    return_value="partner-1",
+                ):
+                    await service.process_transaction(pending.id)
+
+        asyncio.run(process())
+
+        assert client.get("/accounts/cached-1/balance").json()["balance"] == 150
+
+
+class TestUnknownAccountCacheIntegration:
+    """Testes de integração do cache negativo de contas"""
+
+    def test_first_transaction_invalidates_unknown_account(self, client):
+        """Conta deve deixar de ser 404 assim que sua primeira transação é criada"""
+        assert client.get("/accounts/late/balance").status_code == 404
+
+        client.post(
+            "/transaction",
+            json={
+                "external_id": str(uuid.uuid4()),
+                "amount": 10,
+                "kind": "credit",
+                "account_id": "late",
+            },
+        )
+
+        response = client.get("/accounts/late/balance")
+        assert response.status_code == 200
+        assert response.json()["balance"] == 0
+
+    def test_first_batch_transaction_invalidates_unknown_account(self, client):
+        """Criação em lote também deve descartar o cache negativo da conta"""
+        assert client.get("/accounts/late-batch/balance").status_code == 404
+
+        client.post(
+            "/transactions/batch",
+            json={
+                "transactions": [
+                    {
+                        "external_id": str(uuid.uuid4()),
+                        "amount": 10,
+                        "kind": "credit",
+                        "account_id": "late-batch",
+                    }
+                ]
+            },
+        )
+
+        assert client.get("/accounts/late-batch/balance").status_code == 200
+
+
+class TestListTransactions:
+    """Testes para o endpoint GET /accounts/{account_id}/transactions"""
+
+    @staticmethod
+    def _add(session, account_id, count, **overrides):
+        for _ in range(count):
+            values = {
+                "external_id": uuid.uuid4(),
+                "amount": 10,
+                "kind": KindEnum.CREDIT,
+                "account_id": account_id,
+                "status": "completed",
+            }
+            values.update(overrides)
+            session.add(Transaction(**values))
+        session.commit()
+
+    def test_paginates_with_cursor(self, client, session):
+        """Deve percorrer todas as transações, da mais nova para a mais antiga"""
+        self._add(session, "history-1", 5)
+        self._add(session, "other", 3)
+
+        ids = []
+        cursor = None
+        while True:
+            params = {"limit": 2}
+            if cursor is not None:
+                params["cursor"] = cursor
+            response = client.get("/accounts/history-1/transactions", params=params)
+            assert response.status_code == 200
+            page = response.json()
+            ids.extend(item["id"] for item in page["items"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+        assert len(ids) == 5
+        assert ids == sorted(ids, reverse=True)
+
+    def test_filters_by_status_and_kind(self, client, session):
+        """Deve aplicar os filtros de status e kind"""
+        self._add(session, "history-2", 2)
+        self._add(session, "history-2", 1, status="failed")
+        self._add(session, "history-2", 1, kind=KindEnum.DEBIT)
+
+        response = client.get(
+            "/accounts/history-2/transactions",
+            params={"status": "completed", "kind": "credit"},
+        )
+
+        items = response.json()["items"]
+        assert len(items) == 2
+        assert all(
+            (item["status"], item["kind"]) == ("completed", "credit") for item in items
+        )
+
+    def test_filters_by_date_range(self, client, session):
+        """Deve filtrar por período de criação (início inclusivo, fim exclusivo)"""
+        self._add(session, "history-3", 1, created_at=datetime(2026, 1, 1, 12))
+        self._add(session, "history-3", 1, created_at=datetime(2026, 2, 1, 12))
+        self._add(session, "history-3", 1, created_at=datetime(2026, 3, 1, 12))
+
+        response = client.get(
+            "/accounts/history-3/transactions",
+            params={
+                "created_from": "2026-02-01T00:00:00Z",
+                "created_to": "2026-03-01T12:00:00Z",
+            },
+        )
+
+        items = response.json()["items"]
+        assert [item["created_at"][:10] for item in items] == ["2026-02-01"]
+
+    def test_unknown_account_returns_empty_page(self, client):
+        """Conta sem transações deve retornar página vazia"""
+        response = client.get("/accounts/nobody/transactions")
+
+        assert response.status_code == 200
+        assert response.json() == {"items": [], "next_cursor": None}
+
+    def test_rejects_invalid_limit(self, client):
+        """Deve retornar 422 para limit fora do intervalo"""
+        response = client.get("/accounts/any/transactions", params={"limit": 1000})
+
+        assert response.status_code == 422
@@ -1,7 +1,13 @@
+import asyncio
 import uuid
+from datetime import datetime, timedelta, timezone
 from unittest.mock import AsyncMock, patch
 
 import pytest
+from sqlmodel import select
+
+from app.messaging.outbox_relay import OutboxRelay
+from app.models.outbox import OutboxMessage
 
 
 class TestCreateTransactionWithMessaging:
@@ -22,12 +28,9 @@ class TestCreateTransactionWithMessaging:
         assert response.status_code == 201
         assert response.json()["status"] == "pending"
 
-    def test_publish_called_on_transaction_creation(self, client, session):
-        """Deve publicar transação na fila após criar"""
-        with patch(
-            "app.services.transaction_service.publish_transaction",
-            new_callable=AsyncMock,
-        ) as mock_publish:
+    def test_outbox_written_on_transaction_creation(self, client, session):
+        """Deve registrar a transação no outbox no mesmo commit da criação"""
+        with patch("app.messaging.outbox_relay.publish_many") as mock_publish:
             response = client.post(
                 "/transaction",
                 json={
@@ -38,60 +41,173 @@ class TestCreateTransactionWithMessaging:
                 },
             )
 
-            assert response.status_code == 201
-            transaction_id = response.json()["id"]
-            mock_publish.assert_called_once_with(transaction_id)
+        assert response.status_code == 201
+        transaction_id = response.json()["id"]
+        messages = session.exec(select(OutboxMessage)).all()
+        assert [message.transaction_id for message in messages] == [transaction_id]
+        # A requisição não publica no broker, só o relay
+        mock_publish.assert_not_called()
 
-    def test_publish_not_called_for_duplicate(self, client):
-        """Não deve publicar para transação duplicada"""
+    def test_outbox_not_written_for_duplicate(self, client, session):
+        """Não deve registrar outbox para transação duplicada"""
         external_id = str(uuid.uuid4())
 
+        # Primeira requisição
+        client.post(
+            "/transaction",
+            json={
+                "external_id": external_id,
+                "amount": 100,
+                "kind": "credit",
+                "account_id": "1",
+            },
+        )
+
+        # Segunda requisição com mesmo external_id
+        client.post(
+            "/transaction",
+            json={
+                "external_id": external_id,
+                "amount": 100,
+                "kind": "credit",
+                "account_id": "1",
+            },
+        )
+
+        # Outbox só deve ter uma mensagem
+        assert len(session.exec(select(OutboxMessage)).all()) == 1
+
+    def test_outbox_not_written_for_invalid_amount(self, client, session):
+        """Não deve registrar outbox para transação com valor inválido"""
+        client.post(
+            "/transaction",
+            json={
+                "external_id": str(uuid.uuid4()),
+                "amount": -100,
+                "kind": "credit",
+                "account_id": "1",
+            },
+        )
+
+        assert session.exec(select(OutboxMessage)).all() == []
+
+
+class TestOutboxRelay:
+    """Testes de integração do relay do outbox"""
+
+    @pytest.mark.asyncio
+    async def test_relay_publishes_and_removes_confirmed(
+        self, session, session_factory
+    ):
+        """Deve publicar o lote e remover só as mensagens confirmadas"""
+        session.add_all(OutboxMessage(transaction_id=i) for i in (1, 2, 3))
+        session.commit()
+        relay = OutboxRelay(session_factory, batch_size=10, poll_interval=1)
+
         with patch(
-            "app.services.transaction_service.publish_transaction",
+            "app.messaging.outbox_relay.publish_many",
             new_callable=AsyncMock,
+            return_value=[2],
         ) as mock_publish:
-            # Primeira requisição
-            client.post(
-                "/transaction",
-                json={
-                    "external_id": external_id,
-                    "amount": 100,
-                    "kind": "credit",
-                    "account_id": "1",
-                },
-            )
+            relayed = await relay.relay_once()
 
-            # Segunda requisição com mesmo external_id
-            client.post(
-                "/transaction",
-                json={
-                    "external_id": external_id,
-                    "amount": 100,
-                    "kind": "credit",
-                    "account_id": "1",
-                },
-            )
+        assert relayed == 3
+        mock_publish.assert_called_once_with([1, 2, 3], trace_contexts={})
+        session.expire_all()
+        remaining = session.exec(select(OutboxMessage)).all()
+        assert [message.transaction_id for message in remaining] == [2]
+        # A não confirmada é liberada para a próxima rodada
+        assert remaining[0].claimed_by is None
 
-            # Publish só deve ser chamado uma vez
-            assert mock_publish.call_count == 1
+    @pytest.mark.asyncio
+    async def test_relay_respects_batch_size(self, session, session_factory):
+        """Deve publicar no máximo batch_size mensagens, na ordem de criação"""
+        session.add_all(OutboxMessage(transaction_id=i) for i in range(5))
+        session.commit()
+        relay = OutboxRelay(session_factory, batch_size=2, poll_interval=1)
 
-    def test_publish_not_called_for_invalid_amount(self, client):
-        """Não deve publicar para transação com valor inválido"""
         with patch(
-            "app.services.transaction_service.publish_transaction",
+            "app.messaging.outbox_relay.publish_many",
             new_callable=AsyncMock,
+            return_value=[],
         ) as mock_publish:
-            client.post(
-                "/transaction",
-                json={
-                    "external_id": str(uuid.uuid4()),
-                    "amount": -100,
-                    "kind": "credit",
-                    "account_id": "1",
-                },
+            await relay.relay_once()
+            await relay.relay_once()
+
+        assert [call.args[0] for call in mock_publish.call_args_list] == [
+            [0, 1],
+            [2, 3],
+        ]
+
+    @pytest.mark.asyncio
+    async def test_concurrent_relays_do_not_publish_same_messages(
+        self, session, session_factory
+    ):
+        """Relays de processos diferentes não devem publicar as mesmas mensagens"""
+        session.add_all(OutboxMessage(transaction_id=i) for i in range(10))
+        session.commit()
+        relays = [
+            OutboxRelay(session_factory, batch_size=4, poll_interval=1)
+            for _ in range(3)
+        ]
+        published = []
+
+        async def publish_many(transaction_ids, trace_contexts):
+            published.extend(transaction_ids)
+            await asyncio.sleep(0.01)
+            return []
+
+        with patch("app.messaging.outbox_relay.publish_many", side_effect=publish_many):
+            await asyncio.gather(*(relay.relay_once() for relay in relays))
+
+        assert len(published) == len(set(published)) == 10
+
+    @pytest.mark.asyncio
+    async def test_relay_skips_active_claims_and_takes_expired(
+        self, session, session_factory
+    ):
+        """Claim ativo de outro relay deve ser respeitado; claim vencido não"""
+        now = datetime.now(timezone.utc)
+        session.add(OutboxMessage(transaction_id=1, claimed_by="api-1", claimed_at=now))
+        session.add(
+            OutboxMessage(
+                transaction_id=2,
+                claimed_by="api-2",
+                claimed_at=now - timedelta(minutes=5),
             )
+        )
+        session.commit()
+        relay = OutboxRelay(session_factory, batch_size=10, poll_interval=1, lease_s=30)
 
-            mock_publish.assert_not_called()
+        with patch(
+            "app.messaging.outbox_relay.publish_many",
+            new_callable=AsyncMock,
+            return_value=[],
+        ) as mock_publish:
+            await relay.relay_once()
+
+        mock_publish.assert_called_once_with([2], trace_contexts={})
+
+    @pytest.mark.asyncio
+    async def test_relay_releases_batch_when_publish_fails(
+        self, session, session_factory
+    ):
+        """Falha na publicação deve liberar o lote para a próxima rodada"""
+        session.add(OutboxMessage(transaction_id=1))
+        session.commit()
+        relay = OutboxRelay(session_factory, batch_size=10, poll_interval=1)
+
+        with patch(
+            "app.messaging.outbox_relay.publish_many",
+            new_callable=AsyncMock,
+            side_effect=ConnectionError("broker indisponível"),
+        ):
+            with pytest.raises(ConnectionError):
+                await relay.relay_once()
+
+        session.expire_all()
+        [message] = session.exec(select(OutboxMessage)).all()
+        assert message.claimed_by is None
 
 
 class TestBankPartnerUnit:
@@ -129,3 +245,48 @@ class TestBankPartnerUnit:
                     amount=100,
                     kind=KindEnum.CREDIT,
                 )
+
+    @pytest.mark.asyncio
+    async def test_bank_partner_batch_returns_result_per_item(self):
+        """bank_partner_batch_request deve retornar um resultado por item"""
+        from app.core.exceptions import BankPartnerError
+        from app.integrations.bank_partner import (
+            PartnerRequest,
+            bank_partner_batch_request,
+        )
+        from app.models.transaction import KindEnum
+
+        requests = [
+            PartnerRequest(external_id=uuid.uuid4(), amount=100, kind=KindEnum.CREDIT)
+            for _ in range(3)
+        ]
+
+        # Segundo item falha (< 0.3), demais têm sucesso
+        with patch(
+            "app.integrations.bank_partner.random.random",
+            side_effect=[0.5, 0.1, 0.9],
+        ):
+            results = await bank_partner_batch_request(requests)
+
+        assert len(results) == 3
+        uuid.UUID(results[0].partner_id)
+        assert isinstance(results[1].error, BankPartnerError)
+        assert results[1].partner_id is None
+        uuid.UUID(results[2].partner_id)
+
+    @pytest.mark.asyncio
+    async def test_bank_partner_batch_rejects_oversized_batch(self):
+        """bank_partner_batch_request deve rejeitar lotes acima do máximo"""
+        from app.integrations.bank_partner import (
+            MAX_BATCH_SIZE,
+            PartnerRequest,
+            bank_partner_batch_request,
+        )
+        from app.models.transaction import KindEnum
+
+        requests = [
+            PartnerRequest(external_id=uuid.uuid4(), amount=1, kind=KindEnum.CREDIT)
+        ] * (MAX_BATCH_SIZE + 1)
+
+        with pytest.raises(ValueError):
+            await bank_partner_batch_request(requests)
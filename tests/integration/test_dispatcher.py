@@ -0,0 +1,268 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlmodel import select
+
+from app.core.config import settings
+from app.core.exceptions import BankPartnerError
+from app.dispatcher import claimed_transactions, handle_transaction
+from app.models.outbox import OutboxMessage
+from app.models.transaction import KindEnum, Transaction
+from app.repositories.transaction_repository import TransactionRepository
+
+
+def _transaction(**overrides):
+    values = {
+        "external_id": uuid.uuid4(),
+        "amount": 100,
+        "kind": KindEnum.CREDIT,
+        "account_id": "dispatch-1",
+        "status": "pending",
+    }
+    values.update(overrides)
+    return Transaction(**values)
+
+
+@pytest.fixture
+def dispatcher_session(session_factory):
+    # O dispatcher abre as próprias sessões: aponta para o banco do teste
+    with patch("app.dispatcher.async_session", session_factory):
+        yield session_factory
+
+
+class TestClaimBatch:
+    """Testes do claim em lote direto da tabela"""
+
+    @pytest.mark.asyncio
+    async def test_claims_pending_in_arrival_order(self, session, async_session):
+        """Deve reivindicar as pendentes mais antigas até o limite"""
+        session.add_all(_transaction() for _ in range(3))
+        session.add(_transaction(status="completed"))
+        session.commit()
+
+        claimed = await TransactionRepository(async_session).claim_batch(
+            "dispatcher-1", limit=2, lease_s=60
+        )
+
+        assert [t.id for t in claimed] == [1, 2]
+        assert all(t.status == "processing" for t in claimed)
+        assert all(t.claimed_by == "dispatcher-1" for t in claimed)
+        # A tentativa só é contada ao renovar o claim, antes do parceiro
+        assert all(t.attempts == 0 for t in claimed)
+
+    @pytest.mark.asyncio
+    async def test_skips_active_claims_and_future_retries(self, session, async_session):
+        """Claims ativos e retries agendados não devem ser reivindicados"""
+        now = datetime.now(timezone.utc)
+        session.add(_transaction(status="processing", claimed_at=now))
+        session.add(_transaction(retry_at=now + timedelta(minutes=1)))
+        session.add(_transaction(retry_at=now - timedelta(seconds=1)))
+        session.commit()
+
+        claimed = await TransactionRepository(async_session).claim_batch(
+            "dispatcher-1", limit=10, lease_s=60
+        )
+
+        assert [t.id for t in claimed] == [3]
+
+    @pytest.mark.asyncio
+    async def test_concurrent_dispatchers_do_not_overlap(
+        self, session, session_factory
+    ):
+        """Dispatchers concorrentes devem reivindicar transações distintas"""
+        session.add_all(_transaction() for _ in range(20))
+        session.commit()
+
+        async def claim(name):
+            async with session_factory() as async_session:
+                return await TransactionRepository(async_session).claim_batch(
+                    name, limit=8, lease_s=60
+                )
+
+        batches = await asyncio.gather(*(claim(f"d{i}") for i in range(4)))
+
+        ids = [t.id for batch in batches for t in batch]
+        assert len(ids) == len(set(ids)) == 20
+
+    @pytest.mark.asyncio
+    async def test_release_returns_unprocessed_claims(self, session, async_session):
+        """Transações liberadas devem voltar para pending sem contar tentativa"""
+        session.add(_transaction())
+        session.commit()
+        repository = TransactionRepository(async_session)
+        [claimed] = await repository.claim_batch("dispatcher-1", limit=1, lease_s=60)
+
+        await repository.release([claimed.id], "dispatcher-1")
+
+        [reclaimed] = await repository.claim_batch("dispatcher-2", limit=1, lease_s=60)
+        assert reclaimed.status == "processing"
+        assert reclaimed.attempts == 0
+
+
+class TestHandleTransaction:
+    """Testes da semântica de retry do dispatcher"""
+
+    async def _claim(self, session_factory):
+        async with session_factory() as async_session:
+            [claimed] = await TransactionRepository(async_session).claim_batch(
+                "dispatcher-1", limit=1, lease_s=60
+            )
+        return claimed
+
+    async def _stored(self, session_factory, transaction_id):
+        async with session_factory() as async_session:
+            return await TransactionRepository(async_session).get_by_id(transaction_id)
+
+    @pytest.mark.asyncio
+    async def test_completes_transaction(self, session, dispatcher_session):
+        """Sucesso do parceiro deve completar a transação"""
+        session.add(_transaction())
+        session.commit()
+        claimed = await self._claim(dispatcher_session)
+
+        with patch(
+            "app.services.transaction_service.bank_partner_request",
+            new_callable=AsyncMock,
+            return_value="partner-1",
+        ):
+            await handle_transaction(claimed)
+
+        stored = await self._stored(dispatcher_session, claimed.id)
+        assert stored.status == "completed"
+        assert stored.partner_id == "partner-1"
+        assert stored.attempts == 1
+
+    @pytest.mark.asyncio
+    async def test_failure_schedules_retry(self, session, dispatcher_session):
+        """Falha antes da última tentativa deve voltar para pending com retry_at"""
+        session.add(_transaction())
+        session.commit()
+        claimed = await self._claim(dispatcher_session)
+
+        with patch(
+            "app.services.transaction_service.bank_partner_request",
+            new_callable=AsyncMock,
+            side_effect=BankPartnerError("Erro"),
+        ):
+            await handle_transaction(claimed)
+
+        stored = await self._stored(dispatcher_session, claimed.id)
+        assert stored.status == "pending"
+        assert stored.retry_at is not None
+
+    @pytest.mark.asyncio
+    async def test_last_attempt_marks_failed(self, session, dispatcher_session):
+        """Falha na última tentativa deve marcar a transação como failed"""
+        session.add(_transaction(attempts=settings.max_retries))
+        session.commit()
+        claimed = await self._claim(dispatcher_session)
+
+        with patch(
+            "app.services.transaction_service.bank_partner_request",
+            new_callable=AsyncMock,
+            side_effect=BankPartnerError("Erro"),
+        ):
+            await handle_transaction(claimed)
+
+        stored = await self._stored(dispatcher_session, claimed.id)
+        assert stored.status == "failed"
+
+    @pytest.mark.asyncio
+    async def test_skips_transaction_with_lost_claim(self, session, dispatcher_session):
+        """Claim vencido e reivindicado por outro dispatcher não deve chamar o parceiro"""
+        session.add(_transaction())
+        session.commit()
+        claimed = await self._claim(dispatcher_session)
+
+        # O lease venceu enquanto a transação esperava uma vaga no lote
+        stored = session.get(Transaction, claimed.id)
+        stored.claimed_at = datetime.now(timezone.utc) - timedelta(seconds=120)
+        session.add(stored)
+        session.commit()
+        async with dispatcher_session() as async_session:
+            [reclaimed] = await TransactionRepository(async_session).claim_batch(
+                "dispatcher-2", limit=1, lease_s=60
+            )
+
+        with patch(
+            "app.services.transaction_service.bank_partner_request",
+            new_callable=AsyncMock,
+            return_value="partner-1",
+        ) as partner:
+            await handle_transaction(claimed)
+
+        partner.assert_not_called()
+        stored = await self._stored(dispatcher_session, claimed.id)
+        assert stored.status == "processing"
+        assert stored.claimed_by == reclaimed.claimed_by == "dispatcher-2"
+        # Esperar na fila e perder o lease não gasta tentativas
+        assert stored.attempts == 0
+
+    @pytest.mark.asyncio
+    async def test_renews_claim_before_partner_call(self, session, dispatcher_session):
+        """O lease deve ser renovado antes da chamada ao parceiro"""
+        session.add(_transaction())
+        session.commit()
+        claimed = await self._claim(dispatcher_session)
+
+        async def partner_request(**kwargs):
+            stored = await self._stored(dispatcher_session, claimed.id)
+            assert stored.claimed_at > claimed.claimed_at
+            return "partner-1"
+
+        with patch(
+            "app.services.transaction_service.bank_partner_request",
+            side_effect=partner_request,
+        ):
+            await handle_transaction(claimed)
+
+        stored = await self._stored(dispatcher_session, claimed.id)
+        assert stored.status == "completed"
+
+
+class TestClaimedTransactions:
+    """Testes do loop de polling do dispatcher"""
+
+    @pytest.mark.asyncio
+    async def test_releases_undelivered_on_stop(self, session, dispatcher_session):
+        """No shutdown, transações reivindicadas e não entregues voltam para pending"""
+        session.add_all(_transaction() for _ in range(3))
+        session.commit()
+        stop = asyncio.Event()
+
+        delivered = []
+        async for transaction in claimed_transactions(
+            stop, batch_size=3, poll_interval=0.01
+        ):
+            delivered.append(transaction)
+            stop.set()
+
+        async with dispatcher_session() as async_session:
+            statuses = [
+                t.status for t in (await async_session.exec(select(Transaction))).all()
+            ]
+        assert len(delivered) == 1
+        assert sorted(statuses) == ["pending", "pending", "processing"]
+
+
+class TestDatabaseDispatchMode:
+    """Testes da API no modo database"""
+
+    def test_create_does_not_write_outbox(self, client, session):
+        """No modo database a criação não deve gravar no outbox"""
+        with patch.object(settings, "dispatch_mode", "database"):
+            response = client.post(
+                "/transaction",
+                json={
+                    "external_id": str(uuid.uuid4()),
+                    "amount": 10,
+                    "kind": "credit",
+                    "account_id": "dispatch-2",
+                },
+            )
+
+        assert response.status_code == 201
+        assert session.exec(select(OutboxMessage)).all() == []
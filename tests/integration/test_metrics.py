@@ -0,0 +1,104 @@
+import uuid
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app.core.exceptions import BankPartnerError, TransactionClaimedError
+from app.integrations.bank_partner import bank_partner_request
+from app.models.transaction import KindEnum
+from app.worker import handle_failure
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class TestMetricsEndpoint:
+    """Testes do endpoint /metrics da API"""
+
+    def test_exposes_prometheus_format(self, client):
+        """Deve responder no formato texto do Prometheus"""
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert "http_request_duration_seconds" in response.text
+
+    def test_request_latency_by_route_template(self, client):
+        """Latência deve ser agrupada pelo template da rota, não pelo path"""
+        labels = {
+            "method": "GET",
+            "route": "/accounts/{account_id}/balance",
+            "status": "404",
+        }
+        before = _sample("http_request_duration_seconds_count", **labels)
+
+        client.get(f"/accounts/{uuid.uuid4()}/balance")
+        client.get(f"/accounts/{uuid.uuid4()}/balance")
+
+        assert _sample("http_request_duration_seconds_count", **labels) == before + 2
+
+    def test_create_transaction_db_timing(self, client):
+        """Criação deve registrar a duração da escrita no banco"""
+        before = _sample(
+            "db_operation_duration_seconds_count", operation="create_or_get"
+        )
+
+        client.post(
+            "/transaction",
+            json={
+                "external_id": str(uuid.uuid4()),
+                "amount": 10,
+                "kind": "credit",
+                "account_id": "metrics-1",
+            },
+        )
+
+        assert (
+            _sample("db_operation_duration_seconds_count", operation="create_or_get")
+            == before + 1
+        )
+
+
+class TestWorkerMetrics:
+    """Testes das métricas do parceiro e do worker"""
+
+    @pytest.mark.asyncio
+    async def test_partner_errors_counted(self):
+        """Erros do parceiro devem ser contados separadamente dos sucessos"""
+        labels = {"mode": "single", "result": "error"}
+        before = _sample("partner_requests_total", **labels)
+
+        with patch(
+            "app.integrations.bank_partner._send",
+            new_callable=AsyncMock,
+            side_effect=BankPartnerError(),
+        ):
+            with pytest.raises(BankPartnerError):
+                await bank_partner_request(uuid.uuid4(), 10, KindEnum.CREDIT)
+
+        assert _sample("partner_requests_total", **labels) == before + 1
+        assert _sample("partner_request_duration_seconds_count", mode="single") > 0
+
+    @pytest.mark.asyncio
+    async def test_retry_and_dlq_counted_by_reason(self):
+        """Retries e DLQ devem ser contados pelo motivo da falha"""
+        retry_before = _sample("worker_retries_total", reason="TransactionClaimedError")
+        dlq_before = _sample("worker_dead_letters_total", reason="BankPartnerError")
+
+        with (
+            patch("app.worker.publish_to_retry", new_callable=AsyncMock),
+            patch("app.worker.publish_to_dlq", new_callable=AsyncMock),
+        ):
+            await handle_failure(1, 0, TransactionClaimedError(1, "host:1"))
+            await handle_failure(1, 3, BankPartnerError())
+
+        assert (
+            _sample("worker_retries_total", reason="TransactionClaimedError")
+            == retry_before + 1
+        )
+        assert (
+            _sample("worker_dead_letters_total", reason="BankPartnerError")
+            == dlq_before + 1
+        )
@@ -0,0 +1,130 @@
+import uuid
+
+import pytest
+from alembic.autogenerate import compare_metadata
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.core.database import INITIAL_REVISION, _run_migrations
+from app.models.account_balance import AccountBalance
+from app.models.transaction import Transaction
+
+# DDL gerado pelo create_all do modelo original, antes das migrações
+LEGACY_SCHEMA = [
+    """
+    CREATE TABLE transactions (
+        id INTEGER NOT NULL,
+        external_id CHAR(32) NOT NULL,
+        amount FLOAT NOT NULL,
+        kind VARCHAR(6) NOT NULL,
+        status VARCHAR NOT NULL,
+        partner_id VARCHAR,
+        account_id VARCHAR NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    "CREATE INDEX ix_transactions_partner_id ON transactions (partner_id)",
+    "CREATE INDEX ix_transactions_account_id ON transactions (account_id)",
+    "CREATE UNIQUE INDEX ix_transactions_external_id ON transactions (external_id)",
+]
+
+
+@pytest.fixture
+async def migration_engine(tmp_path):
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'migrations.db'}", poolclass=NullPool
+    )
+    yield engine
+    await engine.dispose()
+
+
+def _current_revision(connection):
+    return MigrationContext.configure(connection).get_current_revision()
+
+
+class TestMigrations:
+    """Testes das migrações Alembic executadas pelo init_db"""
+
+    @pytest.mark.asyncio
+    async def test_migrations_match_models(self, migration_engine):
+        """Schema gerado pelas migrações deve ser igual ao dos modelos"""
+        async with migration_engine.begin() as connection:
+            await connection.run_sync(_run_migrations)
+
+        async with migration_engine.connect() as connection:
+            diff = await connection.run_sync(
+                lambda sync_connection: compare_metadata(
+                    MigrationContext.configure(sync_connection), SQLModel.metadata
+                )
+            )
+
+        assert diff == []
+
+    @pytest.mark.asyncio
+    async def test_migrations_are_idempotent(self, migration_engine):
+        """Rodar as migrações de novo não deve falhar nem alterar a revisão"""
+        for _ in range(2):
+            async with migration_engine.begin() as connection:
+                await connection.run_sync(_run_migrations)
+
+        async with migration_engine.connect() as connection:
+            revision = await connection.run_sync(_current_revision)
+
+        assert revision is not None
+
+    @pytest.mark.asyncio
+    async def test_adopts_database_created_by_create_all(
+        self, tmp_path, migration_engine
+    ):
+        """Banco criado pelo antigo create_all deve ser migrado, mantendo os dados"""
+        async with migration_engine.begin() as connection:
+            for statement in LEGACY_SCHEMA:
+                await connection.execute(text(statement))
+            for account_id, kind, amount, status in [
+                ("legacy-1", "CREDIT", 100, "completed"),
+                ("legacy-1", "DEBIT", 30, "completed"),
+                ("legacy-1", "CREDIT", 50, "pending"),
+                ("legacy-2", "CREDIT", 10, "failed"),
+            ]:
+                await connection.execute(
+                    text(
+                        "INSERT INTO transactions "
+                        "(external_id, amount, kind, status, account_id) "
+                        "VALUES (:external_id, :amount, :kind, :status, :account_id)"
+                    ),
+                    {
+                        "external_id": uuid.uuid4().hex,
+                        "amount": amount,
+                        "kind": kind,
+                        "status": status,
+                        "account_id": account_id,
+                    },
+                )
+
+        async with migration_engine.begin() as connection:
+            await connection.run_sync(_run_migrations)
+
+        async with migration_engine.connect() as connection:
+            revision = await connection.run_sync(_current_revision)
+            tables = await connection.run_sync(
+                lambda sync_connection: inspect(sync_connection).get_table_names()
+            )
+
+        assert revision > INITIAL_REVISION
+        assert {"alembic_version", "account_balances", "outbox"} <= set(tables)
+        sync_engine = create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+        with Session(sync_engine) as session:
+            transactions = session.exec(select(Transaction)).all()
+            assert len(transactions) == 4
+            assert all(t.created_at is not None for t in transactions)
+            assert all(t.claimed_by is None for t in transactions)
+            # O ledger parte do saldo das transações já completadas
+            balances = {
+                balance.account_id: balance.balance
+                for balance in session.exec(select(AccountBalance)).all()
+            }
+            assert balances == {"legacy-1": 70}
+        sync_engine.dispose()
@@ -0,0 +1,254 @@
+import json
+import uuid
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from sqlmodel import select
+
+from app.core.config import settings
+from app.core.exceptions import BankPartnerError
+from app.core.tracing import _create_exporter, inject_context, tracer
+from app.integrations.bank_partner import bank_partner_request
+from app.messaging.publisher import publish_many
+from app.models.outbox import OutboxMessage
+from app.models.transaction import KindEnum, Transaction
+from app.worker import handle_batch, handle_message
+
+
+@pytest.fixture
+def published():
+    """Captura as mensagens publicadas no RabbitMQ"""
+    channel = MagicMock()
+    channel.default_exchange.publish = AsyncMock()
+
+    @asynccontextmanager
+    async def borrow_channel():
+        yield channel
+
+    with patch(
+        "app.messaging.publisher.RabbitMQPublisher.channel",
+        side_effect=borrow_channel,
+    ):
+        yield lambda: [
+            call.args[0] for call in channel.default_exchange.publish.call_args_list
+        ]
+
+
+def _incoming(message):
+    """Mensagem recebida pelo worker com o corpo e os headers publicados"""
+    incoming = MagicMock()
+    incoming.body = message.body
+    incoming.headers = message.headers
+    incoming.timestamp = None
+
+    @asynccontextmanager
+    async def process(**kwargs):
+        yield
+
+    incoming.process = process
+    return incoming
+
+
+def _span(spans, name):
+    [span] = [span for span in spans() if span.name == name]
+    return span
+
+
+class TestApiTracing:
+    """Testes do tracing das requisições HTTP"""
+
+    def test_server_span_named_by_route(self, client, spans):
+        """O span da requisição deve usar o template da rota"""
+        client.get(f"/accounts/{uuid.uuid4()}/balance")
+
+        span = _span(spans, "GET /accounts/{account_id}/balance")
+        assert span.kind == trace.SpanKind.SERVER
+        assert span.attributes["http.response.status_code"] == 404
+
+    def test_continues_incoming_trace(self, client, spans):
+        """Um traceparent recebido deve ser continuado pela API"""
+        trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+
+        client.get(
+            f"/accounts/{uuid.uuid4()}/balance",
+            headers={"traceparent": f"00-{trace_id}-00f067aa0ba902b7-01"},
+        )
+
+        span = _span(spans, "GET /accounts/{account_id}/balance")
+        assert format(span.context.trace_id, "032x") == trace_id
+
+    def test_outbox_stores_request_context(self, client, session, spans):
+        """O outbox deve guardar o contexto da requisição que criou a transação"""
+        client.post(
+            "/transaction",
+            json={
+                "external_id": str(uuid.uuid4()),
+                "amount": 100,
+                "kind": "credit",
+                "account_id": "trace-1",
+            },
+        )
+
+        [message] = session.exec(select(OutboxMessage)).all()
+        request_span = _span(spans, "POST /transaction")
+        assert message.trace_context["traceparent"].split("-")[1] == format(
+            request_span.context.trace_id, "032x"
+        )
+
+
+class TestMessageTracing:
+    """Testes da propagação do contexto pelos headers AMQP"""
+
+    @pytest.mark.asyncio
+    async def test_trace_spans_publish_consume_and_partner(
+        self, session, session_factory, published, spans
+    ):
+        """Publicação, processamento e chamada ao parceiro devem formar um só trace"""
+        transaction = Transaction(
+            external_id=uuid.uuid4(),
+            amount=100,
+            kind=KindEnum.CREDIT,
+            account_id="trace-2",
+            status="pending",
+        )
+        session.add(transaction)
+        session.commit()
+        session.refresh(transaction)
+
+        with tracer.start_as_current_span("POST /transaction"):
+            trace_context = inject_context()
+        await publish_many(
+            [transaction.id], trace_contexts={transaction.id: trace_context}
+        )
+        [message] = published()
+        assert json.loads(message.body) == {"transaction_id": transaction.id}
+        assert "traceparent" in message.headers
+
+        with (
+            patch("app.worker.async_session", session_factory),
+            patch(
+                "app.services.transaction_service.bank_partner_request",
+                wraps=self._partner_request,
+            ),
+        ):
+            await handle_message(_incoming(message))
+
+        request = _span(spans, "POST /transaction")
+        producer = _span(spans, "publish transactions")
+        consumer = _span(spans, "process transactions")
+        partner = _span(spans, "bank_partner request")
+        assert producer.parent.span_id == request.context.span_id
+        assert consumer.parent.span_id == producer.context.span_id
+        assert consumer.kind == trace.SpanKind.CONSUMER
+        assert partner.parent.span_id == consumer.context.span_id
+        assert {span.context.trace_id for span in (producer, consumer, partner)} == {
+            request.context.trace_id
+        }
+
+    @staticmethod
+    async def _partner_request(external_id, amount, kind):
+        with patch(
+            "app.integrations.bank_partner._send",
+            new_callable=AsyncMock,
+            return_value="partner-1",
+        ):
+            return await bank_partner_request(external_id, amount, kind)
+
+    @pytest.mark.asyncio
+    async def test_retry_message_continues_trace(
+        self, session, session_factory, published, spans
+    ):
+        """A mensagem de retry deve levar o contexto do processamento que falhou"""
+        transaction = Transaction(
+            external_id=uuid.uuid4(),
+            amount=100,
+            kind=KindEnum.CREDIT,
+            account_id="trace-3",
+            status="pending",
+        )
+        session.add(transaction)
+        session.commit()
+        session.refresh(transaction)
+
+        incoming = _incoming(
+            MagicMock(
+                body=json.dumps({"transaction_id": transaction.id}).encode(),
+                headers=inject_context({"x-retry-count": 0}),
+            )
+        )
+        with (
+            patch("app.worker.async_session", session_factory),
+            patch(
+                "app.services.transaction_service.bank_partner_request",
+                new_callable=AsyncMock,
+                side_effect=BankPartnerError("Erro"),
+            ),
+        ):
+            await handle_message(incoming)
+
+        consumer = _span(spans, "process transactions")
+        assert consumer.status.status_code == trace.StatusCode.ERROR
+        [retry] = published()
+        assert retry.headers["traceparent"].split("-")[2] == format(
+            consumer.context.span_id, "016x"
+        )
+
+    @pytest.mark.asyncio
+    async def test_batch_span_links_each_message(self, session_factory, spans):
+        """O span do lote deve ter um link para o trace de cada mensagem"""
+        messages = []
+        for transaction_id in (1, 2):
+            with tracer.start_as_current_span("POST /transaction"):
+                messages.append(
+                    _incoming(
+                        MagicMock(
+                            body=json.dumps(
+                                {"transaction_id": transaction_id}
+                            ).encode(),
+                            headers=inject_context({"x-retry-count": 0}),
+                        )
+                    )
+                )
+
+        with (
+            patch("app.worker.async_session", session_factory),
+            patch(
+                "app.services.transaction_service.TransactionService.process_batch",
+                new_callable=AsyncMock,
+                return_value={},
+            ),
+        ):
+            await handle_batch(messages)
+
+        batch = _span(spans, "process transactions batch")
+        linked = {link.context.trace_id for link in batch.links}
+        requests = {
+            span.context.trace_id
+            for span in spans()
+            if span.name == "POST /transaction"
+        }
+        assert linked == requests
+        assert len(linked) == 2
+
+
+class TestFileExporter:
+    """Testes do exporter em arquivo"""
+
+    def test_writes_one_json_span_per_line(self, tmp_path):
+        """Cada span deve ser gravado como uma linha JSON"""
+        path = tmp_path / "traces.jsonl"
+        with patch.object(settings, "tracing_file_path", str(path)):
+            exporter = _create_exporter("file")
+        provider = TracerProvider()
+        provider.add_span_processor(SimpleSpanProcessor(exporter))
+
+        with provider.get_tracer("test").start_as_current_span("process transactions"):
+            pass
+        provider.shutdown()
+
+        [line] = path.read_text().splitlines()
+        assert json.loads(line)["name"] == "process transactions"
@@ -1,6 +1,18 @@
+import asyncio
+import json
 import uuid
+from unittest.mock import AsyncMock, patch
 
 import pytest
+from sqlalchemy import event
+from sqlmodel import select
+
+from app.core.exceptions import TransactionClaimedError
+from app.models.outbox import OutboxMessage
+from app.models.transaction import KindEnum, Transaction
+from app.repositories.idempotency_cache import idempotency_cache
+from app.repositories.transaction_repository import TransactionRepository
+from app.services.transaction_service import TransactionService
 
 
 class TestCreateTransaction:
@@ -220,3 +232,526 @@ class TestTransactionValidation:
         )
 
         assert response.status_code == 201
+
+
+def _batch_item(**overrides):
+    item = {
+        "external_id": str(uuid.uuid4()),
+        "amount": 100,
+        "kind": "credit",
+        "account_id": "1",
+    }
+    item.update(overrides)
+    return item
+
+
+class TestCreateTransactionsBatch:
+    """Testes para o endpoint POST /transactions/batch"""
+
+    def test_reports_status_per_item(self, client):
+        """Deve retornar created, existing e invalid por item, na ordem"""
+        existing = _batch_item()
+        client.post("/transaction", json=existing)
+
+        response = client.post(
+            "/transactions/batch",
+            json={
+                "transactions": [
+                    _batch_item(),
+                    existing,
+                    _batch_item(amount=0),
+                    _batch_item(kind="transfer"),
+                ]
+            },
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert [item["result"] for item in data["results"]] == [
+            "created",
+            "existing",
+            "invalid",
+            "invalid",
+        ]
+        assert (data["created"], data["existing"], data["invalid"]) == (1, 1, 2)
+        assert data["results"][0]["status"] == "pending"
+        assert data["results"][0]["id"] is not None
+        assert "kind" in data["results"][3]["error"]
+
+    def test_inserts_rows_and_outbox_once(self, client, session):
+        """Deve gravar uma transação e uma mensagem de outbox por external_id"""
+        items = [_batch_item() for _ in range(50)]
+
+        response = client.post(
+            "/transactions/batch", json={"transactions": items + items[:5]}
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["created"] == 50
+        assert data["existing"] == 5
+        assert data["results"][50]["id"] == data["results"][0]["id"]
+        assert len(session.exec(select(Transaction)).all()) == 50
+        assert len(session.exec(select(OutboxMessage)).all()) == 50
+
+    def test_resubmitting_batch_is_idempotent(self, client, session):
+        """Reenviar o mesmo lote não deve criar novas transações"""
+        items = [_batch_item() for _ in range(10)]
+        first = client.post("/transactions/batch", json={"transactions": items})
+
+        second = client.post("/transactions/batch", json={"transactions": items})
+
+        assert second.json()["existing"] == 10
+        assert [item["id"] for item in second.json()["results"]] == [
+            item["id"] for item in first.json()["results"]
+        ]
+        assert len(session.exec(select(OutboxMessage)).all()) == 10
+
+    def test_rejects_batch_above_limit(self, client):
+        """Deve retornar 413 quando o lote excede batch_max_items"""
+        with patch("app.api.endpoints.transaction.settings.batch_max_items", 2):
+            response = client.post(
+                "/transactions/batch",
+                json={"transactions": [_batch_item() for _ in range(3)]},
+            )
+
+        assert response.status_code == 413
+
+
+class TestCreateTransactionsStream:
+    """Testes para o endpoint POST /transactions/stream (NDJSON)"""
+
+    @staticmethod
+    def _post_lines(client, lines):
+        def body():
+            for line in lines:
+                yield line.encode() + b"\n"
+
+        return client.post(
+            "/transactions/stream",
+            content=body(),
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+
+    @staticmethod
+    def _results(response):
+        return [json.loads(line) for line in response.text.splitlines()]
+
+    def test_streams_result_per_line(self, client):
+        """Deve responder uma linha NDJSON por linha recebida"""
+        existing = _batch_item()
+        client.post("/transaction", json=existing)
+
+        response = self._post_lines(
+            client,
+            [
+                json.dumps(_batch_item()),
+                json.dumps(existing),
+                "",
+                "{not json",
+                json.dumps(_batch_item(amount=-1)),
+            ],
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        results = self._results(response)
+        assert [(r["index"], r["result"]) for r in results] == [
+            (1, "created"),
+            (2, "existing"),
+            (4, "invalid"),
+            (5, "invalid"),
+        ]
+
+    def test_commits_in_chunks(self, client, session):
+        """Deve commitar um lote a cada stream_chunk_size linhas"""
+        items = [_batch_item() for _ in range(25)]
+
+        with patch("app.api.endpoints.transaction.settings.stream_chunk_size", 10):
+            with patch.object(
+                TransactionService,
+                "create_transactions",
+                autospec=True,
+                side_effect=TransactionService.create_transactions,
+            ) as mock_create:
+                response = self._post_lines(client, [json.dumps(i) for i in items])
+
+        assert [len(call.args[1]) for call in mock_create.call_args_list] == [
+            10,
+            10,
+            5,
+        ]
+        assert all(r["result"] == "created" for r in self._results(response))
+        assert len(session.exec(select(Transaction)).all()) == 25
+
+    def test_oversized_line_reported_as_invalid(self, client):
+        """Linha acima do tamanho máximo deve ser descartada e reportada"""
+        with patch("app.api.endpoints.transaction.settings.stream_max_line_bytes", 150):
+            response = self._post_lines(
+                client,
+                ['{"padding": "' + "x" * 300 + '"}', json.dumps(_batch_item())],
+            )
+
+        results = self._results(response)
+        assert [(r["index"], r["result"]) for r in results] == [
+            (1, "invalid"),
+            (2, "created"),
+        ]
+        assert "tamanho máximo" in results[0]["error"]
+
+    def test_rejects_other_content_types(self, client):
+        """Deve retornar 415 para corpo que não seja NDJSON"""
+        response = client.post("/transactions/stream", json=[_batch_item()])
+
+        assert response.status_code == 415
+
+
+class TestIdempotencyCache:
+    """Testes de integração do cache de idempotência"""
+
+    @staticmethod
+    def _count_statements(engine):
+        statements = []
+        listener = lambda *args: statements.append(args[2])  # noqa: E731
+        event.listen(engine.sync_engine, "before_cursor_execute", listener)
+        return statements, lambda: event.remove(
+            engine.sync_engine, "before_cursor_execute", listener
+        )
+
+    def test_new_id_skips_lookup(self, client, session_factory):
+        """Id certamente novo não deve consultar external_id antes do insert"""
+        statements, stop = self._count_statements(session_factory.kw["bind"])
+        try:
+            response = client.post("/transaction", json=_batch_item())
+        finally:
+            stop()
+
+        assert response.status_code == 201
+        assert not any(
+            "WHERE transactions.external_id" in statement for statement in statements
+        )
+
+    def test_recent_duplicate_served_from_cache(self, client, session_factory):
+        """Retentativa recente deve ser respondida sem ir ao banco"""
+        item = _batch_item()
+        first = client.post("/transaction", json=item)
+
+        statements, stop = self._count_statements(session_factory.kw["bind"])
+        try:
+            second = client.post("/transaction", json=item)
+        finally:
+            stop()
+
+        assert second.status_code == 200
+        assert second.json()["id"] == first.json()["id"]
+        assert statements == []
+
+    def test_unique_constraint_is_final_arbiter(self, client, session):
+        """Id existente que o cache não conhece deve retornar 200 pela constraint"""
+        transaction = Transaction(
+            external_id=uuid.uuid4(),
+            amount=100,
+            kind=KindEnum.CREDIT,
+            account_id="1",
+            status="completed",
+        )
+        session.add(transaction)
+        session.commit()
+
+        response = client.post(
+            "/transaction",
+            json=_batch_item(external_id=str(transaction.external_id)),
+        )
+        batch_response = client.post(
+            "/transactions/batch",
+            json={
+                "transactions": [
+                    _batch_item(external_id=str(transaction.external_id)),
+                    _batch_item(),
+                ]
+            },
+        )
+
+        assert response.status_code == 200
+        assert response.json() == {"id": transaction.id, "status": "completed"}
+        assert [item["result"] for item in batch_response.json()["results"]] == [
+            "existing",
+            "created",
+        ]
+        assert len(session.exec(select(Transaction)).all()) == 2
+
+
+class TestInsertFirstIdempotency:
+    """Testes do insert-or-get atômico pela constraint única"""
+
+    @staticmethod
+    def _transaction(external_id):
+        return Transaction(
+            external_id=external_id,
+            amount=100,
+            kind=KindEnum.CREDIT,
+            account_id="1",
+            status="pending",
+        )
+
+    @pytest.mark.asyncio
+    async def test_new_transaction_single_insert(self, async_session):
+        """Transação nova deve ser criada sem SELECT prévio por external_id"""
+        statements = []
+        engine = async_session.get_bind()
+        listener = lambda *args: statements.append(args[2])  # noqa: E731
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            transaction, created = await TransactionRepository(
+                async_session
+            ).create_or_get(self._transaction(uuid.uuid4()))
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+
+        assert created is True
+        assert transaction.id is not None
+        assert len(statements) == 2  # transação (ON CONFLICT RETURNING) + outbox
+        assert "ON CONFLICT" in statements[0]
+
+    @pytest.mark.asyncio
+    async def test_concurrent_duplicates_create_once(self, session, session_factory):
+        """Requisições concorrentes com o mesmo id devem criar uma única transação"""
+        external_id = uuid.uuid4()
+
+        async def create():
+            idempotency_cache.clear()
+            async with session_factory() as async_session:
+                return await TransactionRepository(async_session).create_or_get(
+                    self._transaction(external_id)
+                )
+
+        results = await asyncio.gather(*(create() for _ in range(5)))
+
+        assert sorted(created for _, created in results) == [
+            False,
+            False,
+            False,
+            False,
+            True,
+        ]
+        assert len({transaction.id for transaction, _ in results}) == 1
+        assert len(session.exec(select(OutboxMessage)).all()) == 1
+
+    def test_duplicate_unknown_to_cache_returns_200(self, client):
+        """Duplicata que o cache não conhece deve retornar 200, não 500"""
+        item = _batch_item()
+        first = client.post("/transaction", json=item)
+        idempotency_cache.clear()
+
+        second = client.post("/transaction", json=item)
+
+        assert second.status_code == 200
+        assert second.json()["id"] == first.json()["id"]
+
+    def test_invalid_amount_returns_row_unknown_to_cache(self, client, session):
+        """Valor inválido com id gravado por outro processo deve retornar a existente"""
+        existing = Transaction(
+            external_id=uuid.uuid4(),
+            amount=100,
+            kind=KindEnum.CREDIT,
+            account_id="1",
+            status="completed",
+        )
+        session.add(existing)
+        session.commit()
+        session.refresh(existing)
+
+        response = client.post(
+            "/transaction",
+            json=_batch_item(external_id=str(existing.external_id), amount=0),
+        )
+
+        assert response.status_code == 200
+        assert response.json()["id"] == existing.id
+        assert response.json()["status"] == "completed"
+
+    def test_batch_invalid_amount_returns_row_unknown_to_cache(self, client, session):
+        """No lote, valor inválido com id já gravado deve ser existing, não invalid"""
+        existing = Transaction(
+            external_id=uuid.uuid4(),
+            amount=100,
+            kind=KindEnum.CREDIT,
+            account_id="1",
+            status="completed",
+        )
+        session.add(existing)
+        session.commit()
+        session.refresh(existing)
+
+        response = client.post(
+            "/transactions/batch",
+            json={
+                "transactions": [
+                    _batch_item(external_id=str(existing.external_id), amount=-1)
+                ]
+            },
+        )
+
+        [result] = response.json()["results"]
+        assert result["result"] == "existing"
+        assert result["id"] == existing.id
+
+
+class TestStatusCompareAndSet:
+    """Testes do caminho de escrita do worker (UPDATE ... RETURNING)"""
+
+    @pytest.fixture
+    async def pending(self, async_session):
+        transaction, _ = await TransactionRepository(async_session).create_or_get(
+            Transaction(
+                external_id=uuid.uuid4(),
+                amount=100,
+                kind=KindEnum.CREDIT,
+                account_id="cas-1",
+                status="pending",
+            )
+        )
+        return transaction
+
+    @pytest.mark.asyncio
+    async def test_process_without_selects(self, async_session, pending):
+        """Processar uma mensagem deve usar só os UPDATEs, sem SELECT nem refresh"""
+        statements = []
+        engine = async_session.get_bind()
+        listener = lambda *args: statements.append(args[2])  # noqa: E731
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            with patch(
+                "app.services.transaction_service.bank_partner_request",
+                new_callable=AsyncMock,
+                return_value="partner-1",
+            ):
+                await TransactionService(
+                    TransactionRepository(async_session)
+                ).process_transaction(pending.id)
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+
+        # claim + conclusão da transação, mais o upsert do saldo
+        assert len(statements) == 3
+        assert statements[0].startswith("UPDATE transactions")
+        assert statements[1].startswith("UPDATE transactions")
+        assert not any(s.startswith("SELECT") for s in statements)
+
+        stored = await TransactionRepository(async_session).get_by_id(pending.id)
+        assert stored.status == "completed"
+        assert stored.partner_id == "partner-1"
+
+    @pytest.mark.asyncio
+    async def test_update_status_requires_expected_status(self, async_session, pending):
+        """O UPDATE só deve valer se o status atual for o esperado"""
+        repository = TransactionRepository(async_session)
+
+        assert (
+            await repository.update_status(pending.id, "processing", "failed") is None
+        )
+
+        updated = await repository.update_status(pending.id, "pending", "processing")
+        assert updated.status == "processing"
+
+    @pytest.mark.asyncio
+    async def test_complete_ignores_transaction_not_processing(
+        self, async_session, pending
+    ):
+        """Concluir transação fora de processing não deve alterar o saldo"""
+        repository = TransactionRepository(async_session)
+        pending.status = "completed"
+
+        assert await repository.complete(pending) is None
+        assert await repository.get_balance("cas-1") == 0
+
+
+class TestClaim:
+    """Testes do claim atômico de transações pelo worker"""
+
+    @pytest.fixture
+    async def pending(self, async_session):
+        transaction, _ = await TransactionRepository(async_session).create_or_get(
+            Transaction(
+                external_id=uuid.uuid4(),
+                amount=100,
+                kind=KindEnum.CREDIT,
+                account_id="claim-1",
+                status="pending",
+            )
+        )
+        return transaction
+
+    @pytest.mark.asyncio
+    async def test_concurrent_claims_single_winner(self, session_factory, pending):
+        """Workers concorrentes devem resultar em um único claim"""
+
+        async def claim(worker):
+            async with session_factory() as async_session:
+                return await TransactionRepository(async_session).claim(
+                    pending.id, worker, lease_s=60
+                )
+
+        results = await asyncio.gather(*(claim(f"worker-{i}") for i in range(5)))
+
+        winners = [result for result in results if result is not None]
+        assert len(winners) == 1
+        assert winners[0].status == "processing"
+        assert winners[0].claimed_at is not None
+
+    @pytest.mark.asyncio
+    async def test_stale_claim_is_reclaimed(self, async_session, pending):
+        """Claim com lease vencido deve poder ser reivindicado por outro worker"""
+        repository = TransactionRepository(async_session)
+        assert await repository.claim(pending.id, "worker-1", lease_s=60)
+
+        assert await repository.claim(pending.id, "worker-2", lease_s=60) is None
+        reclaimed = await repository.claim(pending.id, "worker-2", lease_s=0)
+
+        assert reclaimed.claimed_by == "worker-2"
+
+    @pytest.mark.asyncio
+    async def test_lost_claim_does_not_complete(self, async_session, pending):
+        """Worker que perdeu o claim não deve concluir nem alterar o saldo"""
+        repository = TransactionRepository(async_session)
+        stale = await repository.claim(pending.id, "worker-1", lease_s=60)
+        await repository.claim(pending.id, "worker-2", lease_s=0)
+
+        stale.status = "completed"
+        assert await repository.complete(stale) is None
+        assert await repository.get_balance("claim-1") == 0
+
+    def test_duplicate_messages_call_partner_once(self, session, session_factory):
+        """Mensagens duplicadas processadas em paralelo devem chamar o parceiro uma vez"""
+        transaction = Transaction(
+            external_id=uuid.uuid4(),
+            amount=100,
+            kind=KindEnum.CREDIT,
+            account_id="claim-2",
+        )
+        session.add(transaction)
+        session.commit()
+
+        async def slow_partner(**kwargs):
+            await asyncio.sleep(0.05)
+            return "partner-1"
+
+        async def process():
+            async with session_factory() as async_session:
+                service = TransactionService(TransactionRepository(async_session))
+                await service.process_transaction(transaction.id)
+
+        async def run():
+            with patch(
+                "app.services.transaction_service.bank_partner_request",
+                side_effect=slow_partner,
+            ) as mock_bank:
+                results = await asyncio.gather(
+                    *(process() for _ in range(3)), return_exceptions=True
+                )
+            return mock_bank.call_count, results
+
+        calls, results = asyncio.run(run())
+
+        assert calls == 1
+        assert sum(isinstance(r, TransactionClaimedError) for r in results) == 2
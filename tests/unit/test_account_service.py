@@ -1,15 +1,19 @@
-from unittest.mock import MagicMock
+import uuid
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock
 
 import pytest
 
 from app.core.exceptions import AccountNotFoundError
+from app.models.transaction import KindEnum, Transaction
+from app.repositories.unknown_account_cache import unknown_account_cache
 from app.services.account_services import AccountService
 
 
 @pytest.fixture
 def mock_repository():
     """Mock do TransactionRepository"""
-    return MagicMock()
+    return AsyncMock()
 
 
 @pytest.fixture
@@ -21,56 +25,191 @@ def service(mock_repository):
 class TestGetBalance:
     """Testes unitários para get_balance"""
 
-    def test_returns_balance_when_account_exists(self, service, mock_repository):
+    @pytest.mark.asyncio
+    async def test_returns_balance_when_account_exists(self, service, mock_repository):
         """Deve retornar o saldo quando a conta existe"""
-        mock_repository.account_exists.return_value = True
         mock_repository.get_balance.return_value = 150.50
 
-        balance = service.get_balance("123")
+        balance = await service.get_balance("123")
 
         assert balance == 150.50
-        mock_repository.account_exists.assert_called_once_with("123")
         mock_repository.get_balance.assert_called_once_with("123")
 
-    def test_raises_error_when_account_not_found(self, service, mock_repository):
+    @pytest.mark.asyncio
+    async def test_raises_error_when_account_not_found(self, service, mock_repository):
         """Deve levantar AccountNotFoundError quando conta não existe"""
-        mock_repository.account_exists.return_value = False
+        mock_repository.get_balance.return_value = None
 
         with pytest.raises(AccountNotFoundError):
-            service.get_balance("nonexistent")
+            await service.get_balance("nonexistent")
 
-        mock_repository.account_exists.assert_called_once_with("nonexistent")
-        mock_repository.get_balance.assert_not_called()
+        mock_repository.get_balance.assert_called_once_with("nonexistent")
 
-    def test_returns_zero_balance(self, service, mock_repository):
+    @pytest.mark.asyncio
+    async def test_returns_zero_balance(self, service, mock_repository):
         """Deve retornar saldo zero quando conta existe sem transações"""
-        mock_repository.account_exists.return_value = True
         mock_repository.get_balance.return_value = 0.0
 
-        balance = service.get_balance("empty-account")
+        balance = await service.get_balance("empty-account")
 
         assert balance == 0.0
 
-    def test_returns_negative_balance(self, service, mock_repository):
+    @pytest.mark.asyncio
+    async def test_returns_negative_balance(self, service, mock_repository):
         """Deve retornar saldo negativo quando débitos excedem créditos"""
-        mock_repository.account_exists.return_value = True
         mock_repository.get_balance.return_value = -100.0
 
-        balance = service.get_balance("negative-account")
+        balance = await service.get_balance("negative-account")
 
         assert balance == -100.0
 
-    def test_calls_repository_with_correct_account_id(self, service, mock_repository):
+    @pytest.mark.asyncio
+    async def test_calls_repository_with_correct_account_id(
+        self, service, mock_repository
+    ):
         """Deve chamar repository com account_id correto"""
-        mock_repository.account_exists.return_value = True
         mock_repository.get_balance.return_value = 50.0
 
-        service.get_balance("my-account-id")
+        await service.get_balance("my-account-id")
 
-        mock_repository.account_exists.assert_called_once_with("my-account-id")
         mock_repository.get_balance.assert_called_once_with("my-account-id")
 
 
+class TestBalanceCache:
+    """Testes do cache de saldos no get_balance"""
+
+    @pytest.mark.asyncio
+    async def test_second_read_served_from_cache(self, service, mock_repository):
+        """Leituras repetidas da mesma conta devem ir ao banco uma única vez"""
+        mock_repository.get_balance.return_value = 75.0
+
+        assert await service.get_balance("hot") == 75.0
+        assert await service.get_balance("hot") == 75.0
+
+        mock_repository.get_balance.assert_called_once_with("hot")
+
+    @pytest.mark.asyncio
+    async def test_unknown_account_cached_negatively(self, service, mock_repository):
+        """Conta inexistente deve ir ao banco uma única vez dentro do TTL"""
+        mock_repository.get_balance.return_value = None
+
+        for _ in range(3):
+            with pytest.raises(AccountNotFoundError):
+                await service.get_balance("typo")
+
+        mock_repository.get_balance.assert_called_once_with("typo")
+
+    @pytest.mark.asyncio
+    async def test_unknown_account_invalidated_on_first_transaction(
+        self, service, mock_repository
+    ):
+        """Criar a primeira transação da conta deve descartar o cache negativo"""
+        mock_repository.get_balance.side_effect = [None, 0.0]
+        with pytest.raises(AccountNotFoundError):
+            await service.get_balance("new")
+
+        unknown_account_cache.discard("new")
+
+        assert await service.get_balance("new") == 0.0
+
+    @pytest.mark.asyncio
+    async def test_reconcile_clears_cache(self, service, mock_repository):
+        """Reconciliação deve descartar os saldos em cache"""
+        mock_repository.get_balance.side_effect = [10.0, 20.0]
+        mock_repository.rebuild_balances.return_value = ({"acc": 10.0}, {"acc": 20.0})
+        await service.get_balance("acc")
+
+        await service.reconcile_balances()
+
+        assert await service.get_balance("acc") == 20.0
+
+
+class TestReconcileBalances:
+    """Testes unitários para reconcile_balances"""
+
+    @pytest.mark.asyncio
+    async def test_reports_only_divergent_accounts(self, service, mock_repository):
+        """Deve reportar apenas contas com saldo divergente"""
+        mock_repository.rebuild_balances.return_value = (
+            {"a": 100.0, "b": 10.0},
+            {"a": 100.0, "c": 5.0},
+        )
+
+        drifts = await service.reconcile_balances()
+
+        assert [
+            (d.account_id, d.stored_balance, d.expected_balance) for d in drifts
+        ] == [
+            ("b", 10.0, 0.0),
+            ("c", 0.0, 5.0),
+        ]
+        mock_repository.rebuild_balances.assert_called_once_with()
+
+    @pytest.mark.asyncio
+    async def test_dry_run_does_not_rebuild(self, service, mock_repository):
+        """Não deve reescrever saldos em dry-run"""
+        mock_repository.get_balances.return_value = {"a": 1.0}
+        mock_repository.compute_balances.return_value = {"a": 2.0}
+
+        drifts = await service.reconcile_balances(dry_run=True)
+
+        assert len(drifts) == 1
+        mock_repository.rebuild_balances.assert_not_called()
+
+
+class TestListTransactions:
+    """Testes unitários para list_transactions"""
+
+    @staticmethod
+    def _transactions(ids):
+        return [
+            Transaction(
+                id=transaction_id,
+                external_id=uuid.uuid4(),
+                amount=10.0,
+                kind=KindEnum.CREDIT,
+                account_id="123",
+            )
+            for transaction_id in ids
+        ]
+
+    @pytest.mark.asyncio
+    async def test_returns_next_cursor_when_more_pages(self, service, mock_repository):
+        """Deve retornar o id do último item como cursor quando há mais itens"""
+        mock_repository.list_by_account.return_value = self._transactions([9, 8, 7])
+
+        transactions, next_cursor = await service.list_transactions("123", limit=2)
+
+        assert [t.id for t in transactions] == [9, 8]
+        assert next_cursor == 8
+        assert mock_repository.list_by_account.call_args.kwargs["limit"] == 3
+
+    @pytest.mark.asyncio
+    async def test_last_page_has_no_cursor(self, service, mock_repository):
+        """Última página não deve ter cursor"""
+        mock_repository.list_by_account.return_value = self._transactions([2, 1])
+
+        transactions, next_cursor = await service.list_transactions(
+            "123", limit=2, cursor=3
+        )
+
+        assert len(transactions) == 2
+        assert next_cursor is None
+        assert mock_repository.list_by_account.call_args.kwargs["before_id"] == 3
+
+    @pytest.mark.asyncio
+    async def test_converts_dates_to_utc(self, service, mock_repository):
+        """Datas com fuso devem ser convertidas para UTC"""
+        mock_repository.list_by_account.return_value = []
+        created_from = datetime(2026, 1, 1, tzinfo=timezone(timedelta(hours=-3)))
+
+        await service.list_transactions("123", limit=10, created_from=created_from)
+
+        assert mock_repository.list_by_account.call_args.kwargs[
+            "created_from"
+        ] == datetime(2026, 1, 1, 3, tzinfo=timezone.utc)
+
+
 class TestAccountServiceInit:
     """Testes de inicialização do service"""
 
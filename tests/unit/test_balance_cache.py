@@ -0,0 +1,185 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.repositories.balance_cache import (
+    InMemoryBalanceCache,
+    NullBalanceCache,
+    RedisBalanceCache,
+    warn_if_process_local,
+)
+from app.repositories.unknown_account_cache import UnknownAccountCache
+
+
+@pytest.fixture
+def cache():
+    return InMemoryBalanceCache(max_size=2, ttl_s=2.0)
+
+
+class TestInMemoryBalanceCache:
+    """Testes do cache de saldos em processo"""
+
+    @pytest.mark.asyncio
+    async def test_counts_hits_and_misses(self, cache):
+        """Deve contar hits e misses das leituras"""
+        assert await cache.get("a") is None
+        await cache.set("a", 10.0)
+        assert await cache.get("a") == 10.0
+
+        assert cache.stats() == {
+            "backend": "memory",
+            "hits": 1,
+            "misses": 1,
+            "hit_ratio": 0.5,
+        }
+
+    @pytest.mark.asyncio
+    async def test_zero_balance_is_a_hit(self, cache):
+        """Saldo zero deve ser servido pelo cache"""
+        await cache.set("a", 0.0)
+
+        assert await cache.get("a") == 0.0
+        assert cache.hits == 1
+
+    @pytest.mark.asyncio
+    async def test_invalidate_removes_entry(self, cache):
+        """Invalidação deve forçar a próxima leitura ao banco"""
+        await cache.set("a", 10.0)
+
+        await cache.invalidate("a")
+
+        assert await cache.get("a") is None
+
+    @pytest.mark.asyncio
+    async def test_expires_after_ttl(self, cache):
+        """Entradas devem expirar após o TTL"""
+        with patch("app.repositories.balance_cache.time.monotonic", return_value=0.0):
+            await cache.set("a", 10.0)
+
+        with patch("app.repositories.balance_cache.time.monotonic", return_value=3.0):
+            assert await cache.get("a") is None
+
+    @pytest.mark.asyncio
+    async def test_evicts_least_recently_used(self, cache):
+        """Deve descartar a conta menos usada ao exceder max_size"""
+        await cache.set("a", 1.0)
+        await cache.set("b", 2.0)
+        await cache.get("a")
+
+        await cache.set("c", 3.0)
+
+        assert await cache.get("b") is None
+        assert await cache.get("a") == 1.0
+
+
+class TestRedisBalanceCache:
+    """Testes do cache de saldos no Redis (cliente mockado)"""
+
+    @pytest.fixture
+    def client(self):
+        return AsyncMock()
+
+    @pytest.mark.asyncio
+    async def test_reads_and_writes_with_ttl(self, client):
+        """Deve gravar com TTL em ms e converter o valor lido"""
+        cache = RedisBalanceCache(url="", ttl_s=2.0, client=client)
+        client.get.return_value = b"12.5"
+
+        await cache.set("acc", 12.5)
+        balance = await cache.get("acc")
+
+        client.set.assert_called_once_with("balance:acc", "12.5", px=2000)
+        client.get.assert_called_once_with("balance:acc")
+        assert balance == 12.5
+
+    @pytest.mark.asyncio
+    async def test_invalidate_deletes_key(self, client):
+        """Invalidação deve apagar a chave da conta"""
+        cache = RedisBalanceCache(url="", ttl_s=2.0, client=client)
+
+        await cache.invalidate("acc")
+
+        client.delete.assert_called_once_with("balance:acc")
+
+    @pytest.mark.asyncio
+    async def test_redis_failure_is_a_miss(self, client):
+        """Falha do Redis deve ser tratada como miss, sem propagar"""
+        cache = RedisBalanceCache(url="", ttl_s=2.0, client=client)
+        client.get.side_effect = ConnectionError("down")
+
+        assert await cache.get("acc") is None
+        assert cache.misses == 1
+
+
+class TestProcessLocal:
+    """Testes da indicação de cache visível só ao próprio processo"""
+
+    def test_only_memory_backend_is_process_local(self, cache):
+        """Só o cache em memória não é compartilhado entre API e worker"""
+        assert cache.process_local
+        assert not RedisBalanceCache(
+            url="", ttl_s=2.0, client=AsyncMock()
+        ).process_local
+        assert not NullBalanceCache().process_local
+
+    @pytest.mark.parametrize(
+        "cache,warns",
+        [
+            (InMemoryBalanceCache(max_size=2, ttl_s=2.0), True),
+            (NullBalanceCache(), False),
+        ],
+    )
+    def test_warns_only_for_process_local_cache(self, cache, warns):
+        """O aviso de startup só deve sair com o cache por processo"""
+        with (
+            patch("app.repositories.balance_cache.balance_cache", cache),
+            patch("app.repositories.balance_cache.logger") as mock_logger,
+        ):
+            warn_if_process_local("worker")
+
+        assert mock_logger.warning.called is warns
+
+
+class TestNullBalanceCache:
+    """Testes do cache desabilitado"""
+
+    @pytest.mark.asyncio
+    async def test_never_hits(self):
+        """Cache desabilitado nunca deve retornar saldo"""
+        cache = NullBalanceCache()
+        await cache.set("a", 1.0)
+
+        assert await cache.get("a") is None
+
+
+class TestUnknownAccountCache:
+    """Testes do cache negativo de contas"""
+
+    def test_expires_after_ttl(self):
+        """Conta desconhecida deve sair do cache após o TTL"""
+        cache = UnknownAccountCache(max_size=10, ttl_s=2.0)
+        with patch(
+            "app.repositories.unknown_account_cache.time.monotonic", return_value=0.0
+        ):
+            cache.add("a")
+            assert cache.contains("a") is True
+
+        with patch(
+            "app.repositories.unknown_account_cache.time.monotonic", return_value=3.0
+        ):
+            assert cache.contains("a") is False
+
+    def test_bounded_size(self):
+        """Deve manter no máximo max_size contas, descartando as mais antigas"""
+        cache = UnknownAccountCache(max_size=2, ttl_s=2.0)
+        for account_id in ["a", "b", "c"]:
+            cache.add(account_id)
+
+        assert [cache.contains(a) for a in ["a", "b", "c"]] == [False, True, True]
+
+    def test_zero_size_disables(self):
+        """max_size 0 deve desabilitar o cache negativo"""
+        cache = UnknownAccountCache(max_size=0, ttl_s=2.0)
+        cache.add("a")
+
+        assert cache.contains("a") is False
@@ -0,0 +1,158 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from app.core.exceptions import CircuitOpenError
+from app.integrations.bank_partner import (
+    CircuitBreaker,
+    CircuitState,
+    ConcurrencyLimiter,
+)
+
+
+@pytest.fixture
+def breaker():
+    """Circuit breaker com limites pequenos para testes"""
+    return CircuitBreaker(
+        window_s=60,
+        min_calls=4,
+        error_threshold=0.5,
+        slow_call_s=1.0,
+        slow_call_threshold=0.5,
+        open_s=10,
+        half_open_calls=2,
+    )
+
+
+@pytest.fixture
+def limiter(breaker):
+    """Limitador AIMD com limites pequenos para testes"""
+    return ConcurrencyLimiter(
+        breaker,
+        initial=2,
+        minimum=1,
+        maximum=4,
+        backoff=0.5,
+        error_threshold=0.4,
+    )
+
+
+def open_circuit(breaker):
+    for _ in range(breaker.min_calls):
+        breaker.before_call()
+        breaker.record(False, 0.1)
+
+
+class TestCircuitBreaker:
+    """Testes unitários do circuit breaker do banco parceiro"""
+
+    def test_stays_closed_below_min_calls(self, breaker):
+        """Não deve abrir antes de atingir o mínimo de chamadas"""
+        for _ in range(3):
+            breaker.record(False, 0.1)
+
+        assert breaker.state == CircuitState.CLOSED
+
+    def test_opens_on_error_rate(self, breaker):
+        """Deve abrir quando a taxa de erro atinge o limite"""
+        for success in (True, True, False, False):
+            breaker.record(success, 0.1)
+
+        assert breaker.state == CircuitState.OPEN
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+    def test_opens_on_slow_call_rate(self, breaker):
+        """Deve abrir quando a taxa de chamadas lentas atinge o limite"""
+        for latency in (0.1, 0.1, 2.0, 2.0):
+            breaker.record(True, latency)
+
+        assert breaker.state == CircuitState.OPEN
+
+    def test_half_open_closes_after_successful_probes(self, breaker):
+        """Deve fechar após chamadas de teste bem-sucedidas no estado meio-aberto"""
+        open_circuit(breaker)
+
+        with patch("app.integrations.bank_partner.time.monotonic", return_value=1e9):
+            breaker.before_call()
+            assert breaker.state == CircuitState.HALF_OPEN
+            breaker.before_call()
+
+            # Limite de chamadas de teste atingido
+            with pytest.raises(CircuitOpenError):
+                breaker.before_call()
+
+            breaker.record(True, 0.1)
+            breaker.record(True, 0.1)
+
+        assert breaker.state == CircuitState.CLOSED
+
+    def test_half_open_reopens_on_failure(self, breaker):
+        """Deve reabrir se uma chamada de teste falhar"""
+        open_circuit(breaker)
+
+        with patch("app.integrations.bank_partner.time.monotonic", return_value=1e9):
+            breaker.before_call()
+            breaker.record(False, 0.1)
+
+        assert breaker.state == CircuitState.OPEN
+
+
+class TestConcurrencyLimiter:
+    """Testes unitários do limitador AIMD"""
+
+    def test_increases_additively_on_success(self, limiter):
+        """Deve aumentar o limite em 1/limite a cada sucesso"""
+        limiter.record(True, 0.1)
+
+        assert limiter.limit == 2.5
+
+    def test_does_not_exceed_maximum(self, limiter):
+        """Não deve passar do limite máximo"""
+        for _ in range(100):
+            limiter.record(True, 0.1)
+
+        assert limiter.limit == 4
+
+    def test_decreases_multiplicatively_on_slow_call(self, limiter):
+        """Deve reduzir o limite pela metade em chamada lenta, uma vez por janela"""
+        limiter.limit = 4.0
+
+        limiter.record(True, 2.0)
+        limiter.record(True, 2.0)
+
+        assert limiter.limit == 2.0
+
+    def test_ignores_failures_below_error_threshold(self, limiter, breaker):
+        """Falhas isoladas não devem reduzir o limite"""
+        for success in (True, True, True, False):
+            breaker.record(success, 0.1)
+
+        limiter.record(False, 0.1)
+
+        assert limiter.limit == 2.0
+
+    @pytest.mark.asyncio
+    async def test_acquire_waits_for_release(self, limiter):
+        """acquire deve aguardar quando o limite de concorrência foi atingido"""
+        await limiter.acquire()
+        await limiter.acquire()
+
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+
+        limiter.release()
+        await asyncio.wait_for(waiter, timeout=1)
+        assert limiter.in_flight == 2
+
+    @pytest.mark.asyncio
+    async def test_acquire_waits_while_circuit_open(self, limiter, breaker):
+        """acquire deve aguardar enquanto o circuito está aberto"""
+        open_circuit(breaker)
+        breaker.open_s = 0.05
+
+        await asyncio.wait_for(limiter.acquire(), timeout=1)
+
+        assert limiter.in_flight == 1
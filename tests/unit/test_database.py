@@ -0,0 +1,53 @@
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.database import configure_sqlite, engine_options, sqlite_pragmas
+
+
+class TestEngineOptions:
+    """Testes das opções do pool de conexões"""
+
+    def test_sqlite_uses_driver_defaults(self):
+        """SQLite não deve receber opções de pool"""
+        assert engine_options("sqlite+aiosqlite:///./data/database.db") == {}
+
+    def test_postgres_pool_from_settings(self):
+        """PostgreSQL deve usar o pool configurado em Settings"""
+        with (
+            patch("app.core.database.settings.db_pool_size", 5),
+            patch("app.core.database.settings.db_max_overflow", 2),
+        ):
+            options = engine_options("postgresql+asyncpg://user@db/transactions")
+
+        assert options["pool_size"] == 5
+        assert options["max_overflow"] == 2
+        assert options["pool_pre_ping"] is True
+        assert options["pool_recycle"] == 1800
+
+
+class TestSqlitePragmas:
+    """Testes do modo de desempenho do SQLite"""
+
+    def test_disabled_returns_no_pragmas(self):
+        """Com o modo desligado o SQLite usa os PRAGMAs padrão"""
+        with patch("app.core.database.settings.sqlite_tuning_enabled", False):
+            assert sqlite_pragmas() == []
+
+    @pytest.mark.asyncio
+    async def test_pragmas_applied_on_connect(self, tmp_path):
+        """Cada nova conexão deve receber os PRAGMAs configurados"""
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+        configure_sqlite(engine, sqlite_pragmas())
+
+        async with engine.connect() as connection:
+            journal_mode = await connection.scalar(text("PRAGMA journal_mode"))
+            synchronous = await connection.scalar(text("PRAGMA synchronous"))
+            busy_timeout = await connection.scalar(text("PRAGMA busy_timeout"))
+        await engine.dispose()
+
+        assert journal_mode == "wal"
+        assert synchronous == 1  # NORMAL
+        assert busy_timeout == 5000
@@ -0,0 +1,131 @@
+import uuid
+from unittest.mock import patch
+
+import pytest
+
+from app.models.transaction import KindEnum, Transaction
+from app.repositories.idempotency_cache import BloomFilter, IdempotencyCache
+
+
+def _transaction(**overrides):
+    values = {
+        "id": 1,
+        "external_id": uuid.uuid4(),
+        "amount": 100.0,
+        "kind": KindEnum.CREDIT,
+        "account_id": "123",
+        "status": "pending",
+    }
+    values.update(overrides)
+    return Transaction(**values)
+
+
+@pytest.fixture
+def cache():
+    return IdempotencyCache(
+        enabled=True,
+        bloom_capacity=1000,
+        bloom_error_rate=0.01,
+        lru_size=2,
+        lru_ttl_s=5.0,
+    )
+
+
+class TestBloomFilter:
+    """Testes do bloom filter de external_id"""
+
+    def test_added_ids_always_found(self):
+        """Ids adicionados nunca devem ser reportados como ausentes"""
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        ids = [uuid.uuid4() for _ in range(1000)]
+        for external_id in ids:
+            bloom.add(external_id)
+
+        assert all(bloom.might_contain(external_id) for external_id in ids)
+
+    def test_false_positive_rate_near_configured(self):
+        """Taxa de falso positivo deve ficar próxima da configurada"""
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for _ in range(1000):
+            bloom.add(uuid.uuid4())
+
+        false_positives = sum(bloom.might_contain(uuid.uuid4()) for _ in range(10000))
+
+        assert false_positives / 10000 < 0.03
+
+
+class TestIdempotencyCache:
+    """Testes do cache de idempotência"""
+
+    def test_unknown_id_certainly_new(self, cache):
+        """Id nunca visto não deve existir nem estar no LRU"""
+        external_id = uuid.uuid4()
+
+        assert cache.might_exist(external_id) is False
+        assert cache.get(external_id) is None
+
+    def test_remember_returns_detached_copy(self, cache):
+        """Transação lembrada deve ser devolvida como cópia com id e status"""
+        transaction = _transaction()
+
+        cache.remember(transaction)
+        cached = cache.get(transaction.external_id)
+
+        assert cache.might_exist(transaction.external_id) is True
+        assert cached is not transaction
+        assert (cached.id, cached.status) == (1, "pending")
+
+    def test_lru_evicts_least_recent(self, cache):
+        """LRU deve descartar a entrada menos usada, mantendo o bloom filter"""
+        first, second, third = _transaction(), _transaction(), _transaction()
+        cache.remember(first)
+        cache.remember(second)
+        cache.get(first.external_id)
+
+        cache.remember(third)
+
+        assert cache.get(second.external_id) is None
+        assert cache.get(first.external_id) is not None
+        assert cache.might_exist(second.external_id) is True
+
+    def test_expired_entry_not_returned(self, cache):
+        """Entradas do LRU devem expirar após o TTL"""
+        transaction = _transaction()
+        with patch(
+            "app.repositories.idempotency_cache.time.monotonic", return_value=0.0
+        ):
+            cache.remember(transaction)
+
+        with patch(
+            "app.repositories.idempotency_cache.time.monotonic", return_value=6.0
+        ):
+            assert cache.get(transaction.external_id) is None
+
+    def test_disabled_cache_always_queries(self):
+        """Cache desabilitado não deve pular consultas nem guardar transações"""
+        cache = IdempotencyCache(
+            enabled=False,
+            bloom_capacity=1000,
+            bloom_error_rate=0.01,
+            lru_size=10,
+            lru_ttl_s=5.0,
+        )
+        transaction = _transaction()
+
+        cache.remember(transaction)
+
+        assert cache.might_exist(uuid.uuid4()) is True
+        assert cache.get(transaction.external_id) is None
+
+    @pytest.mark.asyncio
+    async def test_warm_up_loads_existing_ids(self, cache):
+        """Warm up deve carregar os external_id persistidos no bloom filter"""
+        ids = [uuid.uuid4() for _ in range(10)]
+
+        async def external_ids():
+            for external_id in ids:
+                yield external_id
+
+        await cache.warm_up(external_ids())
+
+        assert all(cache.might_exist(external_id) for external_id in ids)
@@ -0,0 +1,251 @@
+import asyncio
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.core.config import settings
+from app.messaging.channel_pool import ChannelPool
+from app.messaging.publisher import (
+    RabbitMQPublisher,
+    declare_queues,
+    publish_many,
+    publish_to_retry,
+    retry_queue_name,
+)
+
+
+@pytest.fixture
+def mock_channel():
+    """Mock do canal RabbitMQ usado pelo publisher"""
+    channel = MagicMock()
+    channel.declare_queue = AsyncMock()
+    channel.default_exchange.publish = AsyncMock()
+
+    @asynccontextmanager
+    async def borrow_channel():
+        yield channel
+
+    with patch(
+        "app.messaging.publisher.RabbitMQPublisher.channel",
+        side_effect=borrow_channel,
+    ):
+        yield channel
+
+
+class TestRetryTiers:
+    """Testes unitários dos tiers de backoff de retry"""
+
+    @pytest.mark.parametrize(
+        "delay_ms,name",
+        [
+            (1000, "transactions.retry.1s"),
+            (30000, "transactions.retry.30s"),
+            (120000, "transactions.retry.2m"),
+            (500, "transactions.retry.500ms"),
+        ],
+    )
+    def test_retry_queue_name(self, delay_ms, name):
+        """Deve nomear a fila de retry a partir do atraso do tier"""
+        assert retry_queue_name(delay_ms) == name
+
+    @pytest.mark.asyncio
+    async def test_declares_one_retry_queue_per_tier(self, mock_channel):
+        """Deve declarar uma fila de retry por tier, com DLX para a fila principal"""
+        with patch.object(settings, "retry_tiers_ms", [1000, 5000]):
+            await declare_queues(mock_channel)
+
+        declared = {
+            call.args[0]: call.kwargs.get("arguments")
+            for call in mock_channel.declare_queue.call_args_list
+        }
+        assert set(declared) == {
+            "transactions.retry.1s",
+            "transactions.retry.5s",
+            "transactions",
+            "transactions.dlq",
+        }
+        assert declared["transactions.retry.5s"]["x-dead-letter-routing-key"] == (
+            "transactions"
+        )
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "retry_count,queue",
+        [
+            (1, "transactions.retry.1s"),
+            (2, "transactions.retry.5s"),
+            (3, "transactions.retry.30s"),
+            (7, "transactions.retry.30s"),
+        ],
+    )
+    async def test_publishes_to_tier_by_retry_count(
+        self, mock_channel, retry_count, queue
+    ):
+        """Deve escolher o tier pela tentativa, usando o último para as excedentes"""
+        with patch.object(settings, "retry_tiers_ms", [1000, 5000, 30000]):
+            await publish_to_retry(42, retry_count)
+
+        publish_call = mock_channel.default_exchange.publish.call_args
+        assert publish_call.kwargs["routing_key"] == queue
+        message = publish_call.args[0]
+        assert message.headers["x-retry-count"] == retry_count
+
+    @pytest.mark.asyncio
+    async def test_applies_jitter_to_expiration(self, mock_channel):
+        """Deve aplicar jitter no atraso da mensagem dentro do limite configurado"""
+        with (
+            patch.object(settings, "retry_tiers_ms", [10000]),
+            patch.object(settings, "retry_jitter", 0.2),
+            patch("app.messaging.publisher.random.uniform", return_value=0.2),
+        ):
+            await publish_to_retry(42, 1)
+
+        message = mock_channel.default_exchange.publish.call_args.args[0]
+        assert message.expiration == 12
+
+
+class TestPublishMany:
+    """Testes unitários da publicação em lote"""
+
+    @pytest.mark.asyncio
+    async def test_publishes_all_messages(self, mock_channel):
+        """Deve publicar uma mensagem por transação na fila principal"""
+        failed = await publish_many([1, 2, 3])
+
+        assert failed == []
+        assert mock_channel.default_exchange.publish.call_count == 3
+        routing_keys = {
+            call.kwargs["routing_key"]
+            for call in mock_channel.default_exchange.publish.call_args_list
+        }
+        assert routing_keys == {"transactions"}
+
+    @pytest.mark.asyncio
+    async def test_pipelines_publishes_within_outstanding_limit(self, mock_channel):
+        """Deve manter várias publicações aguardando confirmação ao mesmo tempo"""
+        outstanding = 0
+        max_outstanding = 0
+
+        async def publish(message, routing_key):
+            nonlocal outstanding, max_outstanding
+            outstanding += 1
+            max_outstanding = max(max_outstanding, outstanding)
+            await asyncio.sleep(0.01)
+            outstanding -= 1
+
+        mock_channel.default_exchange.publish.side_effect = publish
+
+        with patch.object(settings, "publisher_max_outstanding", 4):
+            await publish_many(list(range(10)))
+
+        assert max_outstanding == 4
+
+    @pytest.mark.asyncio
+    async def test_returns_unconfirmed_ids(self, mock_channel):
+        """Deve retornar as transações cuja publicação não foi confirmada"""
+        mock_channel.default_exchange.publish.side_effect = [
+            None,
+            Exception("nack"),
+            None,
+        ]
+
+        failed = await publish_many([1, 2, 3])
+
+        assert failed == [2]
+
+
+class TestChannelPool:
+    """Testes unitários do pool de canais"""
+
+    def make_channel(self):
+        channel = MagicMock()
+        channel.is_closed = False
+        channel.close = AsyncMock()
+        return channel
+
+    @pytest.mark.asyncio
+    async def test_reuses_released_channel(self):
+        """Deve reutilizar o canal devolvido ao pool"""
+        factory = AsyncMock(side_effect=lambda: self.make_channel())
+        pool = ChannelPool(factory, max_size=2)
+
+        async with pool.acquire() as first:
+            pass
+        async with pool.acquire() as second:
+            pass
+
+        assert first is second
+        factory.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_discards_closed_channel(self):
+        """Deve descartar canal fechado e abrir um novo"""
+        factory = AsyncMock(side_effect=lambda: self.make_channel())
+        pool = ChannelPool(factory, max_size=2)
+
+        async with pool.acquire() as first:
+            pass
+        first.is_closed = True
+
+        async with pool.acquire() as second:
+            pass
+
+        assert second is not first
+        assert factory.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_bounds_channels_in_use(self):
+        """Não deve emprestar mais canais do que o tamanho do pool"""
+        factory = AsyncMock(side_effect=lambda: self.make_channel())
+        pool = ChannelPool(factory, max_size=2)
+        in_use = 0
+        max_in_use = 0
+
+        async def borrow():
+            nonlocal in_use, max_in_use
+            async with pool.acquire():
+                in_use += 1
+                max_in_use = max(max_in_use, in_use)
+                await asyncio.sleep(0.01)
+                in_use -= 1
+
+        await asyncio.gather(*(borrow() for _ in range(6)))
+
+        assert max_in_use == 2
+        assert factory.call_count == 2
+
+
+class TestRabbitMQPublisher:
+    """Testes da conexão do publisher"""
+
+    @pytest.mark.asyncio
+    async def test_declares_queues_once_per_connection(self):
+        """Deve declarar as filas uma única vez por conexão"""
+        connection = MagicMock()
+        connection.is_closed = False
+        connection.close = AsyncMock()
+        connection.channel = AsyncMock(
+            side_effect=lambda **kwargs: TestChannelPool().make_channel()
+        )
+
+        with (
+            patch(
+                "app.messaging.publisher.aio_pika.connect_robust",
+                new_callable=AsyncMock,
+                return_value=connection,
+            ),
+            patch(
+                "app.messaging.publisher.declare_queues", new_callable=AsyncMock
+            ) as mock_declare,
+        ):
+            try:
+                async with RabbitMQPublisher.channel():
+                    async with RabbitMQPublisher.channel():
+                        pass
+                async with RabbitMQPublisher.channel():
+                    pass
+            finally:
+                await RabbitMQPublisher.close()
+
+        mock_declare.assert_called_once()
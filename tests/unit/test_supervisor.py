@@ -0,0 +1,64 @@
+import os
+import signal
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app.supervisor import run_supervisor
+
+
+def crashing_worker():
+    """Worker que cai logo após iniciar"""
+    raise SystemExit(1)
+
+
+def long_running_worker():
+    """Worker que só termina ao receber SIGTERM"""
+    time.sleep(60)
+
+
+@pytest.fixture
+def restore_signals():
+    handlers = {sig: signal.getsignal(sig) for sig in (signal.SIGTERM, signal.SIGINT)}
+    yield
+    for sig, handler in handlers.items():
+        signal.signal(sig, handler)
+
+
+def send_sigterm_after(seconds):
+    timer = threading.Timer(seconds, os.kill, args=(os.getpid(), signal.SIGTERM))
+    timer.start()
+    return timer
+
+
+class TestRunSupervisor:
+    """Testes do supervisor de processos do worker"""
+
+    def test_restarts_crashed_children(self, restore_signals):
+        """Deve reiniciar processos filhos que terminam inesperadamente"""
+        with (
+            patch("app.supervisor.POLL_INTERVAL_S", 0.05),
+            patch("app.supervisor.RESTART_BACKOFF_S", 0.1),
+            patch("app.supervisor.logger") as mock_logger,
+        ):
+            send_sigterm_after(2)
+            run_supervisor(crashing_worker, processes=1, shutdown_timeout=5)
+
+        started = [
+            call
+            for call in mock_logger.info.call_args_list
+            if "iniciado" in call.args[0]
+        ]
+        assert len(started) >= 2
+
+    def test_forwards_sigterm_to_children(self, restore_signals):
+        """Deve repassar SIGTERM aos filhos e aguardar seu encerramento"""
+        with patch("app.supervisor.POLL_INTERVAL_S", 0.05):
+            send_sigterm_after(1.5)
+            start = time.monotonic()
+            run_supervisor(long_running_worker, processes=2, shutdown_timeout=10)
+
+        # Filhos morrem pelo SIGTERM, sem esperar o shutdown_timeout
+        assert time.monotonic() - start < 8
@@ -1,9 +1,15 @@
 import uuid
-from unittest.mock import AsyncMock, MagicMock, patch
+from unittest.mock import AsyncMock, patch
 
 import pytest
 
-from app.core.exceptions import BankPartnerError, InvalidTransactionAmountError
+from app.core.config import settings
+from app.core.exceptions import (
+    BankPartnerError,
+    InvalidTransactionAmountError,
+    TransactionClaimedError,
+)
+from app.integrations.bank_partner import PartnerResult
 from app.models.transaction import KindEnum, Transaction
 from app.services.transaction_service import TransactionService
 
@@ -11,7 +17,7 @@ from app.services.transaction_service import TransactionService
 @pytest.fixture
 def mock_repository():
     """Mock do TransactionRepository"""
-    return MagicMock()
+    return AsyncMock()
 
 
 @pytest.fixture
@@ -41,6 +47,7 @@ def pending_transaction():
         kind=KindEnum.CREDIT,
         account_id="123",
         status="pending",
+        claimed_by="worker-1",
     )
 
 
@@ -60,13 +67,25 @@ class TestCreateTransaction:
             account_id="123",
             status="completed",
         )
-        mock_repository.get_by_external_id.return_value = existing
+        mock_repository.create_or_get.return_value = (existing, False)
 
         result, created = await service.create_transaction(sample_transaction)
 
         assert result == existing
         assert created is False
-        mock_repository.create.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_does_not_select_before_insert(
+        self, service, mock_repository, sample_transaction
+    ):
+        """Não deve buscar por external_id antes do insert (insert-first)"""
+        mock_repository.create_or_get.return_value = (sample_transaction, True)
+
+        with patch("app.services.transaction_service.outbox_relay"):
+            await service.create_transaction(sample_transaction)
+
+        mock_repository.get_by_external_id.assert_not_called()
+        mock_repository.create_or_get.assert_called_once_with(sample_transaction)
 
     @pytest.mark.asyncio
     async def test_raises_error_for_zero_amount(
@@ -79,7 +98,7 @@ class TestCreateTransaction:
         with pytest.raises(InvalidTransactionAmountError):
             await service.create_transaction(sample_transaction)
 
-        mock_repository.create.assert_not_called()
+        mock_repository.create_or_get.assert_not_called()
 
     @pytest.mark.asyncio
     async def test_raises_error_for_negative_amount(
@@ -92,15 +111,37 @@ class TestCreateTransaction:
         with pytest.raises(InvalidTransactionAmountError):
             await service.create_transaction(sample_transaction)
 
-        mock_repository.create.assert_not_called()
+        mock_repository.create_or_get.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_invalid_amount_returns_existing_if_duplicate(
+        self, service, mock_repository, sample_transaction
+    ):
+        """Transação existente deve ter precedência sobre a validação do valor"""
+        existing = Transaction(
+            id=1,
+            external_id=sample_transaction.external_id,
+            amount=100.0,
+            kind=KindEnum.CREDIT,
+            account_id="123",
+            status="completed",
+        )
+        mock_repository.get_by_external_id.return_value = existing
+        sample_transaction.amount = 0
+
+        result, created = await service.create_transaction(sample_transaction)
+
+        assert (result, created) == (existing, False)
+        mock_repository.create_or_get.assert_not_called()
+        mock_repository.get_by_external_id.assert_called_once_with(
+            sample_transaction.external_id, use_bloom=False
+        )
 
     @pytest.mark.asyncio
     async def test_creates_transaction_with_pending_status(
         self, service, mock_repository, sample_transaction
     ):
         """Deve criar transação com status pending"""
-        mock_repository.get_by_external_id.return_value = None
-
         created_transaction = Transaction(
             id=1,
             external_id=sample_transaction.external_id,
@@ -109,25 +150,21 @@ class TestCreateTransaction:
             account_id=sample_transaction.account_id,
             status="pending",
         )
-        mock_repository.create.return_value = created_transaction
+        mock_repository.create_or_get.return_value = (created_transaction, True)
 
-        with patch(
-            "app.services.transaction_service.publish_transaction",
-            new_callable=AsyncMock,
-        ):
+        with patch("app.services.transaction_service.outbox_relay"):
             result, created = await service.create_transaction(sample_transaction)
 
         assert result.status == "pending"
         assert created is True
-        mock_repository.create.assert_called_once()
+        assert sample_transaction.status == "pending"
+        mock_repository.create_or_get.assert_called_once()
 
     @pytest.mark.asyncio
-    async def test_publishes_transaction_to_queue(
+    async def test_notifies_outbox_relay_after_create(
         self, service, mock_repository, sample_transaction
     ):
-        """Deve publicar transação na fila após criar"""
-        mock_repository.get_by_external_id.return_value = None
-
+        """Deve acordar o relay do outbox após criar, sem publicar inline"""
         created_transaction = Transaction(
             id=42,
             external_id=sample_transaction.external_id,
@@ -136,21 +173,19 @@ class TestCreateTransaction:
             account_id=sample_transaction.account_id,
             status="pending",
         )
-        mock_repository.create.return_value = created_transaction
+        mock_repository.create_or_get.return_value = (created_transaction, True)
 
-        with patch(
-            "app.services.transaction_service.publish_transaction",
-            new_callable=AsyncMock,
-        ) as mock_publish:
+        with patch("app.services.transaction_service.outbox_relay") as mock_relay:
             await service.create_transaction(sample_transaction)
 
-            mock_publish.assert_called_once_with(42)
+            mock_repository.create_or_get.assert_called_once_with(sample_transaction)
+            mock_relay.notify.assert_called_once()
 
     @pytest.mark.asyncio
-    async def test_does_not_publish_for_duplicate(
+    async def test_does_not_notify_relay_for_duplicate(
         self, service, mock_repository, sample_transaction
     ):
-        """Não deve publicar para transação duplicada"""
+        """Não deve registrar outbox para transação duplicada"""
         existing = Transaction(
             id=1,
             external_id=sample_transaction.external_id,
@@ -159,15 +194,106 @@ class TestCreateTransaction:
             account_id="123",
             status="completed",
         )
-        mock_repository.get_by_external_id.return_value = existing
+        mock_repository.create_or_get.return_value = (existing, False)
 
-        with patch(
-            "app.services.transaction_service.publish_transaction",
-            new_callable=AsyncMock,
-        ) as mock_publish:
+        with patch("app.services.transaction_service.outbox_relay") as mock_relay:
             await service.create_transaction(sample_transaction)
 
-            mock_publish.assert_not_called()
+            mock_relay.notify.assert_not_called()
+
+
+class TestCreateTransactions:
+    """Testes unitários para create_transactions (lote)"""
+
+    @staticmethod
+    def _build(amount=100.0, external_id=None):
+        return Transaction(
+            external_id=external_id or uuid.uuid4(),
+            amount=amount,
+            kind=KindEnum.CREDIT,
+            account_id="123",
+        )
+
+    @staticmethod
+    def _persist(transactions):
+        return [
+            transaction.model_copy(update={"id": index})
+            for index, transaction in enumerate(transactions, start=1)
+        ]
+
+    @pytest.mark.asyncio
+    async def test_reports_created_existing_and_invalid(self, service, mock_repository):
+        """Deve retornar o resultado de cada item na ordem do lote"""
+        existing = self._build()
+        existing.id = 99
+        new = self._build()
+        invalid = self._build(amount=0)
+        mock_repository.get_by_external_ids.return_value = {
+            existing.external_id: existing
+        }
+        mock_repository.create_many.side_effect = self._persist
+
+        with patch("app.services.transaction_service.outbox_relay") as mock_relay:
+            results = await service.create_transactions(
+                [self._build(external_id=existing.external_id), new, invalid]
+            )
+
+        assert results[0] == (existing, False)
+        assert results[1][0].id == 1 and results[1][1] is True
+        assert results[2] is None
+        # Só o id de valor inválido volta ao banco, sem o bloom filter
+        mock_repository.get_by_external_ids.assert_called_with(
+            [invalid.external_id], use_cache=False
+        )
+        mock_repository.create_many.assert_called_once_with([new])
+        mock_relay.notify.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_duplicates_inside_batch_created_once(self, service, mock_repository):
+        """Itens repetidos no lote devem criar uma única transação"""
+        first = self._build()
+        repeated = self._build(external_id=first.external_id)
+        mock_repository.get_by_external_ids.return_value = {}
+        mock_repository.create_many.side_effect = self._persist
+
+        with patch("app.services.transaction_service.outbox_relay"):
+            results = await service.create_transactions([first, repeated])
+
+        mock_repository.create_many.assert_called_once_with([first])
+        assert [created for _, created in results] == [True, False]
+        assert results[0][0] is results[1][0]
+
+    @pytest.mark.asyncio
+    async def test_fetches_rows_ignored_by_conflict(self, service, mock_repository):
+        """Ids ignorados pelo ON CONFLICT devem ser buscados sem cache"""
+        transaction = self._build()
+        existing = transaction.model_copy(update={"id": 5})
+        mock_repository.get_by_external_ids.side_effect = [
+            {},
+            {transaction.external_id: existing},
+        ]
+        mock_repository.create_many.return_value = []
+
+        with patch("app.services.transaction_service.outbox_relay") as mock_relay:
+            results = await service.create_transactions([transaction])
+
+        assert results == [(existing, False)]
+        mock_repository.get_by_external_ids.assert_called_with(
+            [transaction.external_id], use_cache=False
+        )
+        mock_relay.notify.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_does_not_insert_when_nothing_new(self, service, mock_repository):
+        """Não deve inserir nem acordar o relay sem transações novas"""
+        mock_repository.get_by_external_ids.return_value = {}
+
+        with patch("app.services.transaction_service.outbox_relay") as mock_relay:
+            results = await service.create_transactions([self._build(amount=-1)])
+
+        assert results == [None]
+        mock_repository.create_many.assert_not_called()
+        mock_relay.notify.assert_not_called()
 
 
 class TestProcessTransaction:
@@ -179,7 +305,7 @@ class TestProcessTransaction:
     ):
         """Deve completar transação quando banco parceiro retorna sucesso"""
         partner_id = str(uuid.uuid4())
-        mock_repository.get_by_id.return_value = pending_transaction
+        mock_repository.claim.return_value = pending_transaction
 
         with patch(
             "app.services.transaction_service.bank_partner_request",
@@ -188,18 +314,43 @@ class TestProcessTransaction:
         ):
             await service.process_transaction(pending_transaction.id)
 
-        # Verifica chamadas de update
-        assert mock_repository.update.call_count == 2  # processing + completed
-        final_update = mock_repository.update.call_args_list[-1][0][0]
-        assert final_update.status == "completed"
-        assert final_update.partner_id == partner_id
+        # processing via claim, completed via complete (status + saldo)
+        mock_repository.claim.assert_called_once()
+        assert mock_repository.claim.call_args[0][0] == pending_transaction.id
+        mock_repository.get_by_id.assert_not_called()
+        mock_repository.complete.assert_called_once()
+        completed = mock_repository.complete.call_args[0][0]
+        assert completed.status == "completed"
+        assert completed.partner_id == partner_id
+
+    @pytest.mark.asyncio
+    async def test_invalidates_balance_cache_on_completion(
+        self, service, mock_repository, pending_transaction
+    ):
+        """Deve invalidar o saldo em cache da conta após completar"""
+        mock_repository.claim.return_value = pending_transaction
+
+        with (
+            patch(
+                "app.services.transaction_service.bank_partner_request",
+                new_callable=AsyncMock,
+                return_value="partner-1",
+            ),
+            patch(
+                "app.services.transaction_service.balance_cache.invalidate",
+                new_callable=AsyncMock,
+            ) as mock_invalidate,
+        ):
+            await service.process_transaction(1)
+
+        mock_invalidate.assert_called_once_with("123")
 
     @pytest.mark.asyncio
     async def test_raises_exception_on_bank_partner_failure(
         self, service, mock_repository, pending_transaction
     ):
         """Deve lançar exceção quando banco parceiro falha"""
-        mock_repository.get_by_id.return_value = pending_transaction
+        mock_repository.claim.return_value = pending_transaction
 
         with patch(
             "app.services.transaction_service.bank_partner_request",
@@ -207,20 +358,21 @@ class TestProcessTransaction:
             side_effect=BankPartnerError("Erro"),
         ):
             with pytest.raises(BankPartnerError):
-                await service.process_transaction(
-                    pending_transaction.id, is_last_attempt=False
-                )
+                await service.process_transaction(pending_transaction.id)
 
         # Status volta para pending para retry
-        final_update = mock_repository.update.call_args_list[-1][0][0]
-        assert final_update.status == "pending"
+        mock_repository.update_status.assert_called_with(
+            pending_transaction.id, "processing", "pending", "worker-1", retry_at=None
+        )
 
     @pytest.mark.asyncio
     async def test_marks_failed_on_last_attempt(
         self, service, mock_repository, pending_transaction
     ):
         """Deve marcar como failed na última tentativa"""
-        mock_repository.get_by_id.return_value = pending_transaction
+        # O claim já contou a tentativa atual em attempts
+        pending_transaction.attempts = settings.max_retries + 1
+        mock_repository.claim.return_value = pending_transaction
 
         with patch(
             "app.services.transaction_service.bank_partner_request",
@@ -228,12 +380,11 @@ class TestProcessTransaction:
             side_effect=BankPartnerError("Erro"),
         ):
             with pytest.raises(BankPartnerError):
-                await service.process_transaction(
-                    pending_transaction.id, is_last_attempt=True
-                )
+                await service.process_transaction(pending_transaction.id)
 
-        final_update = mock_repository.update.call_args_list[-1][0][0]
-        assert final_update.status == "failed"
+        mock_repository.update_status.assert_called_with(
+            pending_transaction.id, "processing", "failed", "worker-1"
+        )
 
     @pytest.mark.asyncio
     async def test_skips_already_processed_transaction(
@@ -241,6 +392,7 @@ class TestProcessTransaction:
     ):
         """Deve ignorar transação já processada"""
         pending_transaction.status = "completed"
+        mock_repository.claim.return_value = None
         mock_repository.get_by_id.return_value = pending_transaction
 
         with patch(
@@ -251,22 +403,42 @@ class TestProcessTransaction:
 
             mock_bank.assert_not_called()
 
+    @pytest.mark.asyncio
+    async def test_raises_when_claimed_by_another_worker(
+        self, service, mock_repository, pending_transaction
+    ):
+        """Não deve chamar o parceiro se outro worker detém o claim"""
+        pending_transaction.status = "processing"
+        mock_repository.claim.return_value = None
+        mock_repository.get_by_id.return_value = pending_transaction
+
+        with patch(
+            "app.services.transaction_service.bank_partner_request",
+            new_callable=AsyncMock,
+        ) as mock_bank:
+            with pytest.raises(TransactionClaimedError):
+                await service.process_transaction(pending_transaction.id)
+
+            mock_bank.assert_not_called()
+        mock_repository.update_status.assert_not_called()
+
     @pytest.mark.asyncio
     async def test_handles_not_found_transaction(self, service, mock_repository):
         """Deve tratar transação não encontrada"""
+        mock_repository.claim.return_value = None
         mock_repository.get_by_id.return_value = None
 
         # Não deve lançar exceção
         await service.process_transaction(999)
 
-        mock_repository.update.assert_not_called()
+        mock_repository.complete.assert_not_called()
 
     @pytest.mark.asyncio
     async def test_calls_bank_partner_with_correct_params(
         self, service, mock_repository, pending_transaction
     ):
         """Deve chamar banco parceiro com parâmetros corretos"""
-        mock_repository.get_by_id.return_value = pending_transaction
+        mock_repository.claim.return_value = pending_transaction
 
         with patch(
             "app.services.transaction_service.bank_partner_request",
@@ -281,6 +453,116 @@ class TestProcessTransaction:
                 kind=pending_transaction.kind,
             )
 
+    @pytest.mark.asyncio
+    async def test_skips_balance_when_no_longer_processing(
+        self, service, mock_repository, pending_transaction
+    ):
+        """Não deve invalidar o saldo se a conclusão não foi aplicada"""
+        mock_repository.claim.return_value = pending_transaction
+        mock_repository.complete.return_value = None
+
+        with (
+            patch(
+                "app.services.transaction_service.bank_partner_request",
+                new_callable=AsyncMock,
+                return_value="partner-1",
+            ),
+            patch(
+                "app.services.transaction_service.balance_cache.invalidate",
+                new_callable=AsyncMock,
+            ) as mock_invalidate,
+        ):
+            await service.process_transaction(1)
+
+        mock_invalidate.assert_not_called()
+
+
+class TestProcessBatch:
+    """Testes unitários para process_batch"""
+
+    @pytest.fixture
+    def transactions(self):
+        return {
+            transaction_id: Transaction(
+                id=transaction_id,
+                external_id=uuid.uuid4(),
+                amount=10.0 * transaction_id,
+                kind=KindEnum.CREDIT,
+                account_id="123",
+                status="pending",
+            )
+            for transaction_id in (1, 2, 3)
+        }
+
+    @pytest.mark.asyncio
+    async def test_sends_single_partner_call_for_batch(
+        self, service, mock_repository, transactions
+    ):
+        """Deve enviar todas as transações em uma única chamada ao parceiro"""
+        with patch(
+            "app.services.transaction_service.bank_partner_batch_request",
+            new_callable=AsyncMock,
+            return_value=[PartnerResult(partner_id=f"p{i}") for i in (1, 2, 3)],
+        ) as mock_batch:
+            failures = await service.process_batch(list(transactions.values()))
+
+        assert failures == {}
+        mock_batch.assert_called_once()
+        assert [r.amount for r in mock_batch.call_args[0][0]] == [10.0, 20.0, 30.0]
+        assert mock_repository.complete.call_count == 3
+        assert transactions[2].partner_id == "p2"
+
+    @pytest.mark.asyncio
+    async def test_returns_per_item_failures(
+        self, service, mock_repository, transactions
+    ):
+        """Deve retornar erro por item e aplicar semântica de última tentativa"""
+        transactions[3].attempts = settings.max_retries + 1
+        error = BankPartnerError("Erro")
+
+        with patch(
+            "app.services.transaction_service.bank_partner_batch_request",
+            new_callable=AsyncMock,
+            return_value=[
+                PartnerResult(partner_id="p1"),
+                PartnerResult(error=error),
+                PartnerResult(error=error),
+            ],
+        ):
+            failures = await service.process_batch(list(transactions.values()))
+
+        assert failures == {2: error, 3: error}
+        assert transactions[1].status == "completed"
+        assert transactions[2].status == "pending"
+        assert transactions[3].status == "failed"
+
+    @pytest.mark.asyncio
+    async def test_whole_batch_fails_when_partner_call_fails(
+        self, service, mock_repository, transactions
+    ):
+        """Falha na chamada do lote deve falhar todos os itens"""
+        with patch(
+            "app.services.transaction_service.bank_partner_batch_request",
+            new_callable=AsyncMock,
+            side_effect=BankPartnerError("Erro"),
+        ):
+            failures = await service.process_batch([transactions[1], transactions[2]])
+
+        assert set(failures) == {1, 2}
+        mock_repository.complete.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_empty_batch_skips_partner_call(self, service):
+        """Lote sem transações reivindicadas não deve chamar o parceiro"""
+        with patch(
+            "app.services.transaction_service.bank_partner_batch_request",
+            new_callable=AsyncMock,
+        ) as mock_batch:
+            failures = await service.process_batch([])
+
+        assert failures == {}
+        mock_batch.assert_not_called()
+
 
 class TestTransactionServiceInit:
     """Testes de inicialização do service"""
@@ -0,0 +1,287 @@
+import asyncio
+import json
+import uuid
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from aio_pika.message import ProcessContext
+
+from app.core.config import settings
+from app.core.exceptions import BankPartnerError, TransactionClaimedError
+from app.models.transaction import KindEnum, Transaction
+from app.worker import (
+    batched,
+    consume,
+    handle_batch,
+    handle_failure,
+    handle_message,
+    processing,
+)
+
+
+async def iterate(messages):
+    for message in messages:
+        yield message
+
+
+def incoming_message(transaction_id=1):
+    """Mensagem recebida com o ProcessContext real do aio-pika"""
+    message = MagicMock()
+    message.body = json.dumps({"transaction_id": transaction_id}).encode()
+    message.headers = {"x-retry-count": 0}
+    message.timestamp = None
+    message.redelivered = False
+    message.processed = False
+    message.channel.is_closed = False
+
+    def settle(*args, **kwargs):
+        message.processed = True
+
+    message.ack = AsyncMock(side_effect=settle)
+    message.nack = AsyncMock(side_effect=settle)
+    message.reject = AsyncMock(side_effect=settle)
+    message.process = lambda **kwargs: ProcessContext(
+        message,
+        requeue=kwargs.get("requeue", False),
+        reject_on_redelivered=kwargs.get("reject_on_redelivered", False),
+        ignore_processed=kwargs.get("ignore_processed", False),
+    )
+    return message
+
+
+class TestConsume:
+    """Testes unitários para o consumo concorrente do worker"""
+
+    @pytest.mark.asyncio
+    async def test_processes_messages_concurrently(self):
+        """Deve processar mensagens em paralelo até o limite de concorrência"""
+        running = 0
+        max_running = 0
+        processed = []
+
+        async def handler(message):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            processed.append(message)
+
+        await consume(iterate(range(10)), handler, concurrency=3)
+
+        assert sorted(processed) == list(range(10))
+        assert max_running == 3
+
+    @pytest.mark.asyncio
+    async def test_drains_in_flight_messages(self):
+        """Deve aguardar handlers em andamento quando o iterador termina"""
+        finished = []
+
+        async def handler(message):
+            await asyncio.sleep(0.05)
+            finished.append(message)
+
+        await consume(iterate([1, 2]), handler, concurrency=10)
+
+        assert sorted(finished) == [1, 2]
+
+    @pytest.mark.asyncio
+    async def test_cancels_handlers_after_shutdown_timeout(self):
+        """Deve cancelar handlers que excedem o timeout de shutdown"""
+        cancelled = []
+
+        async def handler(message):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(message)
+                raise
+
+        await consume(iterate([1]), handler, concurrency=1, shutdown_timeout=0.01)
+
+        assert cancelled == [1]
+
+
+class TestBatched:
+    """Testes unitários para o agrupamento de mensagens em lotes"""
+
+    @pytest.mark.asyncio
+    async def test_groups_items_by_size(self):
+        """Deve agrupar itens em lotes de até size"""
+        batches = [batch async for batch in batched(iterate(range(5)), 2, linger=1)]
+
+        assert batches == [[0, 1], [2, 3], [4]]
+
+    @pytest.mark.asyncio
+    async def test_flushes_partial_batch_after_linger(self):
+        """Deve liberar lote incompleto após o tempo de linger"""
+
+        async def slow_items():
+            yield 1
+            yield 2
+            await asyncio.sleep(0.2)
+            yield 3
+
+        batches = [batch async for batch in batched(slow_items(), 10, linger=0.05)]
+
+        assert batches == [[1, 2], [3]]
+
+
+class TestHandleFailure:
+    """Testes do encaminhamento de falhas para retry ou DLQ"""
+
+    @pytest.mark.asyncio
+    async def test_claimed_elsewhere_retries_without_counting(self):
+        """Claim ativo de outro worker deve reagendar sem consumir tentativa"""
+        with (
+            patch("app.worker.publish_to_retry", new_callable=AsyncMock) as retry,
+            patch("app.worker.publish_to_dlq", new_callable=AsyncMock) as dlq,
+        ):
+            await handle_failure(1, 3, TransactionClaimedError(1, "host:42"))
+
+        retry.assert_called_once_with(1, 3)
+        dlq.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_last_attempt_goes_to_dlq(self):
+        """Falha na última tentativa deve ir para a DLQ"""
+        with (
+            patch("app.worker.publish_to_retry", new_callable=AsyncMock) as retry,
+            patch("app.worker.publish_to_dlq", new_callable=AsyncMock) as dlq,
+        ):
+            await handle_failure(1, 3, BankPartnerError("Erro"))
+
+        retry.assert_not_called()
+        dlq.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_retry_limit_follows_attempts(self, session, session_factory):
+        """O limite de retries deve vir de attempts, não do header da mensagem"""
+        # Tentativas consumidas pelo dispatcher: a mensagem chega com retry=0
+        transaction = Transaction(
+            external_id=uuid.uuid4(),
+            amount=100,
+            kind=KindEnum.CREDIT,
+            account_id="worker-1",
+            status="pending",
+            attempts=settings.max_retries,
+        )
+        session.add(transaction)
+        session.commit()
+        session.refresh(transaction)
+
+        with (
+            patch("app.worker.async_session", session_factory),
+            patch(
+                "app.services.transaction_service.bank_partner_request",
+                new_callable=AsyncMock,
+                side_effect=BankPartnerError("Erro"),
+            ),
+            patch("app.worker.publish_to_retry", new_callable=AsyncMock) as retry,
+            patch("app.worker.publish_to_dlq", new_callable=AsyncMock) as dlq,
+        ):
+            await handle_message(incoming_message(transaction.id))
+
+        retry.assert_not_called()
+        dlq.assert_called_once()
+        assert dlq.call_args[0][:2] == (transaction.id, settings.max_retries)
+        session.refresh(transaction)
+        assert transaction.status == "failed"
+
+
+class TestHandleBatch:
+    """Testes do processamento de mensagens em lote"""
+
+    @pytest.mark.asyncio
+    async def test_skips_already_processed(self, session, session_factory):
+        """Não deve enviar ao parceiro transações já processadas"""
+        transaction = Transaction(
+            external_id=uuid.uuid4(),
+            amount=100,
+            kind=KindEnum.CREDIT,
+            account_id="worker-2",
+            status="completed",
+        )
+        session.add(transaction)
+        session.commit()
+        session.refresh(transaction)
+        message = incoming_message(transaction.id)
+
+        with (
+            patch("app.worker.async_session", session_factory),
+            patch(
+                "app.services.transaction_service.bank_partner_batch_request",
+                new_callable=AsyncMock,
+            ) as mock_batch,
+        ):
+            await handle_batch([message])
+
+        mock_batch.assert_not_called()
+        message.ack.assert_awaited_once()
+
+
+class TestMessageSettlement:
+    """Testes da confirmação das mensagens pelo worker"""
+
+    @pytest.mark.asyncio
+    async def test_acks_after_processing(self):
+        """Mensagem processada deve ser confirmada"""
+        message = incoming_message()
+
+        async with processing(message):
+            pass
+
+        message.ack.assert_awaited_once()
+        message.nack.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_rejects_without_requeue_on_error(self):
+        """Erro no processamento deve rejeitar sem devolver para a fila"""
+        message = incoming_message()
+
+        with pytest.raises(ValueError):
+            async with processing(message):
+                raise ValueError("mensagem inválida")
+
+        message.reject.assert_awaited_once_with(requeue=False)
+
+    @pytest.mark.asyncio
+    async def test_requeues_message_of_cancelled_handler(
+        self, session, session_factory
+    ):
+        """Handler cancelado no shutdown deve liberar o claim e devolver a mensagem"""
+        transaction = Transaction(
+            external_id=uuid.uuid4(),
+            amount=100,
+            kind=KindEnum.CREDIT,
+            account_id="worker-3",
+            status="pending",
+        )
+        session.add(transaction)
+        session.commit()
+        session.refresh(transaction)
+        message = incoming_message(transaction.id)
+
+        async def slow_partner(**kwargs):
+            await asyncio.sleep(10)
+
+        with (
+            patch("app.worker.async_session", session_factory),
+            patch(
+                "app.services.transaction_service.bank_partner_request",
+                side_effect=slow_partner,
+            ),
+        ):
+            await consume(
+                iterate([message]),
+                handle_message,
+                concurrency=1,
+                shutdown_timeout=0.05,
+            )
+
+        message.nack.assert_awaited_once_with(requeue=True)
+        message.reject.assert_not_awaited()
+        message.ack.assert_not_awaited()
+        # A mensagem reentregue pode ser reivindicada já, sem esperar o lease
+        session.refresh(transaction)
+        assert transaction.status == "pending"